@@ -1,10 +1,13 @@
 from django.contrib import admin
+from django.contrib.admin.views.main import ChangeList
 from django.contrib.auth.admin import UserAdmin
-from .models import User, Child, UserProfile, WalletConnection
+from baby_wallet_backend.replicas import ReplicaChangeListMixin
+from .models import User, Child, BalanceSnapshot, UserProfile, WalletConnection
+from .projections import prime_projections
 
 
 @admin.register(User)
-class CustomUserAdmin(UserAdmin):
+class CustomUserAdmin(ReplicaChangeListMixin, UserAdmin):
     list_display = ('email', 'username', 'first_name', 'last_name', 'wallet_connected', 'wallet_type', 'is_staff', 'is_active')
     list_filter = ('wallet_connected', 'wallet_type', 'is_staff', 'is_active', 'created_at')
     search_fields = ('email', 'username', 'first_name', 'last_name')
@@ -23,9 +26,16 @@ class CustomUserAdmin(UserAdmin):
     )
 
 
+class ChildChangeList(ChangeList):
+    """Changelist that projects the whole result page in one batch"""
+    def get_results(self, request):
+        super().get_results(request)
+        self.result_list = prime_projections(self.result_list)
+
+
 @admin.register(Child)
-class ChildAdmin(admin.ModelAdmin):
-    list_display = ('name', 'user', 'age', 'current_balance', 'target_amount', 'progress_percentage', 'years_until_unlock', 'is_active')
+class ChildAdmin(ReplicaChangeListMixin, admin.ModelAdmin):
+    list_display = ('name', 'user', 'age', 'current_balance', 'target_amount', 'progress_percentage', 'years_until_unlock', 'projected_value_at_18', 'is_active')
     list_filter = ('gender', 'is_active', 'created_at', 'unlock_age')
     search_fields = ('name', 'user__email', 'user__first_name', 'user__last_name')
     ordering = ('-created_at',)
@@ -47,11 +57,26 @@ class ChildAdmin(admin.ModelAdmin):
     
     readonly_fields = ('age', 'progress_percentage', 'years_until_unlock', 'projected_value_at_18')
     
+    def get_changelist(self, request, **kwargs):
+        return ChildChangeList
+
     def progress_percentage(self, obj):
         return f"{obj.progress_percentage:.1f}%"
     progress_percentage.short_description = 'Progress %'
 
 
+@admin.register(BalanceSnapshot)
+class BalanceSnapshotAdmin(admin.ModelAdmin):
+    list_display = ('date', 'user', 'child', 'balance', 'created_at')
+    list_filter = ('date',)
+    search_fields = ('user__email', 'child__name')
+    ordering = ('-date',)
+    list_select_related = ('user', 'child')
+    raw_id_fields = ('user', 'child')
+
+    readonly_fields = ('created_at',)
+
+
 @admin.register(UserProfile)
 class UserProfileAdmin(admin.ModelAdmin):
     list_display = ('user', 'phone_number', 'preferred_currency', 'created_at')
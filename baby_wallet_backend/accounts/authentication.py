@@ -0,0 +1,61 @@
+import copy
+import threading
+import time
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from rest_framework.authentication import TokenAuthentication
+
+
+_tokens = {}  # token key -> (user, monotonic expiry)
+_tokens_lock = threading.Lock()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication that remembers token -> user in this process for
+    AUTH_TOKEN_CACHE_TTL seconds, so repeated requests with the same token
+    skip the authtoken_token/accounts_user join. Deleting a token (logout,
+    rotation) or saving its user (password change, deactivation) drops the
+    entries here at once; other processes pick the change up within the TTL.
+    """
+
+    def authenticate_credentials(self, key):
+        now = time.monotonic()
+        entry = _tokens.get(key)
+        if entry is not None and entry[1] > now:
+            user, token = entry[0]
+            # Each request gets its own copy, so per-request state set on the user does not leak
+            return copy.copy(user), token
+        user, token = super().authenticate_credentials(key)
+        with _tokens_lock:
+            if len(_tokens) >= settings.AUTH_TOKEN_CACHE_SIZE:
+                for stale in [k for k, (_, expires) in _tokens.items() if expires <= now]:
+                    del _tokens[stale]
+                if len(_tokens) >= settings.AUTH_TOKEN_CACHE_SIZE:
+                    _tokens.clear()
+            _tokens[key] = ((copy.copy(user), token), now + settings.AUTH_TOKEN_CACHE_TTL)
+        return user, token
+
+
+def invalidate_token(key):
+    with _tokens_lock:
+        _tokens.pop(key, None)
+
+
+def invalidate_user_tokens(user_id):
+    with _tokens_lock:
+        for key in [key for key, ((user, _), _) in _tokens.items() if user.pk == user_id]:
+            del _tokens[key]
+
+
+def clear_token_cache():
+    with _tokens_lock:
+        _tokens.clear()
+
+
+@receiver(setting_changed)
+def clear_token_cache_on_setting_change(setting, **kwargs):
+    if setting.startswith('AUTH_TOKEN_'):
+        clear_token_cache()
@@ -0,0 +1,99 @@
+import time
+from importlib import import_module
+
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY, get_user
+from django.core.management.base import BaseCommand
+from django.db import connection, reset_queries, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from accounts.authentication import CachedTokenAuthentication, clear_token_cache
+from accounts.models import User
+
+
+def legacy_login(user):
+    """The original token rotation on every login, kept as the baseline"""
+    Token.objects.filter(user=user).delete()
+    return Token.objects.create(user=user)
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks the authentication overhead per API request, token and session paths (rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--repeat', type=int, default=100, help='Requests per user')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            users = User.objects.bulk_create([
+                User(username=f'bench-auth-{n}', email=f'bench-auth-{n}@example.com')
+                for n in range(options['users'])
+            ])
+            tokens = [Token.objects.create(user=user).key for user in users]
+            clear_token_cache()
+            try:
+                self.measure_tokens(tokens, options['repeat'])
+                self.measure_sessions(users, options['repeat'])
+                self.measure_logins(users, options['repeat'])
+            finally:
+                clear_token_cache()
+            transaction.set_rollback(True)
+
+    def timed(self, label, calls, sample):
+        """Time all `calls`; queries are counted over the last `sample`, the log holding 9000 at most"""
+        start = time.perf_counter()
+        for call in calls[:-sample]:
+            call()
+        reset_queries()
+        with CaptureQueriesContext(connection) as queries:
+            for call in calls[-sample:]:
+                call()
+        elapsed = time.perf_counter() - start
+        self.stdout.write(f'  {label:<24} {elapsed / len(calls) * 1e6:8.1f} us/request  '
+                          f'{len(queries) / sample:4.2f} queries/request')
+
+    def measure_tokens(self, tokens, repeat):
+        self.stdout.write(f'Token authentication, {len(tokens)} tokens x {repeat} requests')
+        factory = APIRequestFactory()
+        requests = [factory.get('/api/children/', HTTP_AUTHORIZATION=f'Token {key}') for key in tokens]
+        for authentication in [TokenAuthentication(), CachedTokenAuthentication()]:
+            self.timed(type(authentication).__name__, [
+                lambda request=request: authentication.authenticate(Request(request))
+                for _ in range(repeat) for request in requests
+            ], len(requests))
+
+    def measure_sessions(self, users, repeat):
+        self.stdout.write(f'Session authentication, {len(users)} sessions x {repeat} requests')
+        factory = APIRequestFactory()
+        for engine in ['django.contrib.sessions.backends.db', 'django.contrib.sessions.backends.cached_db']:
+            store = import_module(engine).SessionStore
+            keys = []
+            for user in users:
+                session = store()
+                session.update({SESSION_KEY: str(user.pk), HASH_SESSION_KEY: user.get_session_auth_hash(),
+                                BACKEND_SESSION_KEY: 'django.contrib.auth.backends.ModelBackend'})
+                session.save()
+                keys.append(session.session_key)
+
+            def request_user(key):
+                request = factory.get('/api/children/')
+                request.session = store(key)
+                return get_user(request)
+
+            self.timed(engine.rsplit('.', 1)[1], [
+                lambda key=key: request_user(key) for _ in range(repeat) for key in keys
+            ], len(keys))
+
+    def measure_logins(self, users, repeat):
+        logins = max(1, repeat // 10)
+        self.stdout.write(f'Token issued at login, {len(users)} users x {logins} logins')
+        self.timed('delete and recreate', [
+            lambda user=user: legacy_login(user) for _ in range(logins) for user in users
+        ], len(users))
+        self.timed('get_or_create', [
+            lambda user=user: Token.objects.get_or_create(user=user) for _ in range(logins) for user in users
+        ], len(users))
@@ -0,0 +1,104 @@
+import time
+from datetime import date
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from accounts.models import User, Child
+from accounts.stats import get_dashboard_stats, stats_cache_key, value_portfolios
+from investments.models import Investment
+from investments.prices import clear_price_cache
+from investments.testing import PriceFeed
+
+
+def legacy_dashboard_stats(user):
+    """The original Python-side aggregation, kept as the baseline"""
+    children = user.children.all()
+    total_wallet_balances = sum(child.current_balance for child in children)
+    total_investment_values = sum(
+        investment.total_contributed
+        for investment in Investment.objects.filter(user=user, status='active')
+    )
+    return {
+        'total_savings': float(total_wallet_balances + total_investment_values),
+        'total_wallet_balances': float(total_wallet_balances),
+        'total_investment_values': float(total_investment_values),
+        'percentage_change': 0.0,
+        'child_count': children.count(),
+        'active_investments': user.investments.filter(status='active').count(),
+    }
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks dashboard stats for users owning hundreds of investments (data is rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20)
+        parser.add_argument('--children', type=int, default=4)
+        parser.add_argument('--investments', type=int, default=300)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        feed = PriceFeed({'USD': {'USDC': '1.00'}})
+        feed.enable()
+        try:
+            with transaction.atomic():
+                users = self.seed(options)
+                self.run(users, options['repeat'])
+                transaction.set_rollback(True)
+        finally:
+            feed.disable()
+
+    def seed(self, options):
+        self.stdout.write(
+            f"Seeding {options['users']} users x {options['investments']} investments..."
+        )
+        users = []
+        for u in range(options['users']):
+            user = User.objects.create(username=f'bench-stats-{u}', email=f'bench-stats-{u}@example.com')
+            children = Child.objects.bulk_create([
+                Child(user=user, name=f'Child {c}', date_of_birth=date(2015, 1, 1),
+                      current_balance=Decimal('1000.00'))
+                for c in range(options['children'])
+            ])
+            Investment.objects.bulk_create([
+                Investment(user=user, child=children[i % len(children)], investment_type='one_time',
+                           amount=Decimal('10.00'), total_contributed=Decimal('10.00'),
+                           status='active' if i % 4 else 'paused', start_date=date.today())
+                for i in range(options['investments'])
+            ])
+            users.append(user)
+        return users
+
+    def run(self, users, repeat):
+        for user in users:
+            stats = get_dashboard_stats(user)
+            assert legacy_dashboard_stats(user) == {key: stats[key] for key in legacy_dashboard_stats(user)}
+
+        def timed(func):
+            start = time.perf_counter()
+            for _ in range(repeat):
+                for user in users:
+                    func(user)
+            return (time.perf_counter() - start) / (repeat * len(users)) * 1000
+
+        def cold(user):
+            cache.delete(stats_cache_key(user.pk))
+            get_dashboard_stats(user)
+
+        def uncached_prices(user):
+            clear_price_cache()
+            get_dashboard_stats(user)
+
+        self.stdout.write(f'  legacy:         {timed(legacy_dashboard_stats):.3f} ms/request')
+        self.stdout.write(f'  single query:   {timed(cold):.3f} ms/request')
+        self.stdout.write(f'  prices fetched: {timed(uncached_prices):.3f} ms/request')
+        per_request = timed(get_dashboard_stats)
+        self.stdout.write(f'  cached:         {per_request:.3f} ms/request ({1000 / per_request:.0f} requests/s)')
+
+        start = time.perf_counter()
+        value_portfolios([user.pk for user in users])
+        self.stdout.write(f'  {len(users)} portfolios valued in one query: '
+                          f'{(time.perf_counter() - start) * 1000:.3f} ms')
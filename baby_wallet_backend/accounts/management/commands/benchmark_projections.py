@@ -0,0 +1,61 @@
+import random
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from accounts.models import Child
+from accounts.projections import DEFAULT_ANNUAL_RATE, DEFAULT_MONTHLY_CONTRIBUTION, project_children
+
+
+def loop_projection(child, annual_rate=DEFAULT_ANNUAL_RATE,
+                    monthly_contribution=DEFAULT_MONTHLY_CONTRIBUTION):
+    """The original month-by-month projection, kept as the baseline"""
+    if child.years_until_unlock <= 0:
+        return child.current_balance
+
+    monthly_rate = annual_rate / 12
+    future_value = child.current_balance
+    for _ in range(child.years_until_unlock * 12):
+        future_value = (future_value + monthly_contribution) * (1 + monthly_rate)
+    return round(future_value, 2)
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks the per-row projection loop against the batch projection engine'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--children', type=int, default=10000)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        today = date.today()
+        children = [
+            Child(
+                pk=pk,
+                name=f'Child {pk}',
+                date_of_birth=today - timedelta(days=rng.randint(0, 18 * 365)),
+                current_balance=Decimal(rng.randint(0, 5000000)) / 100,
+            )
+            for pk in range(1, options['children'] + 1)
+        ]
+        self.stdout.write(f'Projecting {len(children)} children...')
+
+        start = time.perf_counter()
+        expected = {child.pk: loop_projection(child) for child in children}
+        loop_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        projected = project_children(children)
+        batch_seconds = time.perf_counter() - start
+
+        mismatches = sum(1 for pk, value in expected.items() if projected[pk] != value)
+        self.stdout.write(f'  per-row loop: {loop_seconds * 1000:.1f} ms')
+        self.stdout.write(f'  batch:        {batch_seconds * 1000:.1f} ms')
+        self.stdout.write(f'  speedup:      {loop_seconds / batch_seconds:.1f}x')
+        if mismatches:
+            self.stdout.write(self.style.WARNING(f'  {mismatches} projections differ from the loop'))
+        else:
+            self.stdout.write(self.style.SUCCESS('  all projections match the loop'))
@@ -0,0 +1,94 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max, Q, Sum
+from django.utils import timezone
+
+from accounts.models import BalanceSnapshot, Child, User
+from accounts.stats import invalidate_dashboard_stats
+from investments.models import Transaction
+
+
+class Command(BaseCommand):
+    help = "Records today's balance snapshots for children whose balances changed since the last run"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Snapshot every child, not only changed ones')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        run_started = timezone.now()
+        today = timezone.localdate(run_started)
+        batch_size = options['batch_size']
+
+        children = Child.objects.order_by('pk')
+        last_run = None
+        if not options['full']:
+            last_run = BalanceSnapshot.objects.aggregate(last_run=Max('created_at'))['last_run']
+        if last_run is not None:
+            # Also re-read what was saved shortly before the last run but committed after it read
+            since = last_run - timedelta(seconds=settings.BALANCE_SNAPSHOT_MARGIN)
+            changed = Transaction.objects.filter(updated_at__gte=since).values('child_id')
+            children = children.filter(Q(updated_at__gte=since) | Q(pk__in=changed))
+            self.stdout.write(f'Snapshotting children changed since {last_run:%Y-%m-%d %H:%M:%S}...')
+        else:
+            self.stdout.write('Snapshotting all children...')
+
+        child_count = 0
+        snapshotted = set()
+        last_pk = 0
+        while True:
+            batch = list(
+                children.filter(pk__gt=last_pk).values_list('pk', 'user_id', 'current_balance')[:batch_size]
+            )
+            if not batch:
+                break
+            last_pk = batch[-1][0]
+            snapshotted |= self.snapshot_batch(batch, today, run_started)
+            child_count += len(batch)
+
+        if last_run is not None:
+            # Users who lost a child have no changed child left to be picked up by
+            users = User.objects.filter(updated_at__gte=since).order_by('pk').values_list('pk', flat=True)
+            remaining = [pk for pk in users.iterator() if pk not in snapshotted]
+            for start in range(0, len(remaining), batch_size):
+                snapshotted |= self.snapshot_users(remaining[start:start + batch_size], today, run_started)
+        user_count = len(snapshotted)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Recorded {child_count} child and {user_count} user snapshots for {today}'
+        ))
+
+    @transaction.atomic
+    def snapshot_batch(self, batch, today, run_started):
+        """Snapshot the children in `batch` and their users' totals; returns the user pks"""
+        child_ids = [pk for pk, _, _ in batch]
+        BalanceSnapshot.objects.filter(date=today, child_id__in=child_ids).delete()
+        BalanceSnapshot.objects.bulk_create([
+            BalanceSnapshot(user_id=user_id, child_id=pk, date=today, balance=balance, created_at=run_started)
+            for pk, user_id, balance in batch
+        ])
+        return self.snapshot_users({user_id for _, user_id, _ in batch}, today, run_started)
+
+    @transaction.atomic
+    def snapshot_users(self, user_ids, today, run_started):
+        """Snapshot the total of each user's children, zero for users without any; returns the user pks"""
+        user_totals = dict(
+            Child.objects.filter(user_id__in=user_ids)
+            .order_by()
+            .values_list('user_id')
+            .annotate(total=Sum('current_balance'))
+        )
+        BalanceSnapshot.objects.filter(date=today, user_id__in=user_ids, child__isnull=True).delete()
+        BalanceSnapshot.objects.bulk_create([
+            BalanceSnapshot(user_id=user_id, date=today, balance=user_totals.get(user_id, Decimal('0')),
+                            created_at=run_started)
+            for user_id in user_ids
+        ])
+        # Bulk writes send no signals; the cached dashboard stats read these snapshots
+        for user_id in user_ids:
+            transaction.on_commit(lambda user_id=user_id: invalidate_dashboard_stats(user_id))
+        return set(user_ids)
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.1 on 2026-10-17 18:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0002_balancesnapshot"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="child",
+            index=models.Index(
+                fields=["user", "created_at", "id"], name="child_user_created_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.1 on 2026-10-17 20:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0003_child_child_user_created_idx"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="userprofile",
+            name="preferred_currency",
+            field=models.CharField(
+                choices=[
+                    ("USD", "US Dollar"),
+                    ("EUR", "Euro"),
+                    ("GBP", "Pound Sterling"),
+                ],
+                default="USD",
+                max_length=3,
+            ),
+        ),
+    ]
@@ -1,8 +1,10 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.utils import timezone
+from django.utils.functional import cached_property
 from datetime import date
-from decimal import Decimal
+
+from .projections import DEFAULT_ANNUAL_RATE, DEFAULT_MONTHLY_CONTRIBUTION, future_value
 
 
 class User(AbstractUser):
@@ -24,10 +26,17 @@ class User(AbstractUser):
     def full_name(self):
         return f"{self.first_name} {self.last_name}".strip()
 
-    @property
+    @cached_property
     def total_savings(self):
-        """Calculate total savings across all children"""
-        return sum(child.current_balance for child in self.children.all())
+        """
+        Value of the children's holdings in the preferred currency.
+        UserViewSet annotates what this needs in its own query instead.
+        """
+        from .stats import value_portfolio, value_portfolios
+
+        if hasattr(self, 'wallet_balances'):
+            return value_portfolio(vars(self))[1]
+        return value_portfolios([self.pk])[self.pk][1]
 
 
 class Child(models.Model):
@@ -53,6 +62,9 @@ class Child(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'created_at', 'id'], name='child_user_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.user.email})"
@@ -77,33 +89,80 @@ class Child(models.Model):
             return 0
         return min(100, (self.current_balance / self.target_amount) * 100)
 
-    @property
+    @cached_property
     def projected_value_at_18(self):
-        """Calculate projected value at age 18"""
-        if self.years_until_unlock <= 0:
-            return self.current_balance
-        
-        # Simple compound interest calculation (6% annual return)
-        annual_rate = Decimal('0.06')
-        monthly_rate = annual_rate / 12
-        months = self.years_until_unlock * 12
-        
-        # Assume monthly contributions of $100 (can be made configurable)
-        monthly_contribution = Decimal('100')
-        
-        future_value = self.current_balance
-        for _ in range(months):
-            future_value = (future_value + monthly_contribution) * (1 + monthly_rate)
-        
-        return round(future_value, 2)
+        """Calculate projected value at unlock age with the default assumptions"""
+        return self.projected_value()
+
+    def projected_value(self, annual_rate=DEFAULT_ANNUAL_RATE,
+                        monthly_contribution=DEFAULT_MONTHLY_CONTRIBUTION):
+        """Calculate projected value at unlock age for a given return and contribution"""
+        return future_value(
+            self.current_balance,
+            self.years_until_unlock * 12,
+            annual_rate=annual_rate,
+            monthly_contribution=monthly_contribution,
+        )
+
+
+class BalanceSnapshot(models.Model):
+    """
+    Daily balance of a single child, or of all a user's children when
+    `child` is empty. Filled incrementally by the snapshot_balances command.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='balance_snapshots')
+    child = models.ForeignKey(Child, on_delete=models.CASCADE, related_name='balance_snapshots', null=True, blank=True)
+    date = models.DateField()
+    balance = models.DecimalField(max_digits=15, decimal_places=2)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        ordering = ['-date']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['child', 'date'],
+                condition=models.Q(child__isnull=False),
+                name='unique_child_balance_snapshot',
+            ),
+            models.UniqueConstraint(
+                fields=['user', 'date'],
+                condition=models.Q(child__isnull=True),
+                name='unique_user_balance_snapshot',
+            ),
+        ]
+
+    def __str__(self):
+        owner = self.child.name if self.child_id else self.user.email
+        return f"{owner} - {self.balance} on {self.date}"
+
+    @classmethod
+    def latest_on(cls, on_date, user=None, child=None):
+        """Snapshots taken on or before `on_date`, newest first"""
+        if child is not None:
+            snapshots = cls.objects.filter(child=child)
+        else:
+            snapshots = cls.objects.filter(user=user, child__isnull=True)
+        return snapshots.filter(date__lte=on_date).order_by('-date')
+
+    @classmethod
+    def balance_on(cls, on_date, user=None, child=None):
+        """Balance of a child, or of all a user's children, at the end of `on_date`"""
+        return cls.latest_on(on_date, user=user, child=child).values_list('balance', flat=True).first()
 
 
 class UserProfile(models.Model):
     """Extended user profile information"""
+    # Currencies holdings can be valued in; the price feed must quote each of them
+    CURRENCY_CHOICES = [
+        ('USD', 'US Dollar'),
+        ('EUR', 'Euro'),
+        ('GBP', 'Pound Sterling'),
+    ]
+
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
     phone_number = models.CharField(max_length=20, blank=True)
     address = models.TextField(blank=True)
-    preferred_currency = models.CharField(max_length=3, default='USD')
+    preferred_currency = models.CharField(max_length=3, choices=CURRENCY_CHOICES, default='USD')
     notification_preferences = models.JSONField(default=dict)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
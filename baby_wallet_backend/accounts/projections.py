@@ -0,0 +1,90 @@
+from datetime import date
+from decimal import Decimal
+
+
+DEFAULT_ANNUAL_RATE = Decimal('0.06')
+DEFAULT_MONTHLY_CONTRIBUTION = Decimal('100')
+
+
+def months_until_unlock(date_of_birth, unlock_age, today=None):
+    """Number of whole months of saving left before the unlock age"""
+    today = today or date.today()
+    age = today.year - date_of_birth.year - (
+        (today.month, today.day) < (date_of_birth.month, date_of_birth.day)
+    )
+    return max(0, unlock_age - age) * 12
+
+
+def growth_factors(months, annual_rate=DEFAULT_ANNUAL_RATE):
+    """
+    Return (balance_factor, contribution_factor) for a horizon of `months`.
+
+    A contribution is added at the start of every month and the whole balance
+    then earns one month of interest, so the future value is
+
+        balance * (1 + r) ** n + contribution * (1 + r) * ((1 + r) ** n - 1) / r
+    """
+    monthly_rate = Decimal(annual_rate) / 12
+    if monthly_rate == 0:
+        return Decimal('1'), Decimal(months)
+
+    growth = (1 + monthly_rate) ** months
+    return growth, (1 + monthly_rate) * (growth - 1) / monthly_rate
+
+
+def future_value(balance, months, annual_rate=DEFAULT_ANNUAL_RATE,
+                 monthly_contribution=DEFAULT_MONTHLY_CONTRIBUTION):
+    """Closed-form future value of `balance` plus monthly contributions"""
+    if months <= 0:
+        return balance
+
+    balance_factor, contribution_factor = growth_factors(months, annual_rate)
+    value = balance * balance_factor + Decimal(monthly_contribution) * contribution_factor
+    return round(value, 2)
+
+
+def project_children(children, annual_rate=DEFAULT_ANNUAL_RATE,
+                     monthly_contribution=DEFAULT_MONTHLY_CONTRIBUTION, today=None):
+    """
+    Project the value at unlock age for many children in one pass.
+
+    `children` may be a queryset or any iterable of Child instances. Children
+    sharing a horizon share the same growth factors, so at most
+    `unlock_age * 12 + 1` factor pairs are ever computed no matter how many
+    rows are projected. Returns a dict mapping child id to projected value.
+    """
+    if hasattr(children, 'values_list'):
+        rows = children.values_list('id', 'date_of_birth', 'unlock_age', 'current_balance')
+    else:
+        rows = (
+            (child.pk, child.date_of_birth, child.unlock_age, child.current_balance)
+            for child in children
+        )
+
+    today = today or date.today()
+    contribution = Decimal(monthly_contribution)
+    factors = {}
+    projections = {}
+    for pk, date_of_birth, unlock_age, balance in rows:
+        months = months_until_unlock(date_of_birth, unlock_age, today)
+        if months <= 0:
+            projections[pk] = balance
+            continue
+        if months not in factors:
+            factors[months] = growth_factors(months, annual_rate)
+        balance_factor, contribution_factor = factors[months]
+        projections[pk] = round(balance * balance_factor + contribution * contribution_factor, 2)
+    return projections
+
+
+def prime_projections(children):
+    """
+    Compute default projections for already-loaded Child instances and store
+    them on each instance so `Child.projected_value_at_18` is not recomputed
+    per row.
+    """
+    children = list(children)
+    projections = project_children(children)
+    for child in children:
+        child.__dict__['projected_value_at_18'] = projections[child.pk]
+    return children
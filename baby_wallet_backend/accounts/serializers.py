@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from .models import User, Child, UserProfile
+from .projections import prime_projections
 
 class LoginSerializer(serializers.Serializer):
     """
@@ -8,6 +9,15 @@ class LoginSerializer(serializers.Serializer):
     username = serializers.CharField()
     password = serializers.CharField(write_only=True) # write_only means it won't be sent back in response
 
+class ChildListSerializer(serializers.ListSerializer):
+    """
+    List serializer that projects every child in one batch before rendering,
+    instead of letting each row run its own projection.
+    """
+    def to_representation(self, data):
+        iterable = data.all() if hasattr(data, 'all') else data
+        return [self.child.to_representation(item) for item in prime_projections(iterable)]
+
 class ChildSerializer(serializers.ModelSerializer):
     """
     Serializer for Child model. Includes all fields for creation and updates,
@@ -27,6 +37,7 @@ class ChildSerializer(serializers.ModelSerializer):
             'age', 'progress_percentage', 'projected_value_at_18'
         ]
         read_only_fields = ['user', 'current_balance']
+        list_serializer_class = ChildListSerializer
 
 class UserProfileSerializer(serializers.ModelSerializer):
     class Meta:
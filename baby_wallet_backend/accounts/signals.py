@@ -0,0 +1,34 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .authentication import invalidate_token, invalidate_user_tokens
+from .models import User
+from .stats import invalidate_dashboard_stats
+
+
+@receiver([post_save, post_delete], sender='accounts.Child')
+@receiver([post_save, post_delete], sender='accounts.UserProfile')
+@receiver([post_save, post_delete], sender='investments.Investment')
+@receiver([post_save, post_delete], sender='investments.Transaction')
+def invalidate_owner_dashboard_stats(sender, instance, **kwargs):
+    """Drop the cached dashboard stats of the user owning a changed row"""
+    invalidate_dashboard_stats(instance.user_id)
+
+
+@receiver(post_delete, sender='accounts.Child')
+def touch_user_of_deleted_child(sender, instance, **kwargs):
+    """The incremental snapshot_balances run re-totals users updated since it last ran"""
+    User.objects.filter(pk=instance.user_id).update(updated_at=timezone.now())
+
+
+@receiver(post_delete, sender='authtoken.Token')
+def forget_deleted_token(sender, instance, **kwargs):
+    """Logout and token rotation delete the token; stop accepting it at once"""
+    invalidate_token(instance.key)
+
+
+@receiver(post_save, sender='accounts.User')
+def forget_saved_user_tokens(sender, instance, **kwargs):
+    """A password change or deactivation must not be outlived by cached tokens"""
+    invalidate_user_tokens(instance.pk)
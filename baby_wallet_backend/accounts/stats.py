@@ -0,0 +1,159 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, DecimalField, F, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import User, Child, BalanceSnapshot
+
+
+ZERO = Value(Decimal('0'), output_field=DecimalField(max_digits=15, decimal_places=2))
+# Ledger amounts not explained by per-token transactions, and investment contributions, are in the default token
+LEDGER_TOKEN = 'USDC'
+
+
+def _aggregate(queryset, aggregate, default, output_field):
+    """Wrap a per-user aggregate over `queryset` as a scalar subquery"""
+    subquery = queryset.order_by().values('user').annotate(result=aggregate).values('result')
+    return Coalesce(Subquery(subquery, output_field=output_field), default)
+
+
+def stats_cache_key(user_id):
+    return f'dashboard-stats:{user_id}'
+
+
+def portfolio_annotations():
+    """
+    Annotations for a User queryset carrying what valuing the user's
+    portfolio needs: the children's balances, the preferred currency and the
+    net completed amount of each token, one scalar subquery per token, so
+    any number of users are valued from one query.
+    """
+    from investments.models import Transaction
+    from investments.reports import balance_effect
+
+    money = DecimalField(max_digits=15, decimal_places=2)
+    completed = Transaction.objects.filter(user=OuterRef('pk'), status='completed')
+    return {
+        'wallet_balances': _aggregate(Child.objects.filter(user=OuterRef('pk')), Sum('current_balance'), ZERO, money),
+        'valuation_currency': F('profile__preferred_currency'),
+        **{
+            f'holding_{token}': _aggregate(completed.filter(token=token), balance_effect(), ZERO, money)
+            for token, _ in Transaction.TOKEN_CHOICES
+        },
+    }
+
+
+def token_holdings(row):
+    """
+    {token: quantity} from a row carrying portfolio_annotations(). Whatever
+    part of the children's balances the transactions do not explain counts
+    as LEDGER_TOKEN, so the quantities add up to the balances.
+    """
+    holdings = {name[len('holding_'):]: value for name, value in row.items() if name.startswith('holding_')}
+    holdings[LEDGER_TOKEN] += row['wallet_balances'] - sum(holdings.values())
+    return {token: quantity for token, quantity in holdings.items() if quantity}
+
+
+def value_portfolios(user_ids):
+    """
+    Value each user's holdings in their preferred currency: one query for
+    all the users, then one pass over cached prices. Returns
+    {user_id: (currency, total, {token: {'quantity', 'price', 'value'}})}.
+    """
+    rows = User.objects.filter(pk__in=user_ids).values('pk', **portfolio_annotations())
+    return {row['pk']: value_portfolio(row) for row in rows}
+
+
+def value_portfolio(row):
+    """(currency, total, holdings) for one row carrying portfolio_annotations()"""
+    from investments.prices import value_holdings
+
+    currency = (row['valuation_currency'] or settings.PRICE_DEFAULT_CURRENCY).upper()
+    return (currency, *value_holdings(token_holdings(row), currency))
+
+
+def compute_dashboard_stats(user):
+    """
+    Compute the dashboard numbers for `user` in a single query, in ledger
+    units: holdings per token rather than values, so the cached result stays
+    valid as prices move. value_dashboard_stats() converts them.
+    """
+    from investments.models import Investment
+
+    children = Child.objects.filter(user=OuterRef('pk'))
+    active_investments = Investment.objects.filter(user=OuterRef('pk'), status='active')
+    money = DecimalField(max_digits=15, decimal_places=2)
+    count = IntegerField()
+    compare_date = timezone.localdate() - timedelta(days=settings.DASHBOARD_PERCENTAGE_CHANGE_DAYS)
+    previous_balance = BalanceSnapshot.latest_on(compare_date, user=OuterRef('pk')).values('balance')[:1]
+
+    row = User.objects.filter(pk=user.pk).values(
+        child_count=_aggregate(children, Count('pk'), Value(0), count),
+        total_investment_values=_aggregate(active_investments, Sum('total_contributed'), ZERO, money),
+        active_investments=_aggregate(active_investments, Count('pk'), Value(0), count),
+        previous_wallet_balances=Subquery(previous_balance, output_field=money),
+        **portfolio_annotations(),
+    ).get()
+
+    total_wallet_balances = row['wallet_balances']
+
+    # Change in wallet balances against the latest daily snapshot taken
+    # DASHBOARD_PERCENTAGE_CHANGE_DAYS ago
+    previous = row['previous_wallet_balances']
+    if previous:
+        percentage_change = round((total_wallet_balances - previous) / previous * 100, 2)
+    else:
+        percentage_change = Decimal('0.00')
+
+    return {
+        'currency': (row['valuation_currency'] or settings.PRICE_DEFAULT_CURRENCY).upper(),
+        'holdings': token_holdings(row),
+        'investment_contributions': row['total_investment_values'],
+        'percentage_change': float(percentage_change),
+        'child_count': row['child_count'],
+        'active_investments': row['active_investments'],
+    }
+
+
+def value_dashboard_stats(stats):
+    """Dashboard numbers in the user's preferred currency, from cached stats and cached prices"""
+    from investments.prices import value_holdings
+
+    currency = stats['currency']
+    total_wallet_balances, holdings = value_holdings(stats['holdings'], currency)
+    total_investment_values, _ = value_holdings({LEDGER_TOKEN: stats['investment_contributions']}, currency)
+    as_float = lambda value: None if value is None else float(value)  # Floats for JSON serialization
+    return {
+        'currency': currency,
+        'total_savings': float(total_wallet_balances + total_investment_values),
+        'total_wallet_balances': float(total_wallet_balances),
+        'total_investment_values': float(total_investment_values),
+        'percentage_change': stats['percentage_change'],
+        'child_count': stats['child_count'],
+        'active_investments': stats['active_investments'],
+        'holdings': {
+            token: {name: as_float(value) for name, value in holding.items()}
+            for token, holding in holdings.items()
+        },
+    }
+
+
+def get_dashboard_stats(user):
+    """
+    Return the dashboard stats for `user`, computing them on a cache miss
+    and valuing them at the current cached prices
+    """
+    key = stats_cache_key(user.pk)
+    stats = cache.get(key)
+    if stats is None:
+        stats = compute_dashboard_stats(user)
+        cache.set(key, stats, settings.DASHBOARD_STATS_CACHE_TIMEOUT)
+    return value_dashboard_stats(stats)
+
+
+def invalidate_dashboard_stats(user_id):
+    cache.delete(stats_cache_key(user_id))
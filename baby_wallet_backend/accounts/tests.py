@@ -1,3 +1,507 @@
-from django.test import TestCase
+import copy
+import os
+import shutil
+import tempfile
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections
+from django.db.models import F
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from baby_wallet_backend.databases import sqlite_database
+from baby_wallet_backend.replicas import replica_reads
+from investments.testing import PriceFeed
+from .authentication import clear_token_cache
+from .management.commands.benchmark_projections import loop_projection
+from .models import User, Child
+from .projections import future_value, project_children
+from .stats import value_portfolios
+
+
+PRICES = {
+    'USD': {'USDC': '1.00', 'USDT': '1.00', 'ETH': '2000.00', 'BTC': '50000.00'},
+    'EUR': {'USDC': '0.90', 'USDT': '0.90', 'ETH': '1800.00'},
+}
+
+
+def use_price_feed(testcase, prices=PRICES):
+    feed = PriceFeed(prices)
+    feed.enable()
+    testcase.addCleanup(feed.disable)
+    return feed
+
+
+class ProjectionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('parent', 'parent@example.com', 'test123')
+
+    def make_child(self, name, years_old, balance):
+        return Child.objects.create(
+            user=self.user,
+            name=name,
+            date_of_birth=date.today() - timedelta(days=int(years_old * 365.25) + 1),
+            current_balance=Decimal(balance),
+        )
+
+    def test_closed_form_matches_monthly_loop(self):
+        for years_old, balance in [(0, '0'), (3, '1250.55'), (10, '99999.99'), (17, '12.34')]:
+            child = self.make_child(f'Child {years_old}', years_old, balance)
+            self.assertEqual(child.projected_value_at_18, loop_projection(child))
+
+    def test_unlocked_child_projects_current_balance(self):
+        child = self.make_child('Adult', 20, '500.00')
+        self.assertEqual(child.projected_value_at_18, Decimal('500.00'))
+
+    def test_rate_and_contribution_are_parameters(self):
+        child = self.make_child('Custom', 8, '1000.00')
+        months = child.years_until_unlock * 12
+        self.assertEqual(
+            child.projected_value(annual_rate=Decimal('0'), monthly_contribution=Decimal('50')),
+            Decimal('1000.00') + 50 * months,
+        )
+        self.assertEqual(
+            child.projected_value(annual_rate=Decimal('0.08'), monthly_contribution=Decimal('250')),
+            future_value(Decimal('1000.00'), months, Decimal('0.08'), Decimal('250')),
+        )
+
+    def test_batch_matches_per_row(self):
+        children = [self.make_child(f'Child {i}', i, f'{i * 100}.50') for i in range(19)]
+        projections = project_children(Child.objects.all())
+        self.assertEqual(
+            projections,
+            {child.pk: child.projected_value_at_18 for child in children},
+        )
+
+
+class ChildListProjectionTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('parent', 'parent@example.com', 'test123')
+        for i in range(5):
+            Child.objects.create(
+                user=self.user,
+                name=f'Child {i}',
+                date_of_birth=date(2015 + i, 1, 1),
+                current_balance=Decimal('100.00') * i,
+            )
+        self.client.force_authenticate(self.user)
+
+    def test_list_renders_batch_projections(self):
+        response = self.client.get('/api/children/')
+        self.assertEqual(response.status_code, 200)
+        for row in response.json()['results']:
+            child = Child.objects.get(pk=row['id'])
+            self.assertEqual(Decimal(row['projected_value_at_18']), child.projected_value_at_18)
+
+
+class DashboardStatsTests(APITestCase):
+    def setUp(self):
+        from investments.models import Investment
+
+        cache.clear()
+        self.feed = use_price_feed(self)
+        self.user = User.objects.create_user('parent', 'parent@example.com', 'test123')
+        self.child = Child.objects.create(
+            user=self.user, name='Emma', date_of_birth=date(2018, 5, 15),
+            current_balance=Decimal('250.00'),
+        )
+        Child.objects.create(
+            user=self.user, name='Noah', date_of_birth=date(2020, 8, 22),
+            current_balance=Decimal('100.00'),
+        )
+        for status, contributed in [('active', '40.00'), ('active', '60.00'), ('paused', '999.00')]:
+            Investment.objects.create(
+                user=self.user, child=self.child, investment_type='one_time',
+                amount=Decimal('10.00'), total_contributed=Decimal(contributed),
+                status=status, start_date=date.today(),
+            )
+        other = User.objects.create_user('other', 'other@example.com', 'test123')
+        Child.objects.create(
+            user=other, name='Other', date_of_birth=date(2019, 1, 1),
+            current_balance=Decimal('5000.00'),
+        )
+        self.client.force_authenticate(self.user)
+
+    def get_stats(self):
+        response = self.client.get('/api/dashboard-stats/')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_stats_are_one_query_then_cached(self):
+        with self.assertNumQueries(1):
+            stats = self.get_stats()
+        self.assertEqual(stats, {
+            'currency': 'USD',
+            'total_savings': 450.0,
+            'total_wallet_balances': 350.0,
+            'total_investment_values': 100.0,
+            'percentage_change': 0.0,
+            'child_count': 2,
+            'active_investments': 2,
+            'holdings': {'USDC': {'quantity': 350.0, 'price': 1.0, 'value': 350.0}},
+        })
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get_stats(), stats)
+
+    def test_user_without_data(self):
+        empty = User.objects.create_user('empty', 'empty@example.com', 'test123')
+        self.client.force_authenticate(empty)
+        stats = self.get_stats()
+        self.assertEqual(stats['total_savings'], 0.0)
+        self.assertEqual(stats['child_count'], 0)
+
+    def test_writes_invalidate_cached_stats(self):
+        from investments.models import Investment, Transaction
+
+        self.get_stats()
+        Transaction.objects.create(
+            user=self.user, child=self.child, transaction_type='investment',
+            amount=Decimal('50.00'), status='completed',
+        )
+        self.assertEqual(self.get_stats()['total_wallet_balances'], 400.0)
+
+        Investment.objects.filter(status='paused').get().delete()
+        Investment.objects.create(
+            user=self.user, child=self.child, investment_type='one_time',
+            amount=Decimal('5.00'), status='active', start_date=date.today(),
+        )
+        self.assertEqual(self.get_stats()['active_investments'], 3)
+
+        self.child.delete()
+        self.assertEqual(self.get_stats()['child_count'], 1)
+
+
+    def test_holdings_are_valued_per_token_in_the_preferred_currency(self):
+        from investments import prices
+        from investments.models import Transaction
+        from .models import UserProfile
+
+        for token, amount in [('ETH', '0.50'), ('BTC', '0.01'), ('USDT', '20.00')]:
+            Transaction.objects.create(user=self.user, child=self.child, transaction_type='investment',
+                                       amount=Decimal(amount), token=token, status='completed')
+        stats = self.get_stats()
+        self.assertEqual({token: holding['quantity'] for token, holding in stats['holdings'].items()},
+                         {'USDC': 350.0, 'ETH': 0.5, 'BTC': 0.01, 'USDT': 20.0})
+        self.assertEqual(stats['total_wallet_balances'], 350 + 1000 + 500 + 20)
+
+        UserProfile.objects.create(user=self.user, preferred_currency='eur')
+        # No EUR price for BTC in the feed: no total rather than one without the BTC
+        self.assertEqual(self.client.get('/api/dashboard-stats/').status_code, 503)
+
+        self.feed.update({**PRICES, 'EUR': {**PRICES['EUR'], 'BTC': '45000.00'}})
+        prices.clear_price_cache()
+        with self.assertNumQueries(0):  # Stats cached by the failed request, only their valuation failed
+            stats = self.get_stats()
+        self.assertEqual(stats['currency'], 'EUR')
+        self.assertEqual(stats['holdings']['BTC']['value'], 450.0)
+        self.assertEqual(stats['total_wallet_balances'], 315 + 900 + 18 + 450)
+        self.assertEqual(stats['total_investment_values'], 90.0)
+
+    def test_prices_are_served_from_the_cache_until_they_expire(self):
+        from investments import prices
+
+        self.assertEqual(self.get_stats()['total_savings'], 450.0)
+        self.feed.update({'USD': {'USDC': '2.00'}})
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get_stats()['total_savings'], 450.0)
+        prices._prices['USD'].expires = 0
+        self.assertEqual(self.get_stats()['total_savings'], 900.0)
+
+        # A failing source keeps the last prices; with none at all the endpoint is unavailable
+        self.feed.update({})
+        os.unlink(self.feed.path)
+        prices._prices['USD'].expires = 0
+        with self.assertLogs('investments.prices', 'WARNING'):
+            self.assertEqual(self.get_stats()['total_savings'], 900.0)
+        prices.clear_price_cache()
+        self.assertEqual(self.client.get('/api/dashboard-stats/').status_code, 503)
+        self.feed.update(PRICES)
+
+    def test_portfolios_of_many_users_are_valued_in_one_query(self):
+        from investments.models import Transaction
+
+        users = [User.objects.get(username='other'), self.user]
+        Transaction.objects.create(user=users[0], child=users[0].children.get(), transaction_type='investment',
+                                   amount=Decimal('1.00'), token='ETH', status='completed')
+        with self.assertNumQueries(1):
+            portfolios = value_portfolios([user.pk for user in users])
+        self.assertEqual(portfolios[users[0].pk][:2], ('USD', Decimal('7000.00')))  # 5000 balance in USDC plus 1 ETH
+        self.assertEqual(portfolios[self.user.pk][:2], ('USD', Decimal('350.00')))
+
+
+class BalanceSnapshotTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('parent', 'parent@example.com', 'test123')
+        self.emma = Child.objects.create(
+            user=self.user, name='Emma', date_of_birth=date(2018, 5, 15),
+            current_balance=Decimal('300.00'),
+        )
+        self.noah = Child.objects.create(
+            user=self.user, name='Noah', date_of_birth=date(2020, 8, 22),
+            current_balance=Decimal('100.00'),
+        )
+
+    def snapshot(self, *args):
+        from io import StringIO
+        from django.core.management import call_command
+
+        call_command('snapshot_balances', *args, stdout=StringIO())
+
+    def test_snapshots_children_and_user_totals(self):
+        from .models import BalanceSnapshot
+
+        self.snapshot()
+        today = date.today()
+        self.assertEqual(BalanceSnapshot.balance_on(today, child=self.emma), Decimal('300.00'))
+        self.assertEqual(BalanceSnapshot.balance_on(today, user=self.user), Decimal('400.00'))
+        self.assertIsNone(BalanceSnapshot.balance_on(today - timedelta(days=1), user=self.user))
+
+    def test_incremental_run_only_touches_changed_children(self):
+        from investments.models import Transaction
+        from .models import BalanceSnapshot
+
+        self.snapshot()
+        # Pretend the first run happened a while ago, well after the children were last saved
+        Child.objects.update(updated_at=F('updated_at') - timedelta(hours=2))
+        BalanceSnapshot.objects.update(created_at=F('created_at') - timedelta(hours=1))
+        Transaction.objects.create(
+            user=self.user, child=self.noah, transaction_type='investment',
+            amount=Decimal('25.00'), status='completed',
+        )
+        before = dict(BalanceSnapshot.objects.filter(child=self.emma).values_list('pk', 'created_at'))
+
+        self.snapshot()
+        self.assertEqual(
+            dict(BalanceSnapshot.objects.filter(child=self.emma).values_list('pk', 'created_at')),
+            before,
+        )
+        today = date.today()
+        self.assertEqual(BalanceSnapshot.balance_on(today, child=self.noah), Decimal('125.00'))
+        self.assertEqual(BalanceSnapshot.balance_on(today, user=self.user), Decimal('425.00'))
+        self.assertEqual(BalanceSnapshot.objects.filter(user=self.user, date=today).count(), 3)
+
+    def test_incremental_run_picks_up_writes_committed_after_the_last_run_read(self):
+        from investments.models import Transaction
+        from .models import BalanceSnapshot
+
+        self.snapshot()
+        last_run = BalanceSnapshot.objects.latest('created_at').created_at
+        Child.objects.update(updated_at=F('updated_at') - timedelta(hours=2))
+        # Saved just before the last run started, committed after it had read
+        Transaction.objects.create(
+            user=self.user, child=self.noah, transaction_type='investment',
+            amount=Decimal('25.00'), status='completed',
+        )
+        Child.objects.filter(pk=self.noah.pk).update(updated_at=last_run - timedelta(seconds=1))
+        Transaction.objects.update(updated_at=last_run - timedelta(seconds=1))
+
+        self.snapshot()
+        self.assertEqual(BalanceSnapshot.balance_on(date.today(), child=self.noah), Decimal('125.00'))
+
+    def test_incremental_run_picks_up_users_who_lost_a_child(self):
+        from .models import BalanceSnapshot
+
+        self.snapshot()
+        User.objects.update(updated_at=F('updated_at') - timedelta(hours=2))
+        Child.objects.update(updated_at=F('updated_at') - timedelta(hours=2))
+        BalanceSnapshot.objects.update(created_at=F('created_at') - timedelta(hours=1))
+
+        self.noah.delete()
+        self.snapshot()
+        self.assertEqual(BalanceSnapshot.balance_on(date.today(), user=self.user), Decimal('300.00'))
+
+        BalanceSnapshot.objects.update(created_at=F('created_at') - timedelta(hours=1))
+        self.emma.delete()
+        self.snapshot()
+        self.assertEqual(BalanceSnapshot.balance_on(date.today(), user=self.user), Decimal('0.00'))
+
+    def test_run_drops_the_cached_dashboard_stats_of_snapshotted_users(self):
+        from .stats import get_dashboard_stats, stats_cache_key
+
+        use_price_feed(self)
+        get_dashboard_stats(self.user)
+        self.assertIsNotNone(cache.get(stats_cache_key(self.user.pk)))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.snapshot()
+        self.assertIsNone(cache.get(stats_cache_key(self.user.pk)))
+
+    def test_balance_on_is_a_single_lookup(self):
+        from .models import BalanceSnapshot
+
+        for days_ago, balance in [(10, '100.00'), (5, '150.00'), (1, '175.00')]:
+            BalanceSnapshot.objects.create(
+                user=self.user, child=self.emma,
+                date=date.today() - timedelta(days=days_ago), balance=Decimal(balance),
+            )
+        with self.assertNumQueries(1):
+            balance = BalanceSnapshot.balance_on(date.today() - timedelta(days=3), child=self.emma)
+        self.assertEqual(balance, Decimal('150.00'))
+
+    def test_dashboard_percentage_change_uses_snapshots(self):
+        from django.conf import settings
+        from .models import BalanceSnapshot
+        from .stats import compute_dashboard_stats
+
+        BalanceSnapshot.objects.create(
+            user=self.user,
+            date=date.today() - timedelta(days=settings.DASHBOARD_PERCENTAGE_CHANGE_DAYS + 2),
+            balance=Decimal('320.00'),
+        )
+        with self.assertNumQueries(1):
+            stats = compute_dashboard_stats(self.user)
+        self.assertEqual(stats['percentage_change'], 25.0)
+
+
+class UserEndpointTests(APITestCase):
+    def setUp(self):
+        from .models import UserProfile
+
+        use_price_feed(self)
+        self.user = User.objects.create_user('parent', 'parent@example.com', 'test123')
+        UserProfile.objects.create(user=self.user, preferred_currency='EUR')
+        User.objects.create_user('other', 'other@example.com', 'test123')
+        self.client.force_authenticate(self.user)
+
+    def add_children(self, count):
+        Child.objects.bulk_create([
+            Child(user=self.user, name=f'Child {i}', date_of_birth=date(2015, 1, 1),
+                  current_balance=Decimal('10.50'))
+            for i in range(count)
+        ])
+
+    def test_constant_queries_regardless_of_children(self):
+        for count in (1, 20):
+            Child.objects.all().delete()
+            self.add_children(count)
+            with self.assertNumQueries(2):
+                response = self.client.get('/api/users/')
+            user = response.json()['results'][0]
+            self.assertEqual(len(user['children']), count)
+            self.assertEqual(Decimal(str(user['total_savings'])), Decimal('9.45') * count)  # USDC in EUR
+            self.assertEqual(user['profile']['preferred_currency'], 'EUR')
+
+    def test_only_the_requesting_user_is_listed(self):
+        rows = self.client.get('/api/users/').json()['results']
+        self.assertEqual([row['username'] for row in rows], ['parent'])
+        other = User.objects.get(username='other')
+        self.assertEqual(self.client.get(f'/api/users/{other.pk}/').status_code, 404)
+
+    def test_currency_without_prices_is_unavailable_not_zero(self):
+        from django.core.exceptions import ValidationError
+
+        self.add_children(1)
+        profile = self.user.profile
+        profile.preferred_currency = 'JPY'
+        with self.assertRaises(ValidationError):
+            profile.full_clean()
+        profile.save()  # Saved around validation, as an older row may be
+        self.assertEqual(self.client.get('/api/users/').status_code, 503)
+        self.assertEqual(self.client.get('/api/dashboard-stats/').status_code, 503)
+
+    def test_user_without_children_or_profile(self):
+        self.client.force_authenticate(User.objects.get(username='other'))
+        user = self.client.get('/api/users/').json()['results'][0]
+        self.assertEqual(user['total_savings'], 0)
+        self.assertIsNone(user['profile'])
+
+
+class TokenAuthenticationTests(APITestCase):
+    def setUp(self):
+        clear_token_cache()
+        self.addCleanup(clear_token_cache)
+        self.user = User.objects.create_user('parent', 'parent@example.com', 'test123')
+        response = self.client.post('/api/login/', {'username': 'parent', 'password': 'test123'})
+        self.token = response.json()['token']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
+
+    def token_lookups(self):
+        """(status of GET /api/children/, queries it made against authtoken_token)"""
+        with CaptureQueriesContext(connection) as queries:
+            status = self.client.get('/api/children/').status_code
+        return status, sum('authtoken_token' in query['sql'] for query in queries)
+
+    def test_login_reuses_the_token(self):
+        response = self.client.post('/api/login/', {'username': 'parent', 'password': 'test123'})
+        self.assertEqual(response.json()['token'], self.token)
+
+    def test_token_lookup_is_cached(self):
+        self.assertEqual(self.token_lookups(), (200, 1))
+        self.assertEqual(self.token_lookups(), (200, 0))
+        self.client.credentials(HTTP_AUTHORIZATION='Token not-a-token')
+        self.assertEqual(self.token_lookups(), (401, 1))
+
+    def test_logout_invalidates_the_cached_token(self):
+        self.token_lookups()
+        self.assertEqual(self.client.post('/api/logout/').status_code, 204)
+        self.assertEqual(self.token_lookups(), (401, 1))
+        self.client.credentials()
+        response = self.client.post('/api/login/', {'username': 'parent', 'password': 'test123'})
+        self.assertNotEqual(response.json()['token'], self.token)
+
+    def test_saving_the_user_invalidates_its_cached_tokens(self):
+        self.token_lookups()
+        self.user.set_password('changed')
+        self.user.save()
+        self.assertEqual(self.token_lookups(), (200, 1))
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.token_lookups(), (401, 1))
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTests(APITestCase):
+    """Against a second SQLite file standing in for a replica that has not caught up yet"""
+    databases = '__all__'  # 'replica' is only added in setUpClass
+
+    @classmethod
+    def setUpClass(cls):
+        cls.replica_dir = tempfile.mkdtemp()
+        replica = sqlite_database(os.path.join(cls.replica_dir, 'replica.sqlite3'))
+        connections.settings['replica'] = connections.configure_settings({'default': replica})['default']
+        call_command('migrate', database='replica', verbosity=0)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections['replica'].close()
+        del connections['replica']
+        del connections.settings['replica']
+        shutil.rmtree(cls.replica_dir)
+
+    def setUp(self):
+        cache.clear()
+        use_price_feed(self)
+        self.user = User.objects.create_user('parent', 'parent@example.com', 'test123')
+        Child.objects.create(user=self.user, name='Written', date_of_birth=date(2018, 1, 1))
+        copy.copy(self.user).save(using='replica')  # Keeps self.user bound to the primary
+        Child.objects.using('replica').create(user=self.user, name='Replicated', date_of_birth=date(2018, 1, 1))
+        self.client.force_authenticate(self.user)
+
+    def child_names(self):
+        return [child['name'] for child in self.client.get('/api/users/').json()['results'][0]['children']]
+
+    def test_read_only_views_read_from_the_replica(self):
+        self.assertEqual(self.child_names(), ['Replicated'])
+        # Writable views stay on the primary
+        self.assertEqual([row['name'] for row in self.client.get('/api/children/').json()['results']], ['Written'])
+
+    def test_reads_stay_on_the_primary_after_a_write(self):
+        response = self.client.post('/api/children/', {'name': 'New', 'date_of_birth': '2021-01-01'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(sorted(self.child_names()), ['New', 'Written'])
+        cache.clear()  # The pin expires
+        self.assertEqual(self.child_names(), ['Replicated'])
+
+    def test_missing_replica_falls_back_to_the_primary(self):
+        with self.settings(DATABASE_REPLICAS=['missing', 'replica']), self.assertLogs('baby_wallet_backend.replicas'):
+            with mock.patch('random.shuffle'), replica_reads() as alias:  # Tried in the listed order
+                self.assertEqual(alias, 'replica')
+        with self.settings(DATABASE_REPLICAS=['missing']), self.assertLogs('baby_wallet_backend.replicas'):
+            self.assertEqual(self.child_names(), ['Written'])
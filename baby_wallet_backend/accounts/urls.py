@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import UserViewSet, ChildViewSet, LoginView, DashboardStatsView
+from .views import UserViewSet, ChildViewSet, LoginView, LogoutView, DashboardStatsView
 
 # Create a router and register our viewsets with it.
 router = DefaultRouter()
@@ -10,6 +10,7 @@ router.register(r'children', ChildViewSet, basename='child')
 # The API URLs are now determined automatically by the router.
 urlpatterns = [
     path('login/', LoginView.as_view(), name='login'),
+    path('logout/', LogoutView.as_view(), name='logout'),
     path('dashboard-stats/', DashboardStatsView.as_view(), name='dashboard-stats'),
     path('', include(router.urls)),
 ] 
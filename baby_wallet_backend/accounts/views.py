@@ -1,24 +1,53 @@
 from rest_framework.authtoken.models import Token
 from rest_framework import viewsets, permissions, status
+from rest_framework.exceptions import APIException
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from django.contrib.auth import authenticate
+from django.contrib.auth import authenticate, logout
 from django.views.generic import TemplateView
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from .models import User, Child
 from .serializers import UserSerializer, ChildSerializer, LoginSerializer
+from .stats import get_dashboard_stats, portfolio_annotations
+from investments.prices import PriceUnavailable
+from baby_wallet_backend.replicas import ReplicaReadMixin
 
 # Create your views here.
 
-class UserViewSet(viewsets.ReadOnlyModelViewSet):
+class PricesUnavailable(APIException):
+    status_code = 503
+    default_detail = 'Token prices are unavailable, try again later.'
+    default_code = 'prices_unavailable'
+
+
+class PricesUnavailableMixin:
+    """For DRF views that value holdings: PriceUnavailable, however deep it is raised, answers 503"""
+
+    def handle_exception(self, exc):
+        if isinstance(exc, PriceUnavailable):
+            exc = PricesUnavailable()
+        return super().handle_exception(exc)
+
+
+class UserViewSet(PricesUnavailableMixin, ReplicaReadMixin, viewsets.ReadOnlyModelViewSet):
     """
     API endpoint that allows users to be viewed.
+    Only the requesting user is visible, loaded with a fixed number of queries
+    from a read replica.
     """
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    def get_queryset(self):
+        return (
+            User.objects.filter(pk=self.request.user.pk)
+            .select_related('profile')
+            .prefetch_related('children')
+            .annotate(**portfolio_annotations())
+        )
+
 
 class ChildViewSet(viewsets.ModelViewSet):
     """
@@ -58,9 +87,8 @@ class LoginView(APIView):
         )
 
         if user:
-            # Delete old token and create a new one
-            Token.objects.filter(user=user).delete()
-            token = Token.objects.create(user=user)
+            # Reuse the user's token; it is only replaced on logout
+            token, _ = Token.objects.get_or_create(user=user)
             return Response({'token': token.key})
         
         return Response(
@@ -69,47 +97,31 @@ class LoginView(APIView):
         )
 
 
+class LogoutView(APIView):
+    """
+    Deletes the caller's auth token, so it stops working at once, and ends
+    the browser session if there is one.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        Token.objects.filter(user=request.user).delete()
+        logout(request)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
 class LoginTemplateView(TemplateView):
     template_name = "login.html"
 
 
-class DashboardStatsView(APIView):
+class DashboardStatsView(PricesUnavailableMixin, APIView):
     """
     Provides statistics for the user's dashboard.
+    Served from a per-user cache that is dropped whenever the user's
+    children, investments or transactions change, and valued in the user's
+    preferred currency at the cached token prices.
     """
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request, *args, **kwargs):
-        from decimal import Decimal
-        from investments.models import Investment
-        
-        user = request.user
-        children = user.children.all()
-        
-        # Calculate total savings (wallet balances + investment values)
-        total_wallet_balances = sum(child.current_balance for child in children)
-        total_investment_values = sum(
-            investment.total_contributed 
-            for investment in Investment.objects.filter(user=user, status='active')
-        )
-        
-        total_savings = total_wallet_balances + total_investment_values
-        child_count = children.count()
-        
-        # TODO: Implement percentage change calculation
-        # For now, we'll use 0% as placeholder
-        # Future implementation will use daily snapshots for accurate calculation
-        percentage_change = Decimal('0.00')
-        
-        # You can add more stats here, e.g., total investments, growth percentage, etc.
-        
-        stats = {
-            'total_savings': float(total_savings),  # Convert to float for JSON serialization
-            'total_wallet_balances': float(total_wallet_balances),
-            'total_investment_values': float(total_investment_values),
-            'percentage_change': float(percentage_change),
-            'child_count': child_count,
-            'active_investments': user.investments.filter(status='active').count(),
-        }
-        
-        return Response(stats)
+        return Response(get_dashboard_stats(request.user))
@@ -0,0 +1,107 @@
+"""
+Database profiles selected through the environment by settings.py.
+
+DATABASE_PROFILE=sqlite (the default) is meant for a single node: WAL lets
+readers carry on while one writer commits, writers wait up to
+SQLITE_BUSY_TIMEOUT seconds for the lock instead of failing, and taking the
+write lock when a transaction begins (IMMEDIATE) avoids the lock upgrade
+that SQLite refuses outright with "database is locked".
+
+DATABASE_PROFILE=postgres is meant for several workers: each process keeps
+a psycopg connection pool (DATABASE_POOL_MAX_SIZE connections), or, with
+DATABASE_POOL=0 behind an external pooler such as PgBouncer, persistent
+connections reused for DATABASE_CONN_MAX_AGE seconds.
+
+Read replicas are listed in SQLITE_REPLICA_PATHS or POSTGRES_REPLICA_HOSTS
+(comma-separated) and become the aliases replica_1, replica_2, ...; see
+baby_wallet_backend/replicas.py for which reads they serve.
+"""
+
+SQLITE_PRAGMAS = [
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',  # With WAL, durable across crashes of the process, not of the host
+    'PRAGMA cache_size=-20000',  # 20 MB page cache per connection
+    'PRAGMA temp_store=MEMORY',
+]
+
+
+def sqlite_database(path, busy_timeout=20, conn_max_age=600):
+    """A SQLite database tuned for concurrent requests on one node"""
+    return {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': path,
+        'CONN_MAX_AGE': conn_max_age,
+        'OPTIONS': {
+            'timeout': busy_timeout,
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': ';'.join(SQLITE_PRAGMAS),
+        },
+    }
+
+
+def postgres_database(name, user='', password='', host='', port='', pool=True, pool_min_size=2,
+                      pool_max_size=10, pool_timeout=10, conn_max_age=600):
+    """A PostgreSQL database with a connection pool, or persistent connections when pool is False"""
+    database = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': name,
+        'USER': user,
+        'PASSWORD': password,
+        'HOST': host,
+        'PORT': port,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {},
+    }
+    if pool:
+        # Pooled connections go back to the pool after each request; Django refuses CONN_MAX_AGE with a pool
+        database['CONN_MAX_AGE'] = 0
+        database['OPTIONS']['pool'] = {'min_size': pool_min_size, 'max_size': pool_max_size, 'timeout': pool_timeout}
+    else:
+        database['CONN_MAX_AGE'] = conn_max_age
+    return database
+
+
+def database_from_environment(environ, base_dir):
+    """The default database for DATABASE_PROFILE, configured from the other variables"""
+    profile = environ.get('DATABASE_PROFILE', 'sqlite')
+    conn_max_age = int(environ.get('DATABASE_CONN_MAX_AGE', 600))
+    if profile == 'sqlite':
+        return sqlite_database(
+            environ.get('SQLITE_PATH', str(base_dir / 'db.sqlite3')),
+            busy_timeout=float(environ.get('SQLITE_BUSY_TIMEOUT', 20)),
+            conn_max_age=conn_max_age,
+        )
+    if profile == 'postgres':
+        return postgres_database(
+            environ.get('POSTGRES_DB', 'baby_wallet'),
+            user=environ.get('POSTGRES_USER', ''),
+            password=environ.get('POSTGRES_PASSWORD', ''),
+            host=environ.get('POSTGRES_HOST', ''),
+            port=environ.get('POSTGRES_PORT', ''),
+            pool=environ.get('DATABASE_POOL', '1') != '0',
+            pool_min_size=int(environ.get('DATABASE_POOL_MIN_SIZE', 2)),
+            pool_max_size=int(environ.get('DATABASE_POOL_MAX_SIZE', 10)),
+            conn_max_age=conn_max_age,
+        )
+    raise ValueError(f"DATABASE_PROFILE must be 'sqlite' or 'postgres', not {profile!r}")
+
+
+def replica_databases_from_environment(environ, primary):
+    """{alias: settings} of the replicas of `primary`, mirrored to it in tests"""
+    if primary['ENGINE'].endswith('sqlite3'):
+        replicas = []
+        for path in filter(None, environ.get('SQLITE_REPLICA_PATHS', '').split(',')):
+            # Read-only, so a missing file fails to connect instead of being created empty
+            replica = sqlite_database(f'file:{path.strip()}?mode=ro', conn_max_age=primary['CONN_MAX_AGE'])
+            # The journal mode belongs to whatever writes the file
+            replica['OPTIONS'].update(uri=True, transaction_mode=None, init_command=';'.join(SQLITE_PRAGMAS[1:]))
+            replicas.append(replica)
+    else:
+        replicas = [
+            {**primary, 'HOST': host.strip(), 'OPTIONS': {**primary['OPTIONS']}}
+            for host in filter(None, environ.get('POSTGRES_REPLICA_HOSTS', '').split(','))
+        ]
+    return {
+        f'replica_{n}': {**replica, 'TEST': {'MIRROR': 'default'}}
+        for n, replica in enumerate(replicas, start=1)
+    }
@@ -0,0 +1,155 @@
+"""
+Read replicas for read-only traffic.
+
+Reads go to the primary unless they run inside replica_reads(), which
+read-only viewsets (ReplicaReadMixin), admin changelists
+(ReplicaChangeListMixin) and reporting jobs enter. Inside it ReplicaRouter
+sends every read to one replica out of DATABASE_REPLICAS, picked once so
+the whole block sees the same replica, while writes still go to the
+primary. A user who has just written is pinned to the primary for
+REPLICA_PIN_SECONDS so they read their own writes, and a replica that
+cannot be connected to is skipped for REPLICA_RETRY_SECONDS.
+"""
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.signals import setting_changed
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.dispatch import receiver
+from rest_framework.permissions import SAFE_METHODS
+
+
+logger = logging.getLogger(__name__)
+
+_read_alias = ContextVar('replica_read_alias', default=None)
+_unavailable = {}  # alias -> time.monotonic() until which it is skipped
+_unavailable_lock = threading.Lock()
+
+
+def pin_key(user_id):
+    return f'replica-pin:{user_id}'
+
+
+def pin_to_primary(user_id):
+    """Send `user_id`'s reads to the primary until their write has reached the replicas"""
+    if settings.DATABASE_REPLICAS:
+        cache.set(pin_key(user_id), True, settings.REPLICA_PIN_SECONDS)
+
+
+def is_pinned(user_id):
+    return cache.get(pin_key(user_id)) is not None
+
+
+def replica_available(alias):
+    if alias not in connections:
+        logger.warning('Replica %s is not configured in DATABASES', alias)
+        return False
+    if _unavailable.get(alias, 0) > time.monotonic():
+        return False
+    try:
+        connections[alias].ensure_connection()
+    except DatabaseError:
+        logger.warning('Replica %s is unavailable, reading from the primary', alias, exc_info=True)
+        with _unavailable_lock:
+            _unavailable[alias] = time.monotonic() + settings.REPLICA_RETRY_SECONDS
+        return False
+    return True
+
+
+def choose_replica(user_id=None):
+    """A reachable replica alias, or None when reads must stay on the primary"""
+    if not settings.DATABASE_REPLICAS or (user_id is not None and is_pinned(user_id)):
+        return None
+    aliases = list(settings.DATABASE_REPLICAS)
+    random.shuffle(aliases)
+    return next((alias for alias in aliases if replica_available(alias)), None)
+
+
+@contextmanager
+def replica_reads(user_id=None):
+    """Route the reads of the block to one replica, unless `user_id` has written recently"""
+    token = _read_alias.set(choose_replica(user_id))
+    try:
+        yield _read_alias.get() or DEFAULT_DB_ALIAS
+    finally:
+        _read_alias.reset(token)
+
+
+def clear_unavailable_replicas():
+    with _unavailable_lock:
+        _unavailable.clear()
+
+
+@receiver(setting_changed)
+def clear_unavailable_replicas_on_setting_change(setting, **kwargs):
+    if setting.startswith('REPLICA_') or setting in ('DATABASE_REPLICAS', 'DATABASES'):
+        clear_unavailable_replicas()
+
+
+class ReplicaRouter:
+    """Reads inside replica_reads() go to its replica; everything else goes to the primary"""
+
+    def db_for_read(self, model, **hints):
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replicas hold the primary's rows, so objects may be related across them
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+class PinWritesMiddleware:
+    """Pins the user to the primary after any request that may have written"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        # DRF sets the user it authenticated on the underlying request as well
+        user = getattr(request, 'user', None)
+        if request.method not in SAFE_METHODS and user is not None and user.is_authenticated:
+            pin_to_primary(user.pk)
+        return response
+
+
+class ReplicaReadMixin:
+    """For DRF views: safe requests read from a replica once the user is authenticated"""
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in SAFE_METHODS:
+            user_id = request.user.pk if request.user.is_authenticated else None
+            self._replica_token = _read_alias.set(choose_replica(user_id))
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, '_replica_token', None)
+        if token is not None:
+            _read_alias.reset(token)
+            self._replica_token = None
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class ReplicaChangeListMixin:
+    """For ModelAdmins: changelist pages are built and rendered from a replica"""
+
+    def changelist_view(self, request, extra_context=None):
+        if request.method not in SAFE_METHODS:
+            return super().changelist_view(request, extra_context)
+        with replica_reads(request.user.pk):
+            response = super().changelist_view(request, extra_context)
+            # The result list is a lazy queryset evaluated by the template
+            if hasattr(response, 'render'):
+                response.render()
+        return response
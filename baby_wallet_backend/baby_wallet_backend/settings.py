@@ -13,6 +13,8 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 from pathlib import Path
 import os
 
+from .databases import database_from_environment, replica_databases_from_environment
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -59,6 +61,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'baby_wallet_backend.replicas.PinWritesMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -87,12 +90,61 @@ WSGI_APPLICATION = 'baby_wallet_backend.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# DATABASE_PROFILE selects WAL-tuned SQLite (the default, for one node) or
+# pooled PostgreSQL (for several workers); see baby_wallet_backend/databases.py
+
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': database_from_environment(os.environ, BASE_DIR),
 }
+DATABASES.update(replica_databases_from_environment(os.environ, DATABASES['default']))
+
+# Read-only API views, admin changelists and reporting jobs read from these
+DATABASE_ROUTERS = ['baby_wallet_backend.replicas.ReplicaRouter']
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+REPLICA_PIN_SECONDS = 5  # reads of a user who just wrote stay on the primary, above the replication lag
+REPLICA_RETRY_SECONDS = 30  # an unreachable replica is skipped this long
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Seconds a user's dashboard stats stay cached; writes invalidate them earlier
+DASHBOARD_STATS_CACHE_TIMEOUT = 300
+
+# Dashboard percentage change compares against the balance snapshot this many days back
+DASHBOARD_PERCENTAGE_CHANGE_DAYS = 30
+
+# Seconds of changes each incremental snapshot_balances run re-reads before the
+# previous run started: updated_at is set when a row is saved, not when it
+# commits, so this must be longer than the longest write transaction
+BALANCE_SNAPSHOT_MARGIN = 300
+
+# Token prices used to value holdings in each user's preferred currency: a
+# JSON feed file by default (see investments.prices.FilePriceSource), CoinGecko
+# when PRICE_SOURCE=coingecko
+if os.environ.get('PRICE_SOURCE') == 'coingecko':
+    PRICE_SOURCE = {'BACKEND': 'investments.prices.CoinGeckoPriceSource'}
+else:
+    PRICE_SOURCE = {
+        'BACKEND': 'investments.prices.FilePriceSource',
+        'OPTIONS': {'path': os.environ.get('PRICE_FEED_FILE', str(BASE_DIR / 'price_feed.json'))},
+    }
+PRICE_CACHE_TTL = 60  # seconds each process reuses fetched prices
+PRICE_DEFAULT_CURRENCY = 'USD'  # for users without a profile
 
 
 # Password validation
@@ -147,14 +199,41 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'accounts.authentication.CachedTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    'DEFAULT_PAGINATION_CLASS': 'baby_wallet_backend.pagination.CreatedAtCursorPagination',
+    'PAGE_SIZE': 50,
 }
 
+# Seconds a token -> user lookup is reused by CachedTokenAuthentication in one
+# process; logout, token rotation and user saves invalidate it earlier there
+AUTH_TOKEN_CACHE_TTL = 60
+AUTH_TOKEN_CACHE_SIZE = 10000
+
+# Sessions read through the cache, written through to the database
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
+# Most recent transactions embedded per investment with ?expand=transactions
+INVESTMENT_EXPANDED_TRANSACTIONS = 10
+
+# Maximum number of rows accepted by POST /api/transactions/bulk/
+TRANSACTION_BULK_MAX_ROWS = 5000
+
+# Rows fetched per round trip while streaming transactions into tax reports
+TAX_REPORT_CHUNK_SIZE = 2000
+
+# Rows read and written per round trip while syncing and rebuilding cost-basis positions
+COST_BASIS_CHUNK_SIZE = 5000
+
+# Seconds of transaction updates each cost-basis sync re-reads before the
+# previous sync started: updated_at is set when a row is saved, not when it
+# commits, so this must be longer than the longest write transaction
+COST_BASIS_SYNC_MARGIN = 300
+
 # CORS settings
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:8000",
@@ -173,6 +252,48 @@ BLOCKCHAIN_NETWORK = 'sepolia'
 ETHEREUM_RPC_URL = 'https://sepolia.infura.io/v3/your-project-id'
 CONTRACT_ADDRESS = ''
 
+# JSON-RPC endpoint per network, used by blockchain.rpc.get_client()
+BLOCKCHAIN_RPC_URLS = {
+    BLOCKCHAIN_NETWORK: os.environ.get('ETHEREUM_RPC_URL', ETHEREUM_RPC_URL),
+}
+BLOCKCHAIN_RPC_TIMEOUT = 10  # seconds per attempt
+BLOCKCHAIN_RPC_RETRIES = 3
+BLOCKCHAIN_RPC_POOL_SIZE = 20  # keep-alive connections per network
+BLOCKCHAIN_REQUIRED_CONFIRMATIONS = 12  # Depth at which poll_receipts marks a transaction confirmed
+BLOCKCHAIN_TOKEN_DECIMALS = {'USDC': 6, 'USDT': 6, 'ETH': 18, 'BTC': 8}
+# NFT minting (blockchain.minting): node-managed account that sends mintBatch transactions
+BLOCKCHAIN_MINTER_ADDRESS = os.environ.get('BLOCKCHAIN_MINTER_ADDRESS', '')
+BLOCKCHAIN_MINT_BATCH_SIZE = 100  # tokens per mintBatch transaction
+# On-chain TVL (blockchain.tvl): balances are read through Multicall3, deployed at this address on most chains
+BLOCKCHAIN_MULTICALL_ADDRESS = '0xcA11bde05977b3631167028862bE2a173976CA11'
+BLOCKCHAIN_MULTICALL_CHUNK = 500  # balance reads per aggregate3 call
+BLOCKCHAIN_TOKEN_ADDRESSES = {
+    'mainnet': {
+        'USDC': '0xA0b86991c6218b36c1d19D4a2e9Eb0cE3606eB48',
+        'USDT': '0xdAC17F958D2ee523a2206206994597C13D831ec7',
+    },
+    'sepolia': {
+        'USDC': '0x1c7D4B196Cb0C7B01d743Fbc6116a902379C7238',
+    },
+}
+# Event indexer (index_events)
+BLOCKCHAIN_INDEXER_RANGE = 2000  # initial blocks per eth_getLogs call, adapted while running
+BLOCKCHAIN_INDEXER_MAX_RANGE = 50000
+BLOCKCHAIN_INDEXER_BATCH = 5  # eth_getLogs calls per JSON-RPC batch
+BLOCKCHAIN_INDEXER_CHECKPOINTS = 128  # recent block hashes kept to find the common ancestor after a reorg
+
+# Latest gas price cache: a process-local copy, optionally shared through CACHES
+GAS_PRICE_LOCAL_TTL = 5  # seconds before re-reading another process's samples
+GAS_PRICE_SHARED_CACHE = bool(os.environ.get('REDIS_URL'))
+GAS_PRICE_SHARED_CACHE_TIMEOUT = 300
+# Gas price retention enforced by downsample_gas_prices
+GAS_PRICE_RAW_RETENTION_HOURS = 24  # then per-minute rollups
+GAS_PRICE_MINUTE_RETENTION_DAYS = 30  # then per-hour rollups, kept indefinitely
+# Fee statistics served by /api/gas-stats/<network>/
+GAS_PRICE_STATS_WINDOW = 200  # most recent samples
+GAS_PRICE_EMA_SPAN = 20  # samples
+GAS_PRICE_FORECAST_BLOCKS = 5
+
 # Email settings (for production)
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 EMAIL_HOST = 'localhost'
@@ -0,0 +1,110 @@
+import re
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from accounts.models import Child, User, UserProfile
+from investments.models import Investment, Transaction
+from investments.testing import PriceFeed
+
+
+# (route, exact number of queries, maximum latency in ms) for an authenticated user
+ROUTE_BUDGETS = [
+    ('/api/children/', 1, 300),
+    ('/api/investments/', 1, 300),
+    ('/api/investments/?expand=transactions', 2, 600),
+    ('/api/transactions/', 1, 300),
+    ('/api/transactions/?status=completed', 1, 300),
+    ('/api/users/', 2, 300),
+    ('/api/dashboard-stats/', 1, 300),
+]
+
+# A plan step reading every row of a table; scans of subqueries and CTEs are fine
+FULL_SCAN = re.compile(r'^SCAN (?!\(|CONSTANT ROW|qualify|subquery)\S+$')
+
+
+def query_plan(sql):
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+        return [str(row[-1]) for row in cursor.fetchall()]
+
+
+class QueryBudgetTests(APITestCase):
+    """
+    Every API route against a scaled dataset: a fixed number of queries
+    whatever the number of rows (an N+1 shows up as dozens), a latency
+    ceiling, and no full table scan in the plans of the queries it runs.
+    """
+    users = 10
+    children = 10
+    investments = 100
+    transactions = 1000
+
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        for n in range(cls.users):
+            user = User.objects.create(username=f'budget-{n}', email=f'budget-{n}@example.com')
+            UserProfile.objects.create(user=user)
+            children = Child.objects.bulk_create([
+                Child(user=user, name=f'Child {c}', date_of_birth=date(2018, 1, 1), current_balance=Decimal('10.00'))
+                for c in range(cls.children)
+            ])
+            investments = Investment.objects.bulk_create([
+                Investment(user=user, child=children[i % cls.children], investment_type='recurring',
+                           frequency='monthly', amount=Decimal('5.00'), start_date=date.today())
+                for i in range(cls.investments)
+            ])
+            Transaction.objects.bulk_create([
+                Transaction(user=user, child=children[i % cls.children], investment=investments[i % cls.investments],
+                            transaction_type='investment', amount=Decimal('1.00'), status='completed',
+                            created_at=now - timedelta(minutes=i))
+                for i in range(cls.transactions)
+            ])
+        cls.user = user
+        if connection.vendor == 'sqlite':
+            # Plan with statistics of the seeded rows, as a production database would
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+    def setUp(self):
+        feed = PriceFeed({'USD': {'USDC': '1.00'}})
+        feed.enable()
+        self.addCleanup(feed.disable)
+        self.client.force_authenticate(self.user)
+
+    def get(self, url):
+        cache.clear()  # Dashboard stats are measured on a cache miss
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = self.client.get(url)
+            elapsed = (time.perf_counter() - start) * 1000
+        self.assertEqual(response.status_code, 200, response.content)
+        return queries.captured_queries, elapsed
+
+    def test_query_budgets(self):
+        for url, budget, _ in ROUTE_BUDGETS:
+            with self.subTest(url):
+                queries, _ = self.get(url)
+                self.assertEqual(len(queries), budget, '\n'.join(query['sql'] for query in queries))
+
+    def test_latency_budgets(self):
+        for url, _, max_ms in ROUTE_BUDGETS:
+            with self.subTest(url):
+                elapsed = min(self.get(url)[1] for _ in range(3))
+                self.assertLess(elapsed, max_ms)
+
+    def test_no_full_table_scans(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('Plans are read from EXPLAIN QUERY PLAN')
+        for url, _, _ in ROUTE_BUDGETS:
+            for query in self.get(url)[0]:
+                with self.subTest(url, sql=query['sql'][:80]):
+                    plan = query_plan(query['sql'])
+                    self.assertEqual([step for step in plan if FULL_SCAN.match(step)], [], plan)
@@ -0,0 +1,75 @@
+from eth_abi import decode, encode
+from eth_utils import keccak
+
+
+def canonical_type(component):
+    """Solidity type of an ABI input as used in signatures, expanding tuples"""
+    if component['type'].startswith('tuple'):
+        inner = ','.join(canonical_type(child) for child in component.get('components', []))
+        return f"({inner}){component['type'][len('tuple'):]}"
+    return component['type']
+
+
+def event_signature(event):
+    return f"{event['name']}({','.join(canonical_type(item) for item in event.get('inputs', []))})"
+
+
+def event_topic(event):
+    """topic0 of an event: keccak-256 of its canonical signature, 0x-prefixed"""
+    return '0x' + keccak(text=event_signature(event)).hex()
+
+
+def function_selector(signature):
+    """First four bytes of the keccak-256 of a function signature such as 'mint(address,uint256)'"""
+    return keccak(text=signature)[:4]
+
+
+def encode_call(signature, args):
+    """0x-prefixed call data for `signature` applied to `args`"""
+    types = signature[signature.index('(') + 1:-1]
+    arguments = encode(split_types(types), list(args)) if types else b''
+    return '0x' + (function_selector(signature) + arguments).hex()
+
+
+def split_types(types):
+    """Split a comma-separated type list at its top level, keeping tuple types whole"""
+    parts, depth, start = [], 0, 0
+    for index, char in enumerate(types):
+        depth += {'(': 1, ')': -1}.get(char, 0)
+        if char == ',' and depth == 0:
+            parts.append(types[start:index])
+            start = index + 1
+    parts.append(types[start:])
+    return parts
+
+
+def contract_events(abi):
+    """Map topic0 to the ABI entry of every non-anonymous event in `abi`"""
+    return {
+        event_topic(entry): entry for entry in abi or []
+        if entry.get('type') == 'event' and not entry.get('anonymous')
+    }
+
+
+def decode_log(event, log):
+    """
+    Decode a JSON-RPC log against its event ABI entry into a dict of
+    argument values. Indexed arguments come from topics (dynamic ones stay
+    as their 32-byte hash), the rest from the ABI-encoded data.
+    """
+    inputs = event.get('inputs', [])
+    indexed = [item for item in inputs if item.get('indexed')]
+    plain = [item for item in inputs if not item.get('indexed')]
+    topics = log['topics'][1:]
+    if len(topics) != len(indexed):
+        raise ValueError(f"{event['name']} expects {len(indexed)} indexed topics, got {len(topics)}")
+
+    args = {}
+    for item, topic in zip(indexed, topics):
+        if item['type'] in ('string', 'bytes') or item['type'].endswith(']') or item['type'].startswith('tuple'):
+            args[item['name']] = topic
+        else:
+            args[item['name']] = decode([item['type']], bytes.fromhex(topic[2:]))[0]
+    values = decode([canonical_type(item) for item in plain], bytes.fromhex(log['data'][2:])) if plain else ()
+    args.update(zip((item['name'] for item in plain), values))
+    return args
@@ -1,5 +1,7 @@
 from django.contrib import admin
-from .models import SmartContract, NFT, BlockchainTransaction, GasTracker
+from .models import (
+    ContractArtifact, SmartContract, NFT, BlockchainTransaction, GasTracker, GasPriceRollup, IndexerCheckpoint,
+)
 
 
 @admin.register(SmartContract)
@@ -8,26 +10,42 @@ class SmartContractAdmin(admin.ModelAdmin):
     list_filter = ('contract_type', 'network', 'status', 'deployed_at', 'created_at')
     search_fields = ('contract_address', 'child__name', 'user__email')
     ordering = ('-created_at',)
+    list_select_related = ('child__user', 'user')
+    raw_id_fields = ('artifact',)
     
     fieldsets = (
         ('Basic Information', {
-            'fields': ('user', 'child', 'investment', 'contract_type', 'network')
+            'fields': ('user', 'child', 'investment', 'contract_type', 'network', 'token')
         }),
         ('Contract Details', {
-            'fields': ('contract_address', 'status', 'deployment_hash')
+            'fields': ('contract_address', 'status', 'deployment_hash', 'next_token_id')
         }),
         ('Blockchain Data', {
             'fields': ('block_number', 'gas_used', 'gas_price')
         }),
         ('Contract Data', {
-            'fields': ('contract_abi', 'contract_bytecode', 'constructor_args')
+            'fields': ('artifact', 'constructor_args')
         }),
         ('Timestamps', {
             'fields': ('deployed_at',)
         }),
     )
     
-    readonly_fields = ('deployed_at', 'created_at', 'updated_at')
+    readonly_fields = ('next_token_id', 'deployed_at', 'created_at', 'updated_at')
+
+
+@admin.register(ContractArtifact)
+class ContractArtifactAdmin(admin.ModelAdmin):
+    list_display = ('content_hash', 'created_at')
+    search_fields = ('content_hash',)
+    ordering = ('-created_at',)
+    readonly_fields = ('content_hash', 'abi', 'bytecode', 'created_at')
+
+    def has_add_permission(self, request):
+        return False  # Created by ContractArtifact.objects.for_content
+
+    def has_change_permission(self, request, obj=None):
+        return False  # Content addressed: an edited artifact would no longer match its hash
 
 
 @admin.register(NFT)
@@ -60,7 +78,7 @@ class NFTAdmin(admin.ModelAdmin):
 
 @admin.register(BlockchainTransaction)
 class BlockchainTransactionAdmin(admin.ModelAdmin):
-    list_display = ('transaction_type', 'user', 'transaction_hash', 'network', 'status', 'gas_cost_eth', 'confirmed_at')
+    list_display = ('transaction_type', 'user', 'transaction_hash', 'network', 'status', 'confirmations', 'gas_cost_eth', 'confirmed_at')
     list_filter = ('transaction_type', 'network', 'status', 'confirmed_at', 'created_at')
     search_fields = ('transaction_hash', 'user__email', 'from_address', 'to_address')
     ordering = ('-created_at',)
@@ -73,7 +91,7 @@ class BlockchainTransactionAdmin(admin.ModelAdmin):
             'fields': ('status', 'from_address', 'to_address', 'value')
         }),
         ('Blockchain Data', {
-            'fields': ('block_number', 'gas_used', 'gas_price', 'data')
+            'fields': ('block_number', 'confirmations', 'gas_used', 'gas_price', 'data')
         }),
         ('Receipt', {
             'fields': ('receipt',)
@@ -100,3 +118,17 @@ class GasTrackerAdmin(admin.ModelAdmin):
     )
     
     readonly_fields = ('timestamp',)
+
+
+@admin.register(GasPriceRollup)
+class GasPriceRollupAdmin(admin.ModelAdmin):
+    list_display = ('network', 'resolution', 'bucket', 'samples', 'min_gwei', 'avg_gwei', 'max_gwei')
+    list_filter = ('network', 'resolution')
+    ordering = ('-bucket',)
+
+
+@admin.register(IndexerCheckpoint)
+class IndexerCheckpointAdmin(admin.ModelAdmin):
+    list_display = ('network', 'block_number', 'block_hash', 'created_at')
+    list_filter = ('network',)
+    ordering = ('-block_number',)
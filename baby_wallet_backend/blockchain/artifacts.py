@@ -0,0 +1,43 @@
+from dataclasses import dataclass
+from functools import lru_cache
+from types import MappingProxyType
+
+from .abi import canonical_type, contract_events
+from .models import ContractArtifact
+
+
+ABI_CACHE_SIZE = 256  # distinct artifacts kept parsed per process
+
+
+@dataclass(frozen=True)
+class ParsedABI:
+    """An artifact's ABI with its lookups built once; shared between callers, so read-only"""
+    entries: tuple
+    events: MappingProxyType  # topic0 -> event entry
+    functions: MappingProxyType  # canonical signature -> function entry
+
+
+EMPTY_ABI = ParsedABI((), MappingProxyType({}), MappingProxyType({}))
+
+
+def parse_abi(abi):
+    functions = {
+        f"{entry['name']}({','.join(canonical_type(item) for item in entry.get('inputs', []))})": entry
+        for entry in abi or [] if entry.get('type') == 'function'
+    }
+    return ParsedABI(tuple(abi or ()), MappingProxyType(contract_events(abi)), MappingProxyType(functions))
+
+
+@lru_cache(maxsize=ABI_CACHE_SIZE)
+def parsed_abi(content_hash):
+    """
+    Parsed ABI of the artifact with `content_hash`. Artifacts are content
+    addressed and never change, so entries need no invalidation; the least
+    recently used ones are evicted past ABI_CACHE_SIZE. Unknown hashes raise
+    ContractArtifact.DoesNotExist and are not cached.
+    """
+    return parse_abi(ContractArtifact.objects.values_list('abi', flat=True).get(content_hash=content_hash))
+
+
+def clear_abi_cache():
+    parsed_abi.cache_clear()
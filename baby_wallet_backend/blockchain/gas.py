@@ -0,0 +1,200 @@
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Avg, Count, ExpressionWrapper, F, FloatField, Max, Min, Sum
+from django.db.models.functions import TruncHour, TruncMinute
+from django.utils import timezone
+
+from .models import GasPriceRollup, GasTracker
+
+
+_latest = {}  # network -> (expires at, latest GasTracker sample or None)
+_latest_lock = threading.Lock()
+
+
+def latest_cache_key(network):
+    return f'gas:latest:{network}'
+
+
+def _is_newer(sample, current):
+    return current is None or (sample.timestamp, sample.pk) >= (current.timestamp, current.pk)
+
+
+def latest_gas_price(network):
+    """
+    Latest GasTracker sample for `network`.
+
+    Served from a process-local copy refreshed whenever this process saves a
+    sample; other processes' samples are picked up through the shared cache
+    (GAS_PRICE_SHARED_CACHE) or the indexed fallback query once the local
+    copy is GAS_PRICE_LOCAL_TTL seconds old.
+    """
+    entry = _latest.get(network)
+    if entry is not None and entry[0] > time.monotonic():
+        return entry[1]
+
+    sample = cache.get(latest_cache_key(network)) if settings.GAS_PRICE_SHARED_CACHE else None
+    if sample is None:
+        sample = GasTracker.objects.filter(network=network).order_by('-timestamp').first()
+        if sample is not None and settings.GAS_PRICE_SHARED_CACHE:
+            cache.set(latest_cache_key(network), sample, settings.GAS_PRICE_SHARED_CACHE_TIMEOUT)
+    with _latest_lock:
+        _latest[network] = (time.monotonic() + settings.GAS_PRICE_LOCAL_TTL, sample)
+    return sample
+
+
+def remember_latest(sample):
+    """Make a freshly saved sample the cached latest price, unless a newer one is already cached"""
+    with _latest_lock:
+        entry = _latest.get(sample.network)
+        if entry is None or _is_newer(sample, entry[1]):
+            _latest[sample.network] = (time.monotonic() + settings.GAS_PRICE_LOCAL_TTL, sample)
+    if settings.GAS_PRICE_SHARED_CACHE and _is_newer(sample, cache.get(latest_cache_key(sample.network))):
+        cache.set(latest_cache_key(sample.network), sample, settings.GAS_PRICE_SHARED_CACHE_TIMEOUT)
+
+
+def clear_latest_cache():
+    with _latest_lock:
+        _latest.clear()
+
+
+def _merge(rollups, existing):
+    """Fold rollups already stored for the same buckets into freshly computed ones"""
+    for rollup in rollups:
+        previous = existing.get(rollup.bucket)
+        if previous is None:
+            continue
+        samples = rollup.samples + previous.samples
+        rollup.avg_gwei = (rollup.avg_gwei * rollup.samples + previous.avg_gwei * previous.samples) / samples
+        rollup.samples = samples
+        rollup.min_gwei = min(rollup.min_gwei, previous.min_gwei)
+        rollup.max_gwei = max(rollup.max_gwei, previous.max_gwei)
+        rollup.first_block = min(rollup.first_block, previous.first_block)
+        rollup.last_block = max(rollup.last_block, previous.last_block)
+    return rollups
+
+
+def _raw_aggregates():
+    return {
+        'samples': Count('id'),
+        'min_gwei': Min('gas_price_gwei'),
+        'avg_gwei': Avg('gas_price_gwei'),
+        'max_gwei': Max('gas_price_gwei'),
+        'first_block': Min('block_number'),
+        'last_block': Max('block_number'),
+    }
+
+
+def _rollup_aggregates():
+    return {
+        'samples': Sum('samples'),
+        'min_gwei': Min('min_gwei'),
+        'avg_gwei': ExpressionWrapper(
+            Sum(F('avg_gwei') * F('samples'), output_field=FloatField()) / Sum('samples'),
+            output_field=FloatField(),
+        ),
+        'max_gwei': Max('max_gwei'),
+        'first_block': Min('first_block'),
+        'last_block': Max('last_block'),
+    }
+
+
+def trunc_datetime(moment, resolution):
+    moment = moment.replace(second=0, microsecond=0)
+    return moment.replace(minute=0) if resolution == 'hour' else moment
+
+
+def _roll_up(network, source, time_field, trunc, resolution, aggregates, start, end):
+    """Summarise `source` rows in [start, end) into `resolution` rollups, then delete them"""
+    with transaction.atomic():
+        rows = source.filter(**{f'{time_field}__gte': start, f'{time_field}__lt': end})
+        # Aggregates are annotated under prefixed names: on minute rollups the
+        # rollup field names would otherwise shadow the columns they sum
+        summaries = (
+            rows.annotate(period=trunc(time_field)).values('period')
+            .annotate(**{f'summary_{name}': expression for name, expression in aggregates.items()})
+            .order_by()
+        )
+        rollups = [
+            GasPriceRollup(
+                network=network, resolution=resolution, bucket=summary['period'],
+                **{name: summary[f'summary_{name}'] for name in aggregates},
+            )
+            for summary in summaries
+        ]
+        if not rollups:
+            return 0
+        existing = {
+            rollup.bucket: rollup for rollup in GasPriceRollup.objects.filter(
+                network=network, resolution=resolution, bucket__in=[rollup.bucket for rollup in rollups],
+            )
+        }
+        GasPriceRollup.objects.bulk_create(
+            _merge(rollups, existing),
+            update_conflicts=True,
+            unique_fields=['network', 'resolution', 'bucket'],
+            update_fields=['samples', 'min_gwei', 'avg_gwei', 'max_gwei', 'first_block', 'last_block'],
+        )
+        deleted, _ = rows.delete()
+    return deleted
+
+
+def _downsample(source, time_field, trunc, resolution, aggregates, cutoff, window):
+    deleted = 0
+    networks = source.filter(**{f'{time_field}__lt': cutoff}).order_by().values_list('network', flat=True).distinct()
+    for network in list(networks):
+        rows = source.filter(network=network)
+        oldest = rows.filter(**{f'{time_field}__lt': cutoff}).aggregate(oldest=Min(time_field))['oldest']
+        start = trunc_datetime(oldest, resolution)
+        while start < cutoff:
+            end = min(start + window, cutoff)
+            deleted += _roll_up(network, rows, time_field, trunc, resolution, aggregates, start, end)
+            start = end
+    return deleted
+
+
+def downsample_gas_prices(now=None, window=timedelta(days=1)):
+    """
+    Enforce gas price retention: raw GasTracker samples older than
+    GAS_PRICE_RAW_RETENTION_HOURS become per-minute rollups, and minute
+    rollups older than GAS_PRICE_MINUTE_RETENTION_DAYS become per-hour
+    rollups. Each `window` of history is rolled up in its own transaction.
+    Returns (raw samples removed, minute rollups removed).
+    """
+    now = now or timezone.now()
+    raw_cutoff = trunc_datetime(now - timedelta(hours=settings.GAS_PRICE_RAW_RETENTION_HOURS), 'minute')
+    minute_cutoff = trunc_datetime(now - timedelta(days=settings.GAS_PRICE_MINUTE_RETENTION_DAYS), 'hour')
+    samples = _downsample(
+        GasTracker.objects.all(), 'timestamp', TruncMinute, 'minute', _raw_aggregates(), raw_cutoff, window,
+    )
+    minutes = _downsample(
+        GasPriceRollup.objects.filter(resolution='minute'), 'bucket', TruncHour, 'hour', _rollup_aggregates(),
+        minute_cutoff, window,
+    )
+    return samples, minutes
+
+
+def gas_price_history(network, since, until=None):
+    """
+    Gas price summaries for `network` from `since` on, oldest first, at the
+    finest resolution still kept: hour rollups, then minute rollups, then raw
+    samples summarised per minute. Each row is a dict with bucket,
+    resolution, samples, min/avg/max_gwei and first/last_block.
+    """
+    until = until or timezone.now()
+    fields = ['bucket', 'resolution', 'samples', 'min_gwei', 'avg_gwei', 'max_gwei', 'first_block', 'last_block']
+    history = list(
+        GasPriceRollup.objects.filter(network=network, bucket__gte=since, bucket__lt=until)
+        .order_by('bucket', 'resolution').values(*fields)
+    )
+    raw = (
+        GasTracker.objects.filter(network=network, timestamp__gte=since, timestamp__lt=until)
+        .annotate(bucket=TruncMinute('timestamp')).values('bucket').annotate(**_raw_aggregates())
+        .order_by('bucket')
+    )
+    history.extend({**row, 'resolution': 'raw'} for row in raw)
+    return history
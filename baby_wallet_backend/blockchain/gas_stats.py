@@ -0,0 +1,89 @@
+import threading
+
+import numpy as np
+from django.conf import settings
+
+from .gas import latest_gas_price
+from .models import GasTracker
+
+
+_stats = {}  # network -> (latest sample id, stats computed up to that sample)
+_stats_lock = threading.Lock()
+
+
+def exponential_moving_average(values, span):
+    """EMA of `values` (oldest first) with the usual alpha = 2 / (span + 1), weights normalised over the window"""
+    alpha = 2 / (span + 1)
+    weights = (1 - alpha) ** np.arange(len(values) - 1, -1, -1)
+    return float(weights @ values / weights.sum())
+
+
+def trend_per_block(blocks, prices):
+    """Least-squares slope of price against block number, 0 when it cannot be fitted"""
+    if len(prices) < 2 or np.ptp(blocks) == 0:
+        return 0.0
+    centred = blocks - blocks.mean()
+    return float(centred @ (prices - prices.mean()) / (centred @ centred))
+
+
+def compute_gas_price_stats(network, window=None, span=None, horizon=None):
+    """
+    Fee statistics over the `window` most recent samples of `network`:
+    p10/p50/p90 percentiles, an EMA over `span` samples, and a forecast
+    `horizon` blocks ahead extrapolating the EMA along the recent trend.
+    Prices are in gwei, taken from gas_price_eth to keep sub-gwei precision.
+    Returns None when the network has no samples.
+    """
+    window = window or settings.GAS_PRICE_STATS_WINDOW
+    span = span or settings.GAS_PRICE_EMA_SPAN
+    horizon = horizon or settings.GAS_PRICE_FORECAST_BLOCKS
+
+    rows = list(
+        GasTracker.objects.filter(network=network).order_by('-timestamp')
+        .values_list('gas_price_eth', 'block_number', 'timestamp')[:window]
+    )
+    if not rows:
+        return None
+    rows.reverse()
+    prices_eth, blocks, timestamps = zip(*rows)
+    prices = np.array(prices_eth, dtype=float) * 10 ** 9
+    blocks = np.array(blocks, dtype=float)
+
+    p10, p50, p90 = np.percentile(prices, [10, 50, 90])
+    ema = exponential_moving_average(prices, span)
+    recent = slice(-span, None)
+    forecast = max(0.0, ema + trend_per_block(blocks[recent], prices[recent]) * horizon)
+    return {
+        'network': network,
+        'block_number': int(blocks[-1]),
+        'sampled_at': timestamps[-1],
+        'samples': len(prices),
+        'p10': round(float(p10), 4),
+        'p50': round(float(p50), 4),
+        'p90': round(float(p90), 4),
+        'ema': round(ema, 4),
+        'forecast': round(forecast, 4),
+        'forecast_block': int(blocks[-1]) + horizon,
+    }
+
+
+def gas_price_stats(network):
+    """
+    compute_gas_price_stats(network), cached in process until a newer sample
+    becomes the network's latest gas price.
+    """
+    latest = latest_gas_price(network)
+    if latest is None:
+        return None
+    cached = _stats.get(network)
+    if cached is not None and cached[0] == latest.pk:
+        return cached[1]
+    stats = compute_gas_price_stats(network)
+    with _stats_lock:
+        _stats[network] = (latest.pk, stats)
+    return stats
+
+
+def clear_stats_cache():
+    with _stats_lock:
+        _stats.clear()
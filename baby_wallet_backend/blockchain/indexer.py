@@ -0,0 +1,318 @@
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone as dt_timezone
+from decimal import ROUND_DOWN, Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from eth_abi.exceptions import DecodingError
+
+from accounts.stats import invalidate_dashboard_stats
+from investments.ingest import apply_balance_deltas
+from investments.models import Transaction
+from .abi import decode_log
+from .models import NFT, BlockchainTransaction, IndexerCheckpoint, SmartContract
+from .rpc import RPCError, get_client
+
+
+logger = logging.getLogger(__name__)
+
+# Contract events that move money, mapped to (BlockchainTransaction type, ledger Transaction type)
+LEDGER_EVENTS = {
+    'Deposit': ('deposit', 'investment'),
+    'Withdrawal': ('withdraw', 'withdrawal'),
+}
+AMOUNT_ARGS = ('amount', 'value', 'wad')
+ACCOUNT_ARGS = ('from', 'sender', 'depositor', 'to', 'recipient', 'account')
+
+
+class IndexerError(Exception):
+    pass
+
+
+@dataclass
+class IndexResult:
+    network: str
+    from_block: int = 0
+    to_block: int = 0
+    logs: int = 0
+    transactions: int = 0
+    reorgs: int = 0
+    requests: int = 0
+    seconds: float = 0
+
+    @property
+    def blocks(self):
+        return max(0, self.to_block - self.from_block + 1)
+
+
+class WatchedContracts:
+    """Deployed contracts of a network, indexed by address, with their ABI events parsed once"""
+    def __init__(self, network):
+        self.by_address = {
+            contract.contract_address.lower(): contract
+            for contract in SmartContract.objects.filter(network=network, status='deployed').select_related(
+                'artifact',
+            ).only(
+                'contract_address', 'artifact__content_hash', 'token', 'block_number', 'user_id', 'child_id',
+                'investment_id',
+            )
+        }
+        self.events = {
+            address: {
+                topic: event for topic, event in contract.parsed_abi.events.items() if event['name'] in LEDGER_EVENTS
+            }
+            for address, contract in self.by_address.items()
+        }
+
+    @property
+    def addresses(self):
+        return list(self.by_address)
+
+    @property
+    def topics(self):
+        return sorted({topic for events in self.events.values() for topic in events})
+
+    @property
+    def first_block(self):
+        blocks = [contract.block_number for contract in self.by_address.values() if contract.block_number is not None]
+        return min(blocks) if blocks else None
+
+    def decode(self, log):
+        """(contract, event name, arguments) for a relevant log, or None"""
+        address = log['address'].lower()
+        event = self.events.get(address, {}).get(log['topics'][0] if log['topics'] else None)
+        if event is None:
+            return None
+        return self.by_address[address], event['name'], decode_log(event, log)
+
+
+def token_amount(units, token):
+    """Convert on-chain integer units to the ledger's two-decimal amount"""
+    decimals = settings.BLOCKCHAIN_TOKEN_DECIMALS.get(token, 18)
+    return (Decimal(units) / 10 ** decimals).quantize(Decimal('0.01'), rounding=ROUND_DOWN)
+
+
+def first_arg(args, names):
+    for name in names:
+        if name in args:
+            return args[name]
+    return None
+
+
+def _block_times(client, logs):
+    """Block timestamp of every log, fetching the headers of blocks whose logs lack blockTimestamp"""
+    missing = sorted({log['blockNumber'] for log in logs if 'blockTimestamp' not in log})
+    times = {}
+    if missing:
+        blocks = client.batch([('eth_getBlockByNumber', [number, False]) for number in missing])
+        times = {number: block['timestamp'] for number, block in zip(missing, blocks)}
+    return {
+        (log['transactionHash'], log['logIndex']): datetime.fromtimestamp(
+            int(log.get('blockTimestamp') or times[log['blockNumber']], 16), tz=dt_timezone.utc,
+        )
+        for log in logs
+    }
+
+
+def store_logs(network, contracts, logs, block_times):
+    """
+    Upsert the ledger rows for decoded logs: one investments.Transaction per
+    event (skipping events already indexed) with its balance effect, and one
+    confirmed BlockchainTransaction per transaction hash. Must run inside a
+    database transaction. Returns the number of ledger rows created.
+    """
+    decoded = []
+    for log in logs:
+        try:
+            match = contracts.decode(log)
+        except (ValueError, DecodingError) as exc:
+            logger.warning('Skipping undecodable log %s/%s: %s', log['transactionHash'], log['logIndex'], exc)
+            continue
+        if match is not None:
+            decoded.append((log, *match))
+    if not decoded:
+        return 0
+
+    hashes = {log['transactionHash'] for log, *_ in decoded}
+    indexed = set(
+        Transaction.objects.filter(transaction_hash__in=hashes, log_index__isnull=False)
+        .values_list('transaction_hash', 'log_index')
+    )
+    ledger = []
+    chain = {}
+    now = timezone.now()
+    for log, contract, name, args in decoded:
+        tx_hash, log_index, block = log['transactionHash'], int(log['logIndex'], 16), int(log['blockNumber'], 16)
+        chain_type, ledger_type = LEDGER_EVENTS[name]
+        account = first_arg(args, ACCOUNT_ARGS)
+        chain.setdefault(tx_hash, BlockchainTransaction(
+            user_id=contract.user_id, transaction_type=chain_type, transaction_hash=tx_hash,
+            block_number=block, status='confirmed', network=network,
+            from_address=account if isinstance(account, str) else '', to_address=log['address'],
+            confirmed_at=now,
+        ))
+        if (tx_hash, log_index) in indexed:
+            continue
+        ledger.append(Transaction(
+            user_id=contract.user_id, child_id=contract.child_id, investment_id=contract.investment_id,
+            transaction_type=ledger_type, amount=token_amount(first_arg(args, AMOUNT_ARGS) or 0, contract.token),
+            token=contract.token, status='completed', transaction_hash=tx_hash, block_number=block,
+            log_index=log_index, description=f'{name} on {network}',
+            metadata={'network': network, 'contract': log['address'], 'event': name},
+            created_at=block_times[(log['transactionHash'], log['logIndex'])],
+        ))
+
+    BlockchainTransaction.objects.bulk_create(
+        chain.values(), update_conflicts=True, unique_fields=['transaction_hash'],
+        update_fields=['status', 'block_number', 'network', 'confirmed_at'],
+    )
+    Transaction.objects.bulk_create(ledger)
+    deltas = {}
+    for tx in ledger:
+        deltas[tx.child_id] = deltas.get(tx.child_id, Decimal('0')) + tx.balance_effect(tx.status)
+    apply_balance_deltas(deltas)
+    for user_id in {tx.user_id for tx in ledger}:
+        transaction.on_commit(lambda user_id=user_id: invalidate_dashboard_stats(user_id))
+    return len(ledger)
+
+
+def rollback_to(network, block_number):
+    """
+    Undo everything indexed on `network` after `block_number`: ledger rows
+    are deleted with their balance effect reversed, on-chain transactions and
+    the NFTs they minted go back to pending for the receipt poller, and later
+    checkpoints are dropped.
+    """
+    with transaction.atomic():
+        rows = Transaction.objects.filter(
+            metadata__network=network, log_index__isnull=False, block_number__gt=block_number,
+        )
+        deltas = {}
+        users = set()
+        for tx in rows.only('user', 'child', 'transaction_type', 'amount', 'status'):
+            deltas[tx.child_id] = deltas.get(tx.child_id, Decimal('0')) - tx.balance_effect(tx.status)
+            users.add(tx.user_id)
+        apply_balance_deltas(deltas)
+        rows.delete()
+        BlockchainTransaction.objects.filter(network=network, block_number__gt=block_number).update(
+            status='pending', block_number=None, confirmations=0, confirmed_at=None, updated_at=timezone.now(),
+        )
+        NFT.objects.filter(smart_contract__network=network, status='minted', block_number__gt=block_number).update(
+            status='pending', block_number=None, minted_at=None, updated_at=timezone.now(),
+        )
+        IndexerCheckpoint.objects.filter(network=network, block_number__gt=block_number).delete()
+        for user_id in users:
+            transaction.on_commit(lambda user_id=user_id: invalidate_dashboard_stats(user_id))
+
+
+def find_common_ancestor(client, network):
+    """Newest stored checkpoint whose block hash still matches the chain"""
+    checkpoints = list(IndexerCheckpoint.objects.filter(network=network).order_by('-block_number'))
+    blocks = client.batch([('eth_getBlockByNumber', [hex(cp.block_number), False]) for cp in checkpoints])
+    for checkpoint, block in zip(checkpoints, blocks):
+        if block is not None and block['hash'] == checkpoint.block_hash:
+            return checkpoint
+    raise IndexerError(f'Reorg on {network} is deeper than the {len(checkpoints)} stored checkpoints')
+
+
+def index_network(network, client=None, from_block=None, to_block=None):
+    """
+    Ingest Deposit/Withdrawal events of the network's deployed contracts from
+    the last checkpoint up to `to_block` (the chain head by default).
+
+    Each JSON-RPC batch carries BLOCKCHAIN_INDEXER_BATCH eth_getLogs calls
+    over consecutive ranges, the header at the end of each range, and the
+    header of the current checkpoint, whose hash is compared to detect
+    reorgs. Ranges double after a clean batch and halve when the node
+    rejects one as too large. Each batch's logs and its new checkpoint are
+    committed together.
+    """
+    started = time.perf_counter()
+    client = client or get_client(network)
+    contracts = WatchedContracts(network)
+    result = IndexResult(network=network)
+    if not contracts.by_address or not contracts.topics:
+        return result
+
+    checkpoint = IndexerCheckpoint.objects.filter(network=network).order_by('-block_number').first()
+    head = client.block_number()
+    result.requests += 1
+    to_block = head if to_block is None else min(to_block, head)
+    if checkpoint is not None:
+        start = checkpoint.block_number + 1
+    elif from_block is not None:
+        start = from_block
+    else:
+        start = contracts.first_block if contracts.first_block is not None else head
+    result.from_block = start
+    result.to_block = start - 1
+
+    range_size = settings.BLOCKCHAIN_INDEXER_RANGE
+    log_filter = {'address': contracts.addresses, 'topics': [contracts.topics]}
+    while start <= to_block:
+        ranges = []
+        while len(ranges) < settings.BLOCKCHAIN_INDEXER_BATCH and start <= to_block:
+            end = min(start + range_size - 1, to_block)
+            ranges.append((start, end))
+            start = end + 1
+        calls = [('eth_getLogs', [{**log_filter, 'fromBlock': hex(low), 'toBlock': hex(high)}]) for low, high in ranges]
+        calls += [('eth_getBlockByNumber', [hex(high), False]) for _, high in ranges]
+        if checkpoint is not None:
+            calls.append(('eth_getBlockByNumber', [hex(checkpoint.block_number), False]))
+        replies = client.batch(calls, raise_errors=False)
+        result.requests += 1
+
+        if checkpoint is not None:
+            current = replies[-1]
+            if isinstance(current, RPCError):
+                raise current
+            if current is None or current['hash'] != checkpoint.block_hash:
+                ancestor = find_common_ancestor(client, network)
+                result.requests += 1
+                logger.warning('Reorg on %s below block %d; rolling back to %d',
+                               network, checkpoint.block_number, ancestor.block_number)
+                rollback_to(network, ancestor.block_number)
+                result.reorgs += 1
+                checkpoint = ancestor
+                start = ancestor.block_number + 1
+                continue
+
+        log_replies, headers = replies[:len(ranges)], replies[len(ranges):2 * len(ranges)]
+        done = 0
+        for reply, header in zip(log_replies, headers):
+            if isinstance(reply, RPCError) or isinstance(header, RPCError) or header is None:
+                break
+            done += 1
+        if done == 0:
+            if range_size == 1:
+                raise IndexerError(f'{network} node rejected eth_getLogs for block {ranges[0][0]}: {log_replies[0]}')
+            range_size = max(1, range_size // 2)
+            start = ranges[0][0]
+            continue
+
+        logs = [log for reply in log_replies[:done] for log in reply]
+        block_times = _block_times(client, logs) if logs else {}
+        result.requests += 1 if logs else 0
+        last_block, last_header = ranges[done - 1][1], headers[done - 1]
+        with transaction.atomic():
+            result.transactions += store_logs(network, contracts, logs, block_times)
+            checkpoint = IndexerCheckpoint.objects.create(
+                network=network, block_number=last_block, block_hash=last_header['hash'],
+            )
+            stale = IndexerCheckpoint.objects.filter(network=network).order_by('-block_number').values_list(
+                'pk', flat=True)[settings.BLOCKCHAIN_INDEXER_CHECKPOINTS:]
+            IndexerCheckpoint.objects.filter(pk__in=list(stale)).delete()
+        result.logs += len(logs)
+        result.to_block = last_block
+
+        if done < len(ranges):
+            range_size = max(1, range_size // 2)
+            start = last_block + 1
+        else:
+            range_size = min(range_size * 2, settings.BLOCKCHAIN_INDEXER_MAX_RANGE)
+
+    result.seconds = time.perf_counter() - started
+    return result
@@ -0,0 +1,62 @@
+import json
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from accounts.models import Child, User
+from blockchain.models import ContractArtifact, SmartContract
+
+
+def savings_artifact(functions):
+    """An ABI and bytecode of roughly the size of a compiled savings contract"""
+    abi = [
+        {'type': 'function', 'name': f'function{n}', 'stateMutability': 'nonpayable', 'outputs': [],
+         'inputs': [{'name': f'arg{i}', 'type': 'uint256', 'internalType': 'uint256'} for i in range(4)]}
+        for n in range(functions)
+    ]
+    return abi, '0x' + '6080604052' * (functions * 100)
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks SmartContract admin listings with per-row ABI/bytecode against shared artifacts (rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--contracts', type=int, default=5000)
+        parser.add_argument('--functions', type=int, default=40, help='ABI entries; bytecode grows with it')
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        abi, bytecode = savings_artifact(options['functions'])
+        with transaction.atomic():
+            user = User.objects.create(username='bench-listing', email='bench-listing@example.com')
+            child = Child.objects.create(user=user, name='Bench', date_of_birth=date(2018, 1, 1))
+            artifact = ContractArtifact.objects.for_content(abi, bytecode)
+            SmartContract.objects.bulk_create([
+                SmartContract(user=user, child=child, contract_type='savings', artifact=artifact,
+                              contract_address=f'0x{n:040x}')
+                for n in range(options['contracts'])
+            ], batch_size=1000)
+
+            size = len(json.dumps(abi)) + len(bytecode)
+            self.stdout.write(
+                f'{options["contracts"]} contracts, artifact of {size / 1024:.0f} KiB: '
+                f'{options["contracts"] * size / 2 ** 20:.1f} MiB stored per row before, {size / 1024:.0f} KiB now'
+            )
+            base = SmartContract.objects.filter(user=user).order_by('-created_at')
+            # Joining the artifact in full makes every row carry the ABI and bytecode, as the inline columns did
+            scenarios = [
+                ('inline ABI/bytecode', base.select_related('child__user', 'user', 'artifact')),
+                ('shared artifact', base.select_related('child__user', 'user')),
+            ]
+            for rows in (100, options['contracts']):
+                self.stdout.write(f'  {rows} rows')
+                for label, queryset in scenarios:
+                    start = time.perf_counter()
+                    for _ in range(options['repeat']):
+                        for contract in queryset[:rows]:
+                            str(contract)
+                    elapsed = (time.perf_counter() - start) / options['repeat']
+                    self.stdout.write(f'    {label:<20} {elapsed * 1000:9.2f} ms')
+            transaction.set_rollback(True)
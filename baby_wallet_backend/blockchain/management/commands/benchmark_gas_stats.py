@@ -0,0 +1,55 @@
+import random
+import statistics
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from blockchain.gas import clear_latest_cache
+from blockchain.gas_stats import clear_stats_cache, compute_gas_price_stats, gas_price_stats
+from blockchain.models import GasTracker
+
+
+def scan_gas_price_stats(network):
+    """Percentiles over every stored sample in Python, as callers had to do before, kept as the baseline"""
+    prices = [float(price) * 10 ** 9 for price in
+              GasTracker.objects.filter(network=network).values_list('gas_price_eth', flat=True)]
+    p10, p50, p90 = (statistics.quantiles(prices, n=10, method='inclusive')[i] for i in (0, 4, 8))
+    return {'p10': p10, 'p50': p50, 'p90': p90}
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks gas price statistics against history length (data is rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--history', type=int, nargs='+', default=[1000, 10000, 100000])
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        rng = random.Random(42)
+        with transaction.atomic():
+            stored = 0
+            for history in sorted(options['history']):
+                GasTracker.objects.bulk_create([
+                    GasTracker(network='sepolia', gas_price_gwei=0, block_number=block,
+                               gas_price_eth=Decimal(rng.randint(10 ** 8, 5 * 10 ** 10)) / 10 ** 18)
+                    for block in range(stored, history)
+                ], batch_size=5000)
+                stored = history
+                self.stdout.write(f'{history} samples')
+                self.report('full scan', scan_gas_price_stats, options['repeat'])
+                self.report('windowed numpy', compute_gas_price_stats, options['repeat'])
+                clear_latest_cache()
+                clear_stats_cache()
+                gas_price_stats('sepolia')
+                self.report('cached', gas_price_stats, options['repeat'] * 100)
+            transaction.set_rollback(True)
+        clear_latest_cache()
+        clear_stats_cache()
+
+    def report(self, label, func, repeat):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            func('sepolia')
+        self.stdout.write(f'  {label:<16} {(time.perf_counter() - start) / repeat * 1000:9.3f} ms')
@@ -0,0 +1,142 @@
+import itertools
+import threading
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand
+from django.db import IntegrityError, OperationalError, connection
+from django.db.models import Max
+from django.test import override_settings
+
+from accounts.models import Child, User
+from blockchain.minting import mint_nfts
+from blockchain.models import NFT, SmartContract
+from blockchain.receipts import poll_receipts
+from blockchain.rpc import RPCClient
+from blockchain.testing import StandInNode
+
+
+MINTER = '0x' + 'ab' * 20
+
+
+def legacy_mint(contract, nft):
+    """Token id read as MAX(token_id) + 1, then one INSERT and NFT.mint() per token, kept as the baseline"""
+    top = NFT.objects.filter(smart_contract=contract).aggregate(top=Max('token_id'))['top'] or 0
+    nft.smart_contract = contract
+    nft.token_id = top + 1
+    nft.save()
+    nft.mint()
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks minting milestone NFTs from concurrent workers: per-token MAX + 1 against reserved ranges'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--nfts', type=int, default=10000)
+        parser.add_argument('--legacy-nfts', type=int, default=2000, help='The baseline is slow; 0 skips it')
+        parser.add_argument('--workers', type=int, default=8)
+        parser.add_argument('--chunk', type=int, default=500, help='NFTs per mint_nfts() call')
+        parser.add_argument('--batch-size', type=int, default=100, help='Tokens per mintBatch transaction')
+
+    def handle(self, *args, **options):
+        user = User.objects.create(username='bench-mint', email='bench-mint@example.com', wallet_address=MINTER)
+        child = Child.objects.create(user=user, name='Bench', date_of_birth=date(2018, 1, 1))
+        hashes = itertools.count(1)
+        node = StandInNode(methods={
+            'eth_sendTransaction': lambda params: f'0x{"b" * 16}{next(hashes):048x}',
+            'eth_getTransactionReceipt': lambda params: {
+                'blockNumber': '0x1', 'gasUsed': hex(50000), 'status': '0x1',
+            },
+        })
+        try:
+            with node, override_settings(BLOCKCHAIN_MINTER_ADDRESS=MINTER):
+                client = RPCClient(node.url, pool_size=options['workers'])
+                if options['legacy_nfts']:
+                    self.run_legacy(user, child, options)
+                self.run_batched(user, child, client, node, options)
+                client.close()
+        finally:
+            user.delete()
+
+    def contract(self, user, child, label):
+        return SmartContract.objects.create(
+            user=user, child=child, contract_type='nft', status='deployed',
+            contract_address='0x' + label.encode().hex().ljust(40, '0')[:40],
+        )
+
+    def milestones(self, user, child, count):
+        return [NFT(user=user, child=child, nft_type='milestone', metadata={'milestone': n}) for n in range(count)]
+
+    def run_threads(self, work, chunks):
+        threads = [threading.Thread(target=work, args=(chunk,)) for chunk in chunks]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - start
+
+    def run_legacy(self, user, child, options):
+        contract = self.contract(user, child, 'legacy')
+        nfts = self.milestones(user, child, options['legacy_nfts'])
+        retries = {'unique': 0, 'locked': 0}
+        lock = threading.Lock()
+
+        def work(chunk):
+            try:
+                for nft in chunk:
+                    while True:
+                        try:
+                            legacy_mint(contract, nft)
+                            break
+                        except (IntegrityError, OperationalError) as exc:
+                            if isinstance(exc, OperationalError) and 'locked' not in str(exc):
+                                raise
+                            nft.pk = None
+                            with lock:
+                                retries['unique' if isinstance(exc, IntegrityError) else 'locked'] += 1
+            finally:
+                connection.close()
+
+        workers = options['workers']
+        elapsed = self.run_threads(work, [nfts[i::workers] for i in range(workers)])
+        self.report('MAX + 1 per token', len(nfts), elapsed, retries['unique'], contract)
+        self.stdout.write(f'    {retries["locked"]} retries on a locked database')
+
+    def run_batched(self, user, child, client, node, options):
+        contract = self.contract(user, child, 'batched')
+        nfts = self.milestones(user, child, options['nfts'])
+        chunks = [nfts[start:start + options['chunk']] for start in range(0, len(nfts), options['chunk'])]
+        workers = options['workers']
+        errors = []
+
+        def work(worker_chunks):
+            try:
+                for chunk in worker_chunks:
+                    mint_nfts(SmartContract.objects.get(pk=contract.pk), chunk, client=client,
+                              batch_size=options['batch_size'])
+            except IntegrityError as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        requests_before = node.requests
+        elapsed = self.run_threads(work, [chunks[i::workers] for i in range(workers)])
+        self.report('reserved ranges', len(nfts), elapsed, len(errors), contract)
+        self.stdout.write(f'    {node.requests - requests_before} eth_sendTransaction batches')
+
+        start = time.perf_counter()
+        result = poll_receipts(contract.network, client=client, batch_size=options['batch_size'],
+                               workers=workers, required_confirmations=1)
+        self.stdout.write(
+            f'  confirmations: {result.confirmed} mint transactions, {result.nfts_minted} NFTs settled '
+            f'in {time.perf_counter() - start:.2f}s'
+        )
+
+    def report(self, label, count, seconds, unique_retries, contract):
+        stored = NFT.objects.filter(smart_contract=contract)
+        distinct = stored.values('token_id').distinct().count()
+        self.stdout.write(
+            f'  {label:<18} {count / seconds:8.0f} NFTs/s  {stored.count()} stored, {distinct} distinct token ids, '
+            f'{unique_retries} uniqueness retries'
+        )
@@ -0,0 +1,65 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.core.management.base import BaseCommand
+
+from blockchain.rpc import RPCClient
+from blockchain.testing import StandInNode
+
+
+def unpooled_call(url, method, *params):
+    """One connection per call, as with a bare requests.post(), kept as the baseline"""
+    response = requests.post(url, json={'jsonrpc': '2.0', 'id': 1, 'method': method, 'params': list(params)})
+    return response.json()['result']
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks JSON-RPC calls/second against a local stand-in node at several concurrency levels'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--calls', type=int, default=2000)
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 10, 100])
+        parser.add_argument('--batch-size', type=int, default=20)
+        parser.add_argument('--latency', type=float, default=0, help='Simulated node latency in milliseconds')
+
+    def handle(self, *args, **options):
+        calls = options['calls']
+        batch_size = options['batch_size']
+        addresses = [f'0x{n:040x}' for n in range(calls)]
+
+        with StandInNode(methods={'eth_getBalance': lambda params: '0x0'},
+                         latency=options['latency'] / 1000) as node:
+            self.stdout.write(f'{calls} eth_getBalance calls, node latency {options["latency"]:g} ms')
+            for concurrency in options['concurrency']:
+                client = RPCClient(node.url, pool_size=concurrency)
+                scenarios = [
+                    ('new connection per call', lambda address: unpooled_call(node.url, 'eth_getBalance', address)),
+                    ('pooled keep-alive', lambda address: client.call('eth_getBalance', address)),
+                ]
+                self.stdout.write(f'  {concurrency} concurrent callers')
+                for label, work in scenarios:
+                    self.report(label, calls, self.run(work, addresses, concurrency))
+
+                batches = [
+                    [('eth_getBalance', [address]) for address in addresses[start:start + batch_size]]
+                    for start in range(0, calls, batch_size)
+                ]
+                self.report(f'batches of {batch_size}', calls, self.run(client.batch, batches, concurrency))
+
+                requests_before = node.requests
+                seconds = self.run(lambda _: client.block_number(), range(calls), concurrency)
+                self.report('identical calls (coalesced)', calls, seconds,
+                            f'{node.requests - requests_before} requests sent')
+                client.close()
+
+    def run(self, work, items, concurrency):
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for _ in pool.map(work, items):
+                pass
+        return time.perf_counter() - start
+
+    def report(self, label, calls, seconds, note=''):
+        line = f'    {label:<30} {calls / seconds:>9.0f} calls/s'
+        self.stdout.write(f'{line}  ({note})' if note else line)
@@ -0,0 +1,17 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from blockchain.gas import downsample_gas_prices
+
+
+class Command(BaseCommand):
+    help = 'Rolls old gas price samples up into per-minute and per-hour summaries to keep GasTracker bounded'
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        samples, minutes = downsample_gas_prices()
+        self.stdout.write(self.style.SUCCESS(
+            f'Rolled up {samples} raw samples into minutes and {minutes} minute rollups into hours '
+            f'in {time.perf_counter() - start:.2f}s'
+        ))
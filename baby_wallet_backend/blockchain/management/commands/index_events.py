@@ -0,0 +1,42 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from blockchain.indexer import IndexerError, index_network
+from blockchain.rpc import RPCTransportError
+
+
+class Command(BaseCommand):
+    help = 'Ingests Deposit/Withdrawal events of deployed contracts into the ledger, from the last checkpoint on'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--network', action='append', help='Defaults to every network in BLOCKCHAIN_RPC_URLS')
+        parser.add_argument('--from-block', type=int, help='First block when the network has no checkpoint yet')
+        parser.add_argument('--to-block', type=int, help='Stop at this block instead of the chain head')
+        parser.add_argument('--loop', action='store_true', help='Keep following the chain, waking up every --interval seconds')
+        parser.add_argument('--interval', type=int, default=15)
+
+    def handle(self, *args, **options):
+        networks = options['network'] or list(settings.BLOCKCHAIN_RPC_URLS)
+        while True:
+            for network in networks:
+                self.index(network, options)
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+    def index(self, network, options):
+        try:
+            result = index_network(network, from_block=options['from_block'], to_block=options['to_block'])
+        except IndexerError as exc:
+            raise CommandError(str(exc))
+        except RPCTransportError as exc:
+            self.stderr.write(f'{network}: {exc}')
+            return
+        rate = result.blocks / result.seconds if result.seconds else 0
+        self.stdout.write(
+            f'{network}: blocks {result.from_block}-{result.to_block}, {result.logs} logs, '
+            f'{result.transactions} ledger rows, {result.reorgs} reorgs, {result.requests} RPC requests '
+            f'in {result.seconds:.2f}s ({rate:.0f} blocks/s)'
+        )
@@ -0,0 +1,40 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from blockchain.receipts import poll_receipts
+from blockchain.rpc import RPCTransportError
+
+
+class Command(BaseCommand):
+    help = 'Confirms pending blockchain transactions from their receipts, optionally as a long-running worker'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--network', action='append', help='Defaults to every network in BLOCKCHAIN_RPC_URLS')
+        parser.add_argument('--batch-size', type=int, default=100, help='Receipts per JSON-RPC batch')
+        parser.add_argument('--workers', type=int, default=4, help='Batches in flight at once')
+        parser.add_argument('--loop', action='store_true', help='Keep polling, waking up every --interval seconds')
+        parser.add_argument('--interval', type=int, default=15)
+
+    def handle(self, *args, **options):
+        networks = options['network'] or list(settings.BLOCKCHAIN_RPC_URLS)
+        while True:
+            for network in networks:
+                self.poll(network, options)
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+    def poll(self, network, options):
+        try:
+            result = poll_receipts(network, batch_size=options['batch_size'], workers=options['workers'])
+        except RPCTransportError as exc:
+            self.stderr.write(f'{network}: {exc}')
+            return
+        self.stdout.write(
+            f'{network}: {result.pending} pending at block {result.head_block}, '
+            f'{result.confirmed} confirmed, {result.reverted} reverted, {result.still_pending} waiting, '
+            f'{result.errors} errors, {result.nfts_minted} NFTs minted; oldest pending {result.oldest_pending_age:.0f}s, '
+            f'mean confirmation lag {result.mean_confirmation_lag:.0f}s ({result.seconds:.2f}s)'
+        )
@@ -0,0 +1,37 @@
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from blockchain.rpc import RPCError, RPCTransportError
+from blockchain.tvl import reconcile
+
+
+class Command(BaseCommand):
+    help = "Reports children whose contracts' on-chain balance of a token differs from their ledger holding of it"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--network', action='append', help='Defaults to every network in BLOCKCHAIN_RPC_URLS')
+        parser.add_argument('--tolerance', type=Decimal, default=Decimal('0'))
+
+    def handle(self, *args, **options):
+        mismatches = 0
+        for network in options['network'] or list(settings.BLOCKCHAIN_RPC_URLS):
+            try:
+                snapshot, discrepancies = reconcile(network, tolerance=options['tolerance'])
+            except (RPCError, RPCTransportError) as exc:
+                raise CommandError(f'{network}: {exc}')
+            self.stdout.write(
+                f'{network} at block {snapshot.block_number}: {len(snapshot.contracts)} contracts, '
+                f'{len(discrepancies)} child balances out of step'
+            )
+            for entry in discrepancies:
+                on_chain = 'unreadable' if entry.on_chain is None else entry.on_chain
+                difference = '' if entry.difference is None else f' ({entry.difference:+})'
+                self.stdout.write(
+                    f'  {entry.child} (#{entry.child_id}) {entry.token}: on chain {on_chain}, ledger {entry.ledger}{difference} '
+                    f'- {", ".join(entry.contracts)}'
+                )
+            mismatches += len(discrepancies)
+        if mismatches:
+            raise CommandError(f'{mismatches} child balances out of step')
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.1 on 2026-10-17 18:44
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("blockchain", "0001_initial"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="blockchaintransaction",
+            name="confirmations",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name="blockchaintransaction",
+            index=models.Index(
+                fields=["network", "status"], name="blockchain_tx_status_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 5.2.1 on 2026-10-17 18:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("blockchain", "0002_receipt_polling"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="GasPriceRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "network",
+                    models.CharField(
+                        choices=[
+                            ("mainnet", "Ethereum Mainnet"),
+                            ("sepolia", "Sepolia Testnet"),
+                            ("goerli", "Goerli Testnet"),
+                            ("polygon", "Polygon"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "resolution",
+                    models.CharField(
+                        choices=[("minute", "Minute"), ("hour", "Hour")], max_length=10
+                    ),
+                ),
+                ("bucket", models.DateTimeField()),
+                ("samples", models.PositiveIntegerField()),
+                ("min_gwei", models.BigIntegerField()),
+                ("avg_gwei", models.FloatField()),
+                ("max_gwei", models.BigIntegerField()),
+                ("first_block", models.BigIntegerField()),
+                ("last_block", models.BigIntegerField()),
+            ],
+            options={
+                "ordering": ["-bucket"],
+            },
+        ),
+        migrations.AddIndex(
+            model_name="gastracker",
+            index=models.Index(
+                fields=["network", "-timestamp"], name="gas_network_timestamp_idx"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="gaspricerollup",
+            constraint=models.UniqueConstraint(
+                fields=("network", "resolution", "bucket"),
+                name="unique_gas_rollup_bucket",
+            ),
+        ),
+    ]
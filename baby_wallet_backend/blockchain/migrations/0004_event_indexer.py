@@ -0,0 +1,65 @@
+# Generated by Django 5.2.1 on 2026-10-17 18:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("blockchain", "0003_gas_rollups"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="smartcontract",
+            name="token",
+            field=models.CharField(
+                choices=[
+                    ("USDC", "USDC"),
+                    ("USDT", "USDT"),
+                    ("ETH", "Ethereum"),
+                    ("BTC", "Bitcoin"),
+                ],
+                default="USDC",
+                max_length=10,
+            ),
+        ),
+        migrations.CreateModel(
+            name="IndexerCheckpoint",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "network",
+                    models.CharField(
+                        choices=[
+                            ("mainnet", "Ethereum Mainnet"),
+                            ("sepolia", "Sepolia Testnet"),
+                            ("goerli", "Goerli Testnet"),
+                            ("polygon", "Polygon"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("block_number", models.BigIntegerField()),
+                ("block_hash", models.CharField(max_length=66)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "ordering": ["-block_number"],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("network", "block_number"),
+                        name="unique_indexer_checkpoint",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.1 on 2026-10-17 19:01
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def seed_next_token_id(apps, schema_editor):
+    """Start each contract's allocator after the highest token id already minted on it"""
+    SmartContract = apps.get_model("blockchain", "SmartContract")
+    NFT = apps.get_model("blockchain", "NFT")
+    db = schema_editor.connection.alias
+    highest = NFT.objects.using(db).values("smart_contract").annotate(highest=Max("token_id")).order_by()
+    for row in highest:
+        SmartContract.objects.using(db).filter(pk=row["smart_contract"]).update(next_token_id=row["highest"] + 1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0003_child_child_user_created_idx"),
+        ("blockchain", "0004_event_indexer"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="smartcontract",
+            name="next_token_id",
+            field=models.BigIntegerField(default=1),
+        ),
+        migrations.AddIndex(
+            model_name="nft",
+            index=models.Index(fields=["mint_hash"], name="nft_mint_hash_idx"),
+        ),
+        migrations.RunPython(seed_next_token_id, migrations.RunPython.noop),
+    ]
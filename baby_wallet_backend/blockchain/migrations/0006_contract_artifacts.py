@@ -0,0 +1,96 @@
+# Generated by Django 5.2.1 on 2026-10-17 19:07
+
+import hashlib
+import json
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def hash_content(abi, bytecode):
+    # Frozen copy of ContractArtifact.hash_content
+    canonical = json.dumps(abi, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(f"{canonical}\n{bytecode}".encode()).hexdigest()
+
+
+def move_to_artifacts(apps, schema_editor):
+    """Replace each contract's ABI and bytecode columns with a reference to a shared artifact"""
+    SmartContract = apps.get_model("blockchain", "SmartContract")
+    ContractArtifact = apps.get_model("blockchain", "ContractArtifact")
+    db = schema_editor.connection.alias
+    contracts = {}
+    content = {}
+    for pk, abi, bytecode in SmartContract.objects.using(db).values_list("pk", "contract_abi", "contract_bytecode").iterator():
+        if not abi and not bytecode:
+            continue
+        content_hash = hash_content(abi, bytecode)
+        content.setdefault(content_hash, (abi, bytecode))
+        contracts.setdefault(content_hash, []).append(pk)
+    for content_hash, (abi, bytecode) in content.items():
+        artifact, _ = ContractArtifact.objects.using(db).get_or_create(
+            content_hash=content_hash, defaults={"abi": abi, "bytecode": bytecode},
+        )
+        SmartContract.objects.using(db).filter(pk__in=contracts[content_hash]).update(artifact=artifact)
+
+
+def restore_columns(apps, schema_editor):
+    SmartContract = apps.get_model("blockchain", "SmartContract")
+    ContractArtifact = apps.get_model("blockchain", "ContractArtifact")
+    db = schema_editor.connection.alias
+    for artifact in ContractArtifact.objects.using(db):
+        SmartContract.objects.using(db).filter(artifact=artifact).update(
+            contract_abi=artifact.abi, contract_bytecode=artifact.bytecode,
+        )
+
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("blockchain", "0005_nft_minting"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ContractArtifact",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("content_hash", models.CharField(max_length=64, unique=True)),
+                ("abi", models.JSONField(default=list)),
+                ("bytecode", models.TextField(blank=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "ordering": ["-created_at"],
+                "base_manager_name": "objects",
+            },
+        ),
+        migrations.AddField(
+            model_name="smartcontract",
+            name="artifact",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="contracts",
+                to="blockchain.contractartifact",
+            ),
+        ),
+        migrations.RunPython(move_to_artifacts, restore_columns),
+        migrations.RemoveField(
+            model_name="smartcontract",
+            name="contract_abi",
+        ),
+        migrations.RemoveField(
+            model_name="smartcontract",
+            name="contract_bytecode",
+        ),
+    ]
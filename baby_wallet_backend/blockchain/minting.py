@@ -0,0 +1,131 @@
+import logging
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery
+from django.utils import timezone
+
+from accounts.models import User
+from .abi import encode_call
+from .models import NFT, BlockchainTransaction, SmartContract
+from .rpc import RPCError, get_client
+
+
+logger = logging.getLogger(__name__)
+
+MINT_BATCH_SIGNATURE = 'mintBatch(address[],uint256[],string[])'
+
+
+def reserve_token_ids(contract, count):
+    """
+    Reserve `count` consecutive token ids on `contract` and return them as a
+    range. The contract's counter is advanced by one
+    UPDATE ... SET next_token_id = next_token_id + count, which the database
+    serialises per row, so concurrent reservations get disjoint ranges
+    without reading MAX(token_id) or retrying on the unique constraint.
+    Ids of a reservation whose NFTs are never created are skipped, not reused.
+    """
+    if count <= 0:
+        return range(0)
+    with transaction.atomic():
+        SmartContract.objects.filter(pk=contract.pk).update(next_token_id=F('next_token_id') + count)
+        end = SmartContract.objects.filter(pk=contract.pk).values_list('next_token_id', flat=True).get()
+    contract.next_token_id = end
+    return range(end - count, end)
+
+
+def mint_call_data(nfts, wallets, default_recipient):
+    """mintBatch call data for `nfts`, each minted to its owner's wallet or, lacking one, `default_recipient`"""
+    return encode_call(MINT_BATCH_SIGNATURE, [
+        [wallets.get(nft.user_id) or default_recipient for nft in nfts],
+        [nft.token_id for nft in nfts],
+        [nft.token_uri for nft in nfts],
+    ])
+
+
+def mint_nfts(contract, nfts, client=None, batch_size=None, submit=True):
+    """
+    Create unsaved `nfts` on `contract` under one reserved token id range
+    with a single bulk_create, then submit them with submit_mints() unless
+    `submit` is False. Returns the created NFTs.
+    """
+    nfts = list(nfts)
+    for nft, token_id in zip(nfts, reserve_token_ids(contract, len(nfts))):
+        nft.smart_contract = contract
+        nft.token_id = token_id
+        nft.status = 'pending'
+    NFT.objects.bulk_create(nfts, batch_size=1000)
+    if submit:
+        submit_mints(contract, nfts, client, batch_size)
+    return nfts
+
+
+def submit_mints(contract, nfts, client=None, batch_size=None):
+    """
+    Send pending `nfts` of `contract` as mintBatch transactions of up to
+    `batch_size` tokens, all in one JSON-RPC batch of eth_sendTransaction
+    calls from BLOCKCHAIN_MINTER_ADDRESS.
+
+    Every accepted transaction is recorded as a pending mint
+    BlockchainTransaction, for poll_receipts() to confirm, and its hash is
+    stamped on its NFTs with one UPDATE. NFTs of a rejected transaction keep
+    an empty mint_hash and can be passed here again. Returns the hashes sent.
+    """
+    minter = settings.BLOCKCHAIN_MINTER_ADDRESS
+    if not minter:
+        raise ImproperlyConfigured('BLOCKCHAIN_MINTER_ADDRESS must be set to submit NFT mints')
+    client = client or get_client(contract.network)
+    batch_size = batch_size or settings.BLOCKCHAIN_MINT_BATCH_SIZE
+    nfts = list(nfts)
+    if not nfts:
+        return []
+
+    wallets = dict(User.objects.filter(pk__in={nft.user_id for nft in nfts}).values_list('pk', 'wallet_address'))
+    batches = [nfts[start:start + batch_size] for start in range(0, len(nfts), batch_size)]
+    payloads = [
+        {'from': minter, 'to': contract.contract_address, 'data': mint_call_data(batch, wallets, minter)}
+        for batch in batches
+    ]
+    replies = client.batch([('eth_sendTransaction', [payload]) for payload in payloads], raise_errors=False)
+
+    sent = []
+    for batch, payload, reply in zip(batches, payloads, replies):
+        if isinstance(reply, RPCError):
+            logger.warning('Mint of %d tokens on %s rejected: %s', len(batch), contract.contract_address, reply)
+            continue
+        sent.append((batch, BlockchainTransaction(
+            user_id=contract.user_id, transaction_type='mint', transaction_hash=reply, network=contract.network,
+            from_address=minter, to_address=contract.contract_address, data=payload['data'],
+        )))
+    now = timezone.now()
+    with transaction.atomic():
+        BlockchainTransaction.objects.bulk_create([tx for _, tx in sent])
+        for batch, tx in sent:
+            NFT.objects.filter(pk__in=[nft.pk for nft in batch]).update(mint_hash=tx.transaction_hash, updated_at=now)
+            for nft in batch:
+                nft.mint_hash = tx.transaction_hash
+    return [tx.transaction_hash for _, tx in sent]
+
+
+def settle_mints(network):
+    """
+    Bring pending NFTs on `network` in line with their mint transactions:
+    minted, with the block number and confirmation time, once the
+    transaction is confirmed, failed once it reverted. Runs two UPDATEs
+    whatever the number of tokens. Returns (minted, failed).
+    """
+    mints = BlockchainTransaction.objects.filter(network=network, transaction_type='mint')
+    confirmed = mints.filter(status='confirmed', transaction_hash=OuterRef('mint_hash'))
+    pending = NFT.objects.filter(status='pending', mint_hash__isnull=False)
+    now = timezone.now()
+    minted = pending.filter(
+        mint_hash__in=mints.filter(status='confirmed').values('transaction_hash'),
+    ).update(
+        status='minted', block_number=Subquery(confirmed.values('block_number')[:1]),
+        minted_at=Subquery(confirmed.values('confirmed_at')[:1]), updated_at=now,
+    )
+    failed = pending.filter(
+        mint_hash__in=mints.filter(status__in=['reverted', 'failed']).values('transaction_hash'),
+    ).update(status='failed', updated_at=now)
+    return minted, failed
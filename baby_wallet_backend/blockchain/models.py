@@ -1,7 +1,46 @@
-from django.db import models
+import hashlib
+import json
+
+from django.db import models, transaction
 from django.conf import settings
+from django.utils import timezone
 from accounts.models import Child
-from investments.models import Investment
+from investments.models import Investment, Transaction
+
+
+class ContractArtifactManager(models.Manager):
+    def get_queryset(self):
+        # ABIs and bytecode run to tens of kilobytes; load them only when asked for
+        return super().get_queryset().defer('abi', 'bytecode')
+
+    def for_content(self, abi, bytecode=''):
+        """The artifact holding `abi` and `bytecode`, created on first use"""
+        artifact, _ = self.get_or_create(
+            content_hash=ContractArtifact.hash_content(abi, bytecode), defaults={'abi': abi, 'bytecode': bytecode},
+        )
+        return artifact
+
+
+class ContractArtifact(models.Model):
+    """Compiled contract (ABI and bytecode) shared by every deployment of it, keyed by content hash"""
+    content_hash = models.CharField(max_length=64, unique=True)  # sha256 of the canonical ABI JSON and bytecode
+    abi = models.JSONField(default=list)
+    bytecode = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = ContractArtifactManager()
+
+    class Meta:
+        ordering = ['-created_at']
+        base_manager_name = 'objects'  # contract.artifact defers the heavy fields too
+
+    def __str__(self):
+        return self.content_hash[:12]
+
+    @staticmethod
+    def hash_content(abi, bytecode=''):
+        canonical = json.dumps(abi, sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(f'{canonical}\n{bytecode}'.encode()).hexdigest()
 
 
 class SmartContract(models.Model):
@@ -32,14 +71,15 @@ class SmartContract(models.Model):
     contract_type = models.CharField(max_length=20, choices=CONTRACT_TYPES)
     contract_address = models.CharField(max_length=42, unique=True)
     network = models.CharField(max_length=20, choices=NETWORK_CHOICES, default='sepolia')
+    token = models.CharField(max_length=10, choices=Transaction.TOKEN_CHOICES, default='USDC')  # Asset the contract holds
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     deployment_hash = models.CharField(max_length=66, blank=True, null=True)
     block_number = models.BigIntegerField(null=True, blank=True)
     gas_used = models.BigIntegerField(null=True, blank=True)
     gas_price = models.BigIntegerField(null=True, blank=True)
-    contract_abi = models.JSONField(default=list)  # Contract ABI
-    contract_bytecode = models.TextField(blank=True)  # Contract bytecode
+    artifact = models.ForeignKey(ContractArtifact, on_delete=models.PROTECT, related_name='contracts', null=True, blank=True)
     constructor_args = models.JSONField(default=list)  # Constructor arguments
+    next_token_id = models.BigIntegerField(default=1)  # First NFT token id not yet reserved, see minting.reserve_token_ids
     deployed_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -56,13 +96,17 @@ class SmartContract(models.Model):
 
     @property
     def total_value_locked(self):
-        """Get total value locked in the contract"""
+        """On-chain balance of the contract at the chain head, from the per-block TVL snapshot of its network"""
         if not self.is_active:
             return 0
-        
-        # This would typically call the blockchain to get TVL
-        # For now, return the child's current balance
-        return self.child.current_balance
+        from .tvl import tvl_snapshot
+        return tvl_snapshot(self.network).balances.get(self.pk)
+
+    @property
+    def parsed_abi(self):
+        """Events and functions of the contract's ABI, from the in-process cache of parsed artifacts"""
+        from .artifacts import EMPTY_ABI, parsed_abi
+        return parsed_abi(self.artifact.content_hash) if self.artifact_id else EMPTY_ABI
 
     def deploy(self):
         """Deploy the smart contract to blockchain"""
@@ -105,6 +149,9 @@ class NFT(models.Model):
     class Meta:
         ordering = ['-created_at']
         unique_together = ['smart_contract', 'token_id']
+        indexes = [
+            models.Index(fields=['mint_hash'], name='nft_mint_hash_idx'),
+        ]
 
     def __str__(self):
         return f"{self.nft_type} - Token #{self.token_id} ({self.child.name})"
@@ -119,7 +166,7 @@ class NFT(models.Model):
         # This would contain the actual minting logic
         # For now, just update the status
         self.status = 'minted'
-        self.minted_at = models.DateTimeField(auto_now=True)
+        self.minted_at = timezone.now()
         self.save()
 
     def transfer_to_child(self):
@@ -164,12 +211,16 @@ class BlockchainTransaction(models.Model):
     value = models.DecimalField(max_digits=20, decimal_places=18, null=True, blank=True)  # ETH amount
     data = models.TextField(blank=True)  # Transaction data
     receipt = models.JSONField(default=dict)  # Transaction receipt
+    confirmations = models.PositiveIntegerField(default=0)  # Blocks on top of (and including) the mined block
     confirmed_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['network', 'status'], name='blockchain_tx_status_idx'),
+        ]
 
     def __str__(self):
         return f"{self.transaction_type} - {self.transaction_hash[:10]}..."
@@ -185,16 +236,53 @@ class BlockchainTransaction(models.Model):
     def is_confirmed(self):
         return self.status == 'confirmed'
 
-    def confirm(self, block_number, gas_used, gas_price, receipt):
+    def confirm(self, block_number, gas_used, gas_price, receipt, confirmations=None):
         """Confirm the transaction"""
         self.status = 'confirmed'
         self.block_number = block_number
         self.gas_used = gas_used
         self.gas_price = gas_price
         self.receipt = receipt
-        self.confirmed_at = models.DateTimeField(auto_now=True)
+        if confirmations is not None:
+            self.confirmations = confirmations
+        self.confirmed_at = timezone.now()
         self.save()
 
+    def apply_receipt(self, receipt, head_block, required_confirmations):
+        """
+        Record a JSON-RPC receipt without saving. The transaction is confirmed
+        once it is `required_confirmations` deep and reverted as soon as the
+        receipt reports failure; until then only its depth is tracked.
+        """
+        self.block_number = int(receipt['blockNumber'], 16)
+        self.gas_used = int(receipt['gasUsed'], 16)
+        if receipt.get('effectiveGasPrice'):
+            self.gas_price = int(receipt['effectiveGasPrice'], 16)
+        self.receipt = receipt
+        self.confirmations = max(0, head_block - self.block_number + 1)
+        if receipt.get('status') == '0x0':
+            self.status = 'reverted'
+        elif self.confirmations >= required_confirmations:
+            self.status = 'confirmed'
+            self.confirmed_at = timezone.now()
+
+
+class IndexerCheckpoint(models.Model):
+    """Block processed by the event indexer, kept with its hash to detect reorgs"""
+    network = models.CharField(max_length=20, choices=SmartContract.NETWORK_CHOICES)
+    block_number = models.BigIntegerField()
+    block_hash = models.CharField(max_length=66)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-block_number']
+        constraints = [
+            models.UniqueConstraint(fields=['network', 'block_number'], name='unique_indexer_checkpoint'),
+        ]
+
+    def __str__(self):
+        return f"{self.network} - Block {self.block_number}"
+
 
 class GasTracker(models.Model):
     """Model for tracking gas prices"""
@@ -206,11 +294,47 @@ class GasTracker(models.Model):
 
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['network', '-timestamp'], name='gas_network_timestamp_idx'),
+        ]
 
     def __str__(self):
         return f"{self.network} - {self.gas_price_gwei} Gwei - Block {self.block_number}"
 
+    def save(self, *args, **kwargs):
+        from .gas import remember_latest
+        super().save(*args, **kwargs)
+        transaction.on_commit(lambda: remember_latest(self))
+
     @classmethod
     def get_latest_gas_price(cls, network='sepolia'):
-        """Get the latest gas price for a network"""
-        return cls.objects.filter(network=network).first()
+        """Get the latest gas price for a network, from the latest-sample cache when possible"""
+        from .gas import latest_gas_price
+        return latest_gas_price(network)
+
+
+class GasPriceRollup(models.Model):
+    """Min/avg/max gas price per minute or hour, replacing GasTracker samples past retention"""
+    RESOLUTION_CHOICES = [
+        ('minute', 'Minute'),
+        ('hour', 'Hour'),
+    ]
+
+    network = models.CharField(max_length=20, choices=SmartContract.NETWORK_CHOICES)
+    resolution = models.CharField(max_length=10, choices=RESOLUTION_CHOICES)
+    bucket = models.DateTimeField()  # Start of the minute or hour
+    samples = models.PositiveIntegerField()
+    min_gwei = models.BigIntegerField()
+    avg_gwei = models.FloatField()
+    max_gwei = models.BigIntegerField()
+    first_block = models.BigIntegerField()
+    last_block = models.BigIntegerField()
+
+    class Meta:
+        ordering = ['-bucket']
+        constraints = [
+            models.UniqueConstraint(fields=['network', 'resolution', 'bucket'], name='unique_gas_rollup_bucket'),
+        ]
+
+    def __str__(self):
+        return f"{self.network} - {self.resolution} {self.bucket:%Y-%m-%d %H:%M} - {self.avg_gwei:.1f} Gwei"
@@ -0,0 +1,133 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .minting import settle_mints
+from .models import BlockchainTransaction
+from .rpc import RPCError, get_client
+
+
+logger = logging.getLogger(__name__)
+
+RECEIPT_FIELDS = ['status', 'block_number', 'gas_used', 'gas_price', 'receipt', 'confirmations', 'confirmed_at', 'updated_at']
+
+
+@dataclass
+class PollResult:
+    network: str
+    head_block: int = 0
+    pending: int = 0
+    confirmed: int = 0
+    reverted: int = 0
+    errors: int = 0
+    nfts_minted: int = 0
+    seconds: float = 0
+    oldest_pending_age: float = 0  # Seconds the oldest still-pending transaction has waited
+    confirmation_lags: list = field(default_factory=list)  # Seconds from creation to confirmation
+
+    @property
+    def still_pending(self):
+        return self.pending - self.confirmed - self.reverted
+
+    @property
+    def mean_confirmation_lag(self):
+        return sum(self.confirmation_lags) / len(self.confirmation_lags) if self.confirmation_lags else 0
+
+
+def write_receipts(transactions):
+    """
+    Save RECEIPT_FIELDS for many transactions as one parameterised UPDATE run
+    through executemany. QuerySet.bulk_update() builds a CASE expression per
+    row and field, which for thousands of rows costs more than the per-row
+    saves it replaces.
+    """
+    fields = [BlockchainTransaction._meta.get_field(name) for name in RECEIPT_FIELDS]
+    quote = connection.ops.quote_name
+    sql = 'UPDATE {} SET {} WHERE {} = %s'.format(
+        quote(BlockchainTransaction._meta.db_table),
+        ', '.join(f'{quote(field.column)} = %s' for field in fields),
+        quote(BlockchainTransaction._meta.pk.column),
+    )
+    rows = [
+        [field.get_db_prep_save(getattr(tx, field.attname), connection) for field in fields] + [tx.pk]
+        for tx in transactions
+    ]
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.executemany(sql, rows)
+
+
+def poll_receipts(network, client=None, batch_size=100, workers=4, required_confirmations=None):
+    """
+    Fetch receipts for every pending transaction on `network` and write the
+    outcome back in bulk.
+
+    Receipts are requested as JSON-RPC batches of `batch_size` hashes, with
+    `workers` batches in flight at a time; the database sees one SELECT for
+    the pending rows and one batched UPDATE for everything that changed.
+    NFTs whose mint transaction was confirmed or reverted are settled too.
+    """
+    started = time.perf_counter()
+    client = client or get_client(network)
+    if required_confirmations is None:
+        required_confirmations = settings.BLOCKCHAIN_REQUIRED_CONFIRMATIONS
+    result = PollResult(network=network)
+
+    pending = list(
+        BlockchainTransaction.objects.filter(network=network, status='pending')
+        .only('transaction_hash', 'transaction_type', 'created_at', *(name for name in RECEIPT_FIELDS if name != 'receipt'))
+    )
+    result.pending = len(pending)
+    if not pending:
+        return result
+
+    result.head_block = client.block_number()
+    batches = [pending[start:start + batch_size] for start in range(0, len(pending), batch_size)]
+
+    def fetch(batch):
+        return client.batch(
+            [('eth_getTransactionReceipt', [tx.transaction_hash]) for tx in batch], raise_errors=False,
+        )
+
+    now = timezone.now()
+    changed = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for batch, receipts in zip(batches, pool.map(fetch, batches)):
+            for tx, receipt in zip(batch, receipts):
+                if isinstance(receipt, RPCError):
+                    result.errors += 1
+                    continue
+                if receipt is None:
+                    continue
+                depth = tx.confirmations
+                tx.apply_receipt(receipt, result.head_block, required_confirmations)
+                if tx.status == 'confirmed':
+                    result.confirmed += 1
+                    result.confirmation_lags.append((now - tx.created_at).total_seconds())
+                elif tx.status == 'reverted':
+                    result.reverted += 1
+                elif tx.confirmations == depth:
+                    continue
+                tx.updated_at = now
+                changed.append(tx)
+
+    if changed:
+        write_receipts(changed)
+    if any(tx.transaction_type == 'mint' and tx.status != 'pending' for tx in changed):
+        result.nfts_minted, _ = settle_mints(network)
+
+    still_waiting = [tx.created_at for tx in pending if tx.status == 'pending']
+    if still_waiting:
+        result.oldest_pending_age = (now - min(still_waiting)).total_seconds()
+    result.seconds = time.perf_counter() - started
+    logger.info(
+        'Receipt poll %s: %d pending, %d confirmed, %d reverted, %d errors, '
+        'oldest pending %.0fs, mean confirmation lag %.0fs, %.2fs',
+        network, result.pending, result.confirmed, result.reverted, result.errors,
+        result.oldest_pending_age, result.mean_confirmation_lag, result.seconds,
+    )
+    return result
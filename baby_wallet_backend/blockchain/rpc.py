@@ -0,0 +1,229 @@
+import asyncio
+import itertools
+import json
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from requests.adapters import HTTPAdapter
+
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Read-only methods, safe to send twice: only these are retried and coalesced.
+# A send (eth_sendTransaction, eth_sendRawTransaction) that timed out may
+# still have been accepted by the node, and two callers sending the same
+# payload mean two transactions.
+IDEMPOTENT_METHODS = frozenset({
+    'eth_blockNumber', 'eth_call', 'eth_chainId', 'eth_estimateGas', 'eth_gasPrice', 'eth_getBalance',
+    'eth_getBlockByHash', 'eth_getBlockByNumber', 'eth_getCode', 'eth_getLogs', 'eth_getStorageAt',
+    'eth_getTransactionByHash', 'eth_getTransactionCount', 'eth_getTransactionReceipt', 'net_version',
+    'web3_clientVersion',
+})
+
+
+class RPCError(Exception):
+    """Error object returned by the node for a JSON-RPC call"""
+    def __init__(self, code, message, data=None):
+        super().__init__(f'{message} (code {code})')
+        self.code = code
+        self.message = message
+        self.data = data
+
+
+class RPCTransportError(Exception):
+    """The node could not be reached, or kept failing after all retries"""
+
+
+class RPCClient:
+    """
+    JSON-RPC client for one node.
+
+    Requests go through a single requests.Session whose keep-alive pool
+    holds up to `pool_size` connections, so concurrent callers reuse TCP/TLS
+    connections instead of opening one per call. For the read-only methods
+    in IDEMPOTENT_METHODS, identical calls already in flight are coalesced
+    into one request, and transport failures (connection errors, timeouts,
+    429 and 5xx responses) are retried with exponential backoff and jitter.
+    Other methods are sent exactly once.
+    """
+    def __init__(self, url, timeout=10, retries=3, backoff=0.25, pool_size=20):
+        self.url = url
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers['Content-Type'] = 'application/json'
+        self._ids = itertools.count(1)
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def close(self):
+        self.session.close()
+
+    def _post(self, payload, retry=True):
+        body = json.dumps(payload)
+        attempts = self.retries + 1 if retry else 1
+        for attempt in range(attempts):
+            try:
+                response = self.session.post(self.url, data=body, timeout=self.timeout)
+                if response.status_code not in RETRY_STATUS_CODES:
+                    response.raise_for_status()
+                    return response.json()
+                failure = f'HTTP {response.status_code}'
+            except (requests.ConnectionError, requests.Timeout) as exc:
+                failure = exc
+            except (requests.HTTPError, ValueError) as exc:
+                # A 4xx or a body that is not JSON will not get better on retry
+                raise RPCTransportError(f'{self.url} answered with an invalid response: {exc}') from exc
+            if attempt < attempts - 1:
+                time.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+        raise RPCTransportError(f'{self.url} failed after {attempts} attempts: {failure}')
+
+    def _request(self, method, params):
+        return {'jsonrpc': '2.0', 'id': next(self._ids), 'method': method, 'params': params}
+
+    @staticmethod
+    def _result(reply):
+        if 'error' in reply:
+            error = reply['error']
+            return RPCError(error.get('code'), error.get('message', 'Unknown error'), error.get('data'))
+        return reply.get('result')
+
+    def call(self, method, *params):
+        """Call `method` and return its result, sharing the request with identical read-only calls in flight"""
+        if method not in IDEMPOTENT_METHODS:
+            result = self._result(self._post(self._request(method, list(params)), retry=False))
+            if isinstance(result, RPCError):
+                raise result
+            return result
+
+        key = (method, json.dumps(params, sort_keys=True))
+        with self._lock:
+            pending = self._inflight.get(key)
+            if pending is None:
+                pending = self._inflight[key] = Future()
+                leader = True
+            else:
+                leader = False
+        if not leader:
+            return pending.result()
+
+        try:
+            result = self._result(self._post(self._request(method, list(params))))
+        except BaseException as exc:
+            pending.set_exception(exc)
+            raise
+        else:
+            if isinstance(result, RPCError):
+                pending.set_exception(result)
+                raise result
+            pending.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._inflight[key]
+
+    def batch(self, calls, raise_errors=True):
+        """
+        Send several (method, params) calls in one JSON-RPC batch request and
+        return their results in order. With raise_errors=False, calls that
+        failed are returned as RPCError instances instead of raising.
+        """
+        if not calls:
+            return []
+        payload = [self._request(method, list(params)) for method, params in calls]
+        replies = self._post(payload, retry=all(method in IDEMPOTENT_METHODS for method, _ in calls))
+        if isinstance(replies, dict):
+            # Nodes answer a batch they reject as a whole with a single error
+            error = self._result(replies)
+            raise error if isinstance(error, RPCError) else RPCTransportError('Batch answered with a single reply')
+        by_id = {reply.get('id'): reply for reply in replies}
+        results = []
+        for request in payload:
+            reply = by_id.get(request['id'], {'error': {'code': -32603, 'message': 'Missing reply in batch'}})
+            result = self._result(reply)
+            if raise_errors and isinstance(result, RPCError):
+                raise result
+            results.append(result)
+        return results
+
+    def block_number(self):
+        return int(self.call('eth_blockNumber'), 16)
+
+    def gas_price(self):
+        return int(self.call('eth_gasPrice'), 16)
+
+    def get_transaction_receipt(self, transaction_hash):
+        return self.call('eth_getTransactionReceipt', transaction_hash)
+
+
+class AsyncRPCClient:
+    """
+    asyncio front end for RPCClient. Calls run on a private thread pool so
+    they share the synchronous client's connection pool and coalescing.
+    """
+    def __init__(self, client, max_workers=None):
+        self.client = client
+        self.executor = ThreadPoolExecutor(max_workers=max_workers or 32, thread_name_prefix='rpc')
+
+    async def call(self, method, *params):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, lambda: self.client.call(method, *params))
+
+    async def batch(self, calls, raise_errors=True):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, lambda: self.client.batch(calls, raise_errors))
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def rpc_url(network):
+    urls = settings.BLOCKCHAIN_RPC_URLS
+    if network not in urls:
+        raise ImproperlyConfigured(f'No RPC URL configured for network "{network}" in BLOCKCHAIN_RPC_URLS')
+    return urls[network]
+
+
+def get_client(network=None):
+    """Process-wide client for `network` (settings.BLOCKCHAIN_NETWORK by default)"""
+    network = network or settings.BLOCKCHAIN_NETWORK
+    client = _clients.get(network)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(network)
+            if client is None:
+                client = _clients[network] = RPCClient(
+                    rpc_url(network),
+                    timeout=settings.BLOCKCHAIN_RPC_TIMEOUT,
+                    retries=settings.BLOCKCHAIN_RPC_RETRIES,
+                    pool_size=settings.BLOCKCHAIN_RPC_POOL_SIZE,
+                )
+    return client
+
+
+def reset_clients():
+    with _clients_lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
+
+
+@receiver(setting_changed)
+def reset_clients_on_setting_change(setting, **kwargs):
+    if setting.startswith('BLOCKCHAIN_') or setting == 'ETHEREUM_RPC_URL':
+        reset_clients()
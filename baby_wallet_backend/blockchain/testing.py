@@ -0,0 +1,231 @@
+import hashlib
+import json
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from eth_abi import decode, encode
+
+from .abi import function_selector
+
+
+class NodeServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+class StandInNode:
+    """
+    Minimal JSON-RPC node served over HTTP on localhost, for tests and
+    benchmarks. `methods` maps a method name to a callable taking the call's
+    params; it answers single and batch requests with keep-alive, optionally
+    after `latency` seconds, and counts connections and requests so callers
+    can check pooling and coalescing.
+
+        with StandInNode() as node:
+            RPCClient(node.url).block_number()
+    """
+    def __init__(self, methods=None, latency=0):
+        self.latency = latency
+        self.methods = {
+            'eth_blockNumber': lambda params: hex(self.block_number),
+            'eth_gasPrice': lambda params: hex(20 * 10 ** 9),
+            'eth_chainId': lambda params: hex(11155111),
+        }
+        self.methods.update(methods or {})
+        self.block_number = 1
+        self.connections = 0
+        self.requests = 0
+        self.calls = []
+        self.failures = []
+        self._lock = threading.Lock()
+        self.server = NodeServer(('127.0.0.1', 0), self._handler())
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}/'
+
+    def fail_next(self, count=1, status=503):
+        """Answer the next `count` HTTP requests with `status` instead of a reply"""
+        self.failures.extend([status] * count)
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def answer(self, request):
+        with self._lock:
+            self.calls.append(request.get('method'))
+        reply = {'jsonrpc': '2.0', 'id': request.get('id')}
+        method = self.methods.get(request.get('method'))
+        if method is None:
+            reply['error'] = {'code': -32601, 'message': 'Method not found'}
+            return reply
+        try:
+            reply['result'] = method(request.get('params', []))
+        except Exception as exc:
+            reply['error'] = {'code': -32000, 'message': str(exc)}
+        return reply
+
+    def _handler(self):
+        node = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True  # Headers and body are separate writes on a kept-alive socket
+
+            def setup(self):
+                super().setup()
+                with node._lock:
+                    node.connections += 1
+
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                with node._lock:
+                    node.requests += 1
+                    status = node.failures.pop(0) if node.failures else None
+                if node.latency:
+                    time.sleep(node.latency)
+                if status:
+                    self.send_reply(status, b'')
+                elif isinstance(payload, list):
+                    self.send_reply(200, json.dumps([node.answer(call) for call in payload]).encode())
+                else:
+                    self.send_reply(200, json.dumps(node.answer(payload)).encode())
+
+            def send_reply(self, status, body):
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+class FixtureNode(StandInNode):
+    """
+    StandInNode serving a recorded chain: `logs` exactly as eth_getLogs
+    returned them, on top of blocks up to `head` with deterministic hashes
+    and 12-second timestamps. `max_range` and `max_logs` make eth_getLogs
+    reject large queries the way hosted nodes do, and reorg() forks the
+    chain from a given block.
+    """
+    GENESIS_TIME = 1700000000
+
+    def __init__(self, logs=(), head=0, max_range=None, max_logs=None, **kwargs):
+        super().__init__(**kwargs)
+        self.head = head
+        self.max_range = max_range
+        self.max_logs = max_logs
+        self.fork_block = None
+        self.forks = 0
+        self.set_logs(logs)
+        self.methods.update({
+            'eth_blockNumber': lambda params: hex(self.head),
+            'eth_getBlockByNumber': self.get_block,
+            'eth_getLogs': self.get_logs,
+        })
+
+    @classmethod
+    def from_file(cls, path, **kwargs):
+        with open(path, encoding='utf-8') as fixture:
+            recorded = json.load(fixture)
+        return cls(logs=recorded['logs'], head=int(recorded['head'], 16), **kwargs)
+
+    def set_logs(self, logs):
+        self.logs = sorted(logs, key=lambda log: (int(log['blockNumber'], 16), int(log['logIndex'], 16)))
+        self.log_blocks = [int(log['blockNumber'], 16) for log in self.logs]
+
+    def block_hash(self, number):
+        fork = self.forks if self.fork_block is not None and number >= self.fork_block else 0
+        return '0x' + hashlib.sha256(f'{fork}:{number}'.encode()).hexdigest()
+
+    def reorg(self, from_block, logs):
+        """Replace the chain from `from_block` on: new block hashes, and `logs` instead of the old ones there"""
+        self.forks += 1
+        self.fork_block = from_block
+        self.set_logs([log for log in self.logs if int(log['blockNumber'], 16) < from_block] + list(logs))
+
+    def get_block(self, params):
+        number = self.head if params[0] == 'latest' else int(params[0], 16)
+        if number > self.head:
+            return None
+        return {
+            'number': hex(number),
+            'hash': self.block_hash(number),
+            'parentHash': self.block_hash(number - 1),
+            'timestamp': hex(self.GENESIS_TIME + 12 * number),
+        }
+
+    def get_logs(self, params):
+        query = params[0]
+        low, high = int(query['fromBlock'], 16), int(query['toBlock'], 16)
+        if self.max_range is not None and high - low + 1 > self.max_range:
+            raise ValueError(f'block range is too wide, limit is {self.max_range}')
+        addresses = query.get('address')
+        addresses = {addresses.lower()} if isinstance(addresses, str) else {a.lower() for a in addresses or []}
+        topics = (query.get('topics') or [None])[0]
+        topics = {topics} if isinstance(topics, str) else set(topics or [])
+
+        found = [
+            {**log, 'blockHash': self.block_hash(int(log['blockNumber'], 16))}
+            for log in self.logs[bisect_left(self.log_blocks, low):bisect_right(self.log_blocks, high)]
+            if (not addresses or log['address'].lower() in addresses)
+            and (not topics or (log['topics'] and log['topics'][0] in topics))
+        ]
+        if self.max_logs is not None and len(found) > self.max_logs:
+            raise ValueError(f'query returned more than {self.max_logs} results')
+        return found
+
+
+class MulticallNode(StandInNode):
+    """
+    StandInNode answering Multicall3 aggregate3 eth_calls with balances from
+    `eth_balances` (address -> wei) and `token_balances` ((token, holder) ->
+    units). Balance reads of addresses in `reverting` fail, and the block
+    tag of every eth_call is recorded in `call_blocks`.
+    """
+    MULTICALL = '0xca11bde05977b3631167028862be2a173976ca11'
+
+    def __init__(self, eth_balances=None, token_balances=None, **kwargs):
+        super().__init__(**kwargs)
+        self.eth_balances = {address.lower(): units for address, units in (eth_balances or {}).items()}
+        self.token_balances = {
+            (token.lower(), holder.lower()): units for (token, holder), units in (token_balances or {}).items()
+        }
+        self.reverting = set()
+        self.call_blocks = []
+        self.methods['eth_call'] = self.call
+
+    def call(self, params):
+        transaction, block = params
+        self.call_blocks.append(block)
+        data = bytes.fromhex(transaction['data'][2:])
+        if transaction['to'].lower() != self.MULTICALL or data[:4] != function_selector(
+                'aggregate3((address,bool,bytes)[])'):
+            raise ValueError('execution reverted')
+        results = []
+        for target, _, call_data in decode(['(address,bool,bytes)[]'], data[4:])[0]:
+            selector, (holder,) = call_data[:4], decode(['address'], call_data[4:])
+            if holder.lower() in self.reverting:
+                results.append((False, b''))
+            elif selector == function_selector('getEthBalance(address)') and target.lower() == self.MULTICALL:
+                results.append((True, encode(['uint256'], [self.eth_balances.get(holder.lower(), 0)])))
+            elif selector == function_selector('balanceOf(address)'):
+                units = self.token_balances.get((target.lower(), holder.lower()), 0)
+                results.append((True, encode(['uint256'], [units])))
+            else:
+                results.append((False, b''))
+        return '0x' + encode(['(bool,bytes)[]'], [results]).hex()
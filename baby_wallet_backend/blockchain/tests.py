@@ -1,3 +1,715 @@
-from django.test import TestCase
+import asyncio
+import os
+import threading
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.db.models import Count
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from eth_abi import encode
+
+from accounts.models import Child, User
+from investments.models import Transaction
+from .abi import event_topic, function_selector
+from .artifacts import clear_abi_cache, parsed_abi
+from .gas import clear_latest_cache, downsample_gas_prices, gas_price_history
+from .gas_stats import clear_stats_cache, compute_gas_price_stats, exponential_moving_average
+from .indexer import index_network
+from .minting import MINT_BATCH_SIGNATURE, mint_nfts, reserve_token_ids, submit_mints
+from .models import NFT, BlockchainTransaction, ContractArtifact, GasPriceRollup, GasTracker, IndexerCheckpoint, SmartContract
+from .receipts import poll_receipts
+from .rpc import AsyncRPCClient, RPCClient, RPCError, RPCTransportError, get_client, reset_clients
+from .testing import FixtureNode, MulticallNode, StandInNode
+from .tvl import clear_tvl_cache, reconcile, tvl_snapshot
+
+
+class RPCClientTests(SimpleTestCase):
+    def setUp(self):
+        self.node = StandInNode().start()
+        self.addCleanup(self.node.stop)
+        self.client = RPCClient(self.node.url, backoff=0)
+        self.addCleanup(self.client.close)
+
+    def test_call_and_error(self):
+        self.node.block_number = 42
+        self.assertEqual(self.client.block_number(), 42)
+        with self.assertRaises(RPCError) as raised:
+            self.client.call('eth_unknown')
+        self.assertEqual(raised.exception.code, -32601)
+
+    def test_connections_are_kept_alive(self):
+        for _ in range(20):
+            self.client.block_number()
+        self.assertEqual(self.node.requests, 20)
+        self.assertEqual(self.node.connections, 1)
+
+    def test_batch_keeps_order_in_one_request(self):
+        results = self.client.batch(
+            [('eth_chainId', []), ('eth_unknown', []), ('eth_blockNumber', [])], raise_errors=False,
+        )
+        self.assertEqual(self.node.requests, 1)
+        self.assertEqual(results[0], hex(11155111))
+        self.assertIsInstance(results[1], RPCError)
+        self.assertEqual(results[2], '0x1')
+        with self.assertRaises(RPCError):
+            self.client.batch([('eth_unknown', [])])
+
+    def test_retries_transient_failures(self):
+        self.node.fail_next(2, status=503)
+        self.assertEqual(self.client.gas_price(), 20 * 10 ** 9)
+        self.assertEqual(self.node.requests, 3)
+
+        self.node.fail_next(4, status=502)
+        with self.assertRaises(RPCTransportError):
+            self.client.block_number()
+
+    def test_sends_are_neither_retried_nor_coalesced(self):
+        self.node.methods['eth_sendTransaction'] = lambda params: tx_hash(1)
+        self.node.fail_next(1, status=503)
+        with self.assertRaises(RPCTransportError):
+            self.client.call('eth_sendTransaction', {'data': '0x01'})
+        self.assertEqual(self.node.requests, 1)
+        self.node.fail_next(1, status=503)
+        with self.assertRaises(RPCTransportError):
+            self.client.batch([('eth_sendTransaction', [{'data': '0x01'}])] * 2)
+        self.assertEqual(self.node.requests, 2)
+
+        self.node.latency = 0.2
+        threads = [
+            threading.Thread(target=lambda: self.client.call('eth_sendTransaction', {'data': '0x01'}))
+            for _ in range(3)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.node.requests, 5)  # One per identical send in flight
+
+    def test_client_errors_and_invalid_bodies_are_transport_errors(self):
+        self.node.fail_next(1, status=400)
+        with self.assertRaises(RPCTransportError):
+            self.client.block_number()
+        self.node.fail_next(1, status=200)  # An empty body
+        with self.assertRaises(RPCTransportError):
+            self.client.block_number()
+        self.assertEqual(self.node.requests, 2)
+
+    def test_identical_inflight_calls_are_coalesced(self):
+        self.node.latency = 0.2
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(self.client.block_number())) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, [1] * 10)
+        self.assertEqual(self.node.requests, 1)
+
+    def test_async_client(self):
+        async_client = AsyncRPCClient(self.client)
+        self.addCleanup(async_client.close)
+
+        async def gather():
+            return await asyncio.gather(
+                async_client.call('eth_chainId'),
+                async_client.batch([('eth_blockNumber', []), ('eth_gasPrice', [])]),
+            )
+
+        chain_id, (block, gas) = asyncio.run(gather())
+        self.assertEqual(chain_id, hex(11155111))
+        self.assertEqual((block, gas), ('0x1', hex(20 * 10 ** 9)))
+
+    def test_get_client_per_network(self):
+        with override_settings(BLOCKCHAIN_RPC_URLS={'sepolia': self.node.url}):
+            client = get_client('sepolia')
+            self.assertIs(get_client('sepolia'), client)
+            self.assertEqual(client.block_number(), 1)
+            with self.assertRaises(ImproperlyConfigured):
+                get_client('polygon')
+
+
+def tx_hash(n):
+    return f'0x{n:064x}'
+
+
+class ReceiptPollerTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('parent', 'parent@example.com', 'test123')
+        self.receipts = {}
+        self.node = StandInNode(methods={
+            'eth_getTransactionReceipt': lambda params: self.receipts.get(params[0]),
+        }).start()
+        self.addCleanup(self.node.stop)
+        self.node.block_number = 100
+        self.client = RPCClient(self.node.url, backoff=0)
+        self.addCleanup(self.client.close)
+
+        BlockchainTransaction.objects.bulk_create([
+            BlockchainTransaction(user=self.user, transaction_type='deposit', transaction_hash=tx_hash(n),
+                                  from_address='0x' + '1' * 40)
+            for n in range(30)
+        ])
+        for n in range(20):
+            self.receipts[tx_hash(n)] = {
+                'blockNumber': hex(80 + n), 'gasUsed': hex(21000),
+                'effectiveGasPrice': hex(3 * 10 ** 9), 'status': '0x0' if n == 0 else '0x1',
+            }
+
+    def test_pending_transactions_are_updated_in_bulk(self):
+        with CaptureQueriesContext(connection) as queries:
+            result = poll_receipts('sepolia', client=self.client, batch_size=7, required_confirmations=12)
+        statements = [q['sql'] for q in queries if 'SAVEPOINT' not in q['sql']]
+        self.assertEqual(len(statements), 2)
+        self.assertTrue(statements[0].startswith('SELECT'))
+        self.assertTrue(statements[1].startswith('20 times: UPDATE'))  # One executemany for every changed row
+        self.assertEqual(self.node.calls.count('eth_getTransactionReceipt'), 30)
+        self.assertEqual(self.node.requests, 6)  # eth_blockNumber and 5 receipt batches
+
+        # Blocks 81..89 are 20..12 deep, blocks 90..99 are still shallower than 12
+        self.assertEqual((result.pending, result.confirmed, result.reverted, result.still_pending), (30, 9, 1, 20))
+        reverted = BlockchainTransaction.objects.get(transaction_hash=tx_hash(0))
+        self.assertEqual((reverted.status, reverted.gas_used), ('reverted', 21000))
+        confirmed = BlockchainTransaction.objects.get(transaction_hash=tx_hash(1))
+        self.assertEqual((confirmed.status, confirmed.confirmations, confirmed.gas_price), ('confirmed', 20, 3 * 10 ** 9))
+        self.assertIsNotNone(confirmed.confirmed_at)
+        shallow = BlockchainTransaction.objects.get(transaction_hash=tx_hash(19))
+        self.assertEqual((shallow.status, shallow.confirmations), ('pending', 2))
+
+    def test_later_poll_confirms_deeper_transactions(self):
+        poll_receipts('sepolia', client=self.client, required_confirmations=12)
+        self.node.block_number = 130
+        result = poll_receipts('sepolia', client=self.client, required_confirmations=12)
+        self.assertEqual((result.pending, result.confirmed), (20, 10))
+        self.assertEqual(BlockchainTransaction.objects.filter(status='pending').count(), 10)
+        self.assertGreaterEqual(result.oldest_pending_age, 0)
+
+
+def gas_sample(gwei, block, timestamp=None, network='sepolia'):
+    sample = GasTracker.objects.create(
+        network=network, gas_price_gwei=gwei, gas_price_eth=Decimal(gwei) / 10 ** 9, block_number=block,
+    )
+    if timestamp is not None:
+        GasTracker.objects.filter(pk=sample.pk).update(timestamp=timestamp)
+    return sample
+
+
+class LatestGasPriceTests(TestCase):
+    def setUp(self):
+        clear_latest_cache()
+        cache.clear()
+
+    def test_latest_is_refreshed_on_write(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            gas_sample(20, 100)
+        with self.assertNumQueries(0):
+            self.assertEqual(GasTracker.get_latest_gas_price('sepolia').block_number, 100)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            gas_sample(25, 101)
+        with self.assertNumQueries(0):
+            self.assertEqual(GasTracker.get_latest_gas_price('sepolia').gas_price_gwei, 25)
+
+    def test_fallback_query_is_cached(self):
+        gas_sample(30, 7, network='polygon')
+        clear_latest_cache()
+        with self.assertNumQueries(1):
+            GasTracker.get_latest_gas_price('polygon')
+            self.assertEqual(GasTracker.get_latest_gas_price('polygon').block_number, 7)
+
+    @override_settings(GAS_PRICE_SHARED_CACHE=True)
+    def test_shared_cache_serves_other_processes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            gas_sample(40, 200)
+        clear_latest_cache()  # As seen from a process that did not write the sample
+        with self.assertNumQueries(0):
+            self.assertEqual(GasTracker.get_latest_gas_price('sepolia').block_number, 200)
+
+
+class GasDownsamplingTests(TestCase):
+    def setUp(self):
+        self.now = timezone.now().replace(minute=30, second=0, microsecond=0)
+
+    def test_raw_samples_become_minute_rollups(self):
+        old = self.now - timedelta(days=2)
+        for second, gwei in enumerate([10, 20, 60]):
+            gas_sample(gwei, 100 + second, old + timedelta(seconds=second * 10))
+        gas_sample(15, 200, old + timedelta(minutes=1))
+        gas_sample(99, 300, self.now - timedelta(hours=1))
+
+        self.assertEqual(downsample_gas_prices(now=self.now), (4, 0))
+        self.assertEqual(GasTracker.objects.count(), 1)
+        first, second = GasPriceRollup.objects.order_by('bucket')
+        self.assertEqual((first.bucket, first.resolution, first.samples), (old, 'minute', 3))
+        self.assertEqual((first.min_gwei, first.avg_gwei, first.max_gwei), (10, 30, 60))
+        self.assertEqual((first.first_block, first.last_block), (100, 102))
+        self.assertEqual(second.samples, 1)
+
+        history = gas_price_history('sepolia', since=old)
+        self.assertEqual([row['resolution'] for row in history], ['minute', 'minute', 'raw'])
+        self.assertEqual(history[-1]['max_gwei'], 99)
+
+    def test_late_samples_merge_into_existing_rollup(self):
+        old = self.now - timedelta(days=2)
+        gas_sample(10, 1, old)
+        downsample_gas_prices(now=self.now)
+        gas_sample(30, 2, old + timedelta(seconds=30))
+        downsample_gas_prices(now=self.now)
+        rollup = GasPriceRollup.objects.get()
+        self.assertEqual((rollup.samples, rollup.avg_gwei, rollup.max_gwei), (2, 20, 30))
+
+    def test_minute_rollups_become_hour_rollups(self):
+        hour = self.now.replace(minute=0) - timedelta(days=40)
+        GasPriceRollup.objects.bulk_create([
+            GasPriceRollup(network='sepolia', resolution='minute', bucket=hour + timedelta(minutes=minute),
+                           samples=samples, min_gwei=gwei, avg_gwei=gwei, max_gwei=gwei,
+                           first_block=minute * 10, last_block=minute * 10 + 9)
+            for minute, samples, gwei in [(0, 1, 10), (1, 3, 30), (59, 4, 5)]
+        ])
+        self.assertEqual(downsample_gas_prices(now=self.now), (0, 3))
+        rollup = GasPriceRollup.objects.get()
+        self.assertEqual((rollup.resolution, rollup.bucket, rollup.samples), ('hour', hour, 8))
+        self.assertEqual((rollup.min_gwei, rollup.max_gwei, rollup.last_block), (5, 30, 599))
+        self.assertAlmostEqual(rollup.avg_gwei, (10 + 90 + 20) / 8)
+
+
+class GasPriceStatsTests(APITestCase):
+    def setUp(self):
+        clear_latest_cache()
+        clear_stats_cache()
+        cache.clear()
+        self.user = User.objects.create_user('parent', 'parent@example.com', 'test123')
+        self.client.force_authenticate(self.user)
+        GasTracker.objects.bulk_create([
+            GasTracker(network='sepolia', gas_price_gwei=gwei, gas_price_eth=Decimal(gwei) / 10 ** 9,
+                       block_number=1000 + gwei)
+            for gwei in range(1, 101)
+        ])
+        start = timezone.now() - timedelta(minutes=30)
+        for sample in GasTracker.objects.all():
+            GasTracker.objects.filter(pk=sample.pk).update(timestamp=start + timedelta(seconds=sample.block_number))
+
+    def test_percentiles_ema_and_forecast(self):
+        stats = compute_gas_price_stats('sepolia', window=100, span=20, horizon=5)
+        self.assertEqual((stats['samples'], stats['block_number'], stats['forecast_block']), (100, 1100, 1105))
+        self.assertEqual((stats['p10'], stats['p50'], stats['p90']), (10.9, 50.5, 90.1))
+        self.assertTrue(81 < stats['ema'] < 100)
+        # Prices rise one gwei per block, so the forecast runs ahead of the EMA
+        self.assertAlmostEqual(stats['forecast'], stats['ema'] + 5, places=3)
+
+    def test_window_limits_history(self):
+        stats = compute_gas_price_stats('sepolia', window=10)
+        self.assertEqual((stats['samples'], stats['p10'], stats['p90']), (10, 91.9, 99.1))
+
+    def test_ema_matches_recursive_definition(self):
+        values = [3.0, 7.0, 4.0, 9.0]
+        alpha = 2 / (3 + 1)
+        numerator = denominator = 0.0
+        for value in values:
+            numerator = value + (1 - alpha) * numerator
+            denominator = 1 + (1 - alpha) * denominator
+        self.assertAlmostEqual(exponential_moving_average(values, 3), numerator / denominator)
+
+    def test_endpoint_is_cached_until_next_sample(self):
+        response = self.client.get('/api/gas-stats/sepolia/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['block_number'], 1100)
+        with self.assertNumQueries(0):
+            self.client.get('/api/gas-stats/sepolia/')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            gas_sample(500, 1101)
+        self.assertEqual(self.client.get('/api/gas-stats/sepolia/').json()['block_number'], 1101)
+
+    def test_unknown_or_empty_network(self):
+        self.assertEqual(self.client.get('/api/gas-stats/solana/').status_code, 404)
+        self.assertEqual(self.client.get('/api/gas-stats/polygon/').status_code, 404)
+
+
+SAVINGS_ABI = [
+    {'type': 'event', 'name': 'Deposit', 'anonymous': False, 'inputs': [
+        {'name': 'from', 'type': 'address', 'indexed': True},
+        {'name': 'amount', 'type': 'uint256', 'indexed': False},
+    ]},
+    {'type': 'event', 'name': 'Withdrawal', 'anonymous': False, 'inputs': [
+        {'name': 'to', 'type': 'address', 'indexed': True},
+        {'name': 'amount', 'type': 'uint256', 'indexed': False},
+    ]},
+    {'type': 'function', 'name': 'deposit', 'inputs': [], 'outputs': [], 'stateMutability': 'payable'},
+]
+CONTRACT_A = '0x' + 'a1' * 20
+CONTRACT_B = '0x' + 'b2' * 20
+PARENT = '0x' + '11' * 20
+RECORDED_CHAIN = os.path.join(os.path.dirname(__file__), 'testdata', 'sepolia_deposits.json')
+
+
+def event_log(address, block, index, units, tx, event='Deposit'):
+    abi = next(entry for entry in SAVINGS_ABI if entry.get('name') == event)
+    return {
+        'address': address, 'topics': [event_topic(abi), '0x' + '00' * 12 + PARENT[2:]],
+        'data': '0x' + encode(['uint256'], [units]).hex(), 'blockNumber': hex(block),
+        'transactionHash': f'0x{tx:064x}', 'transactionIndex': '0x0', 'logIndex': hex(index), 'removed': False,
+    }
+
+
+class EventIndexerTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('parent', 'parent@example.com', 'test123')
+        self.emma = Child.objects.create(user=self.user, name='Emma', date_of_birth='2018-05-15')
+        self.leo = Child.objects.create(user=self.user, name='Leo', date_of_birth='2020-01-01')
+        for child, address in [(self.emma, CONTRACT_A), (self.leo, CONTRACT_B)]:
+            SmartContract.objects.create(
+                user=self.user, child=child, contract_type='savings', contract_address=address,
+                status='deployed', block_number=1000, artifact=ContractArtifact.objects.for_content(SAVINGS_ABI),
+            )
+
+    def serve(self, node):
+        node.start()
+        self.addCleanup(node.stop)
+        self.client = RPCClient(node.url, backoff=0)
+        self.addCleanup(self.client.close)
+        return node
+
+    def balances(self):
+        return dict(Child.objects.values_list('name', 'current_balance'))
+
+    def test_recorded_chain_is_ingested(self):
+        self.serve(FixtureNode.from_file(RECORDED_CHAIN))
+        with self.captureOnCommitCallbacks(execute=True):
+            result = index_network('sepolia', client=self.client)
+
+        self.assertEqual((result.from_block, result.to_block, result.logs, result.transactions), (1000, 10000, 5, 5))
+        self.assertEqual(self.balances(), {'Emma': Decimal('360.50'), 'Leo': Decimal('75.00')})
+        deposit = Transaction.objects.get(transaction_hash=f'0x{1:064x}')
+        self.assertEqual((deposit.transaction_type, deposit.status, deposit.amount), ('investment', 'completed', Decimal('250.00')))
+        self.assertEqual(deposit.created_at, datetime.fromtimestamp(FixtureNode.GENESIS_TIME + 12 * 1203, tz=dt_timezone.utc))
+        self.assertEqual(Transaction.objects.get(transaction_type='withdrawal').amount, Decimal('30.00'))
+        self.assertEqual(BlockchainTransaction.objects.filter(status='confirmed').count(), 4)
+        self.assertEqual(BlockchainTransaction.objects.get(transaction_hash=f'0x{1:064x}').from_address, PARENT)
+        self.assertEqual(IndexerCheckpoint.objects.get().block_number, 10000)
+
+        self.assertEqual(index_network('sepolia', client=self.client).transactions, 0)
+
+    def test_reindexing_does_not_duplicate(self):
+        self.serve(FixtureNode.from_file(RECORDED_CHAIN))
+        index_network('sepolia', client=self.client)
+        IndexerCheckpoint.objects.all().delete()
+        result = index_network('sepolia', client=self.client)
+        self.assertEqual((result.logs, result.transactions), (5, 0))
+        self.assertEqual(Transaction.objects.count(), 5)
+        self.assertEqual(self.balances(), {'Emma': Decimal('360.50'), 'Leo': Decimal('75.00')})
+
+    @override_settings(BLOCKCHAIN_INDEXER_BATCH=1)
+    def test_reorg_rolls_back_to_common_ancestor(self):
+        node = self.serve(FixtureNode.from_file(RECORDED_CHAIN))
+        index_network('sepolia', client=self.client)
+        self.assertEqual(
+            list(IndexerCheckpoint.objects.order_by('block_number').values_list('block_number', flat=True)),
+            [2999, 6999, 10000],
+        )
+
+        # The withdrawal at block 8800 is dropped and a deposit lands at 8500 instead
+        node.reorg(8000, [event_log(CONTRACT_A, 8500, 0, 12_000_000, tx=77)])
+        node.head = 10100
+        with self.assertLogs('blockchain.indexer', 'WARNING') as logged:
+            result = index_network('sepolia', client=self.client)
+        self.assertIn('rolling back to 6999', logged.output[0])
+
+        self.assertEqual((result.reorgs, result.to_block), (1, 10100))
+        self.assertEqual(self.balances(), {'Emma': Decimal('402.50'), 'Leo': Decimal('75.00')})
+        self.assertFalse(Transaction.objects.filter(transaction_type='withdrawal').exists())
+        withdrawal = BlockchainTransaction.objects.get(transaction_hash=f'0x{4:064x}')
+        self.assertEqual((withdrawal.status, withdrawal.block_number), ('pending', None))
+        self.assertEqual(IndexerCheckpoint.objects.order_by('-block_number').first().block_hash, node.block_hash(10100))
+
+    def test_adaptive_ranges_catch_up_100k_blocks(self):
+        logs = [event_log(CONTRACT_A if n % 2 else CONTRACT_B, 1000 + n * 199, 0, 1_000_000, tx=n) for n in range(500)]
+        # Dense burst the node refuses to return in one go
+        logs += [event_log(CONTRACT_A, 60000 + index % 3, index, 1_000_000, tx=1000 + index) for index in range(150)]
+        node = self.serve(FixtureNode(logs=logs, head=101000, max_range=20000, max_logs=100))
+
+        result = index_network('sepolia', client=self.client)
+        self.assertEqual((result.blocks, result.logs, result.transactions), (100001, 650, 650))
+        self.assertLess(result.requests, 60)
+        self.assertEqual(self.balances(), {'Emma': Decimal('400.00'), 'Leo': Decimal('250.00')})
+        self.assertLess(node.requests, 60)
+
+
+MINTER = '0x' + 'ab' * 20
+
+
+@override_settings(BLOCKCHAIN_MINTER_ADDRESS=MINTER)
+class NFTMintingTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('parent', 'parent@example.com', 'test123', wallet_address=PARENT)
+        self.child = Child.objects.create(user=self.user, name='Emma', date_of_birth='2018-05-15')
+        self.contract = SmartContract.objects.create(
+            user=self.user, child=self.child, contract_type='nft', contract_address=CONTRACT_A, status='deployed',
+        )
+        self.sent = []
+        self.receipts = {}
+        self.node = StandInNode(methods={
+            'eth_sendTransaction': self.send_transaction,
+            'eth_getTransactionReceipt': lambda params: self.receipts.get(params[0]),
+        }).start()
+        self.addCleanup(self.node.stop)
+        self.client = RPCClient(self.node.url, backoff=0)
+        self.addCleanup(self.client.close)
+
+    def send_transaction(self, params):
+        self.sent.append(params[0])
+        return tx_hash(9000 + len(self.sent))
+
+    def reject_transaction(self, params):
+        raise ValueError('nonce too low')
+
+    def milestones(self, count):
+        return [
+            NFT(user=self.user, child=self.child, nft_type='milestone', metadata={'milestone': n},
+                token_uri=f'https://example.com/milestones/{n}.json')
+            for n in range(count)
+        ]
+
+    def test_reservations_are_disjoint(self):
+        self.assertEqual(reserve_token_ids(self.contract, 3), range(1, 4))
+        other = SmartContract.objects.get(pk=self.contract.pk)
+        self.assertEqual(reserve_token_ids(other, 5), range(4, 9))
+        self.assertEqual(reserve_token_ids(self.contract, 2), range(9, 11))
+        self.assertEqual(SmartContract.objects.get(pk=self.contract.pk).next_token_id, 11)
+
+    def test_batch_is_created_and_submitted_in_bulk(self):
+        with CaptureQueriesContext(connection) as queries:
+            nfts = mint_nfts(self.contract, self.milestones(250), client=self.client, batch_size=100)
+        # SQLite splits the NFT bulk_create into several INSERTs; everything else is per call or per batch
+        statements = [q['sql'] for q in queries
+                      if 'SAVEPOINT' not in q['sql'] and not q['sql'].startswith('INSERT INTO "blockchain_nft"')]
+        self.assertEqual(len(statements), 7)
+        self.assertEqual(sum(sql.startswith('UPDATE "blockchain_nft"') for sql in statements), 3)
+
+        self.assertEqual([nft.token_id for nft in nfts], list(range(1, 251)))
+        self.assertEqual(self.node.requests, 1)
+        self.assertEqual(len(self.sent), 3)
+        self.assertEqual({payload['from'] for payload in self.sent}, {MINTER})
+        self.assertTrue(self.sent[0]['data'].startswith('0x' + function_selector(MINT_BATCH_SIGNATURE).hex()))
+        self.assertEqual(
+            list(BlockchainTransaction.objects.filter(transaction_type='mint').order_by('transaction_hash')
+                 .values_list('transaction_hash', 'status')),
+            [(tx_hash(9001), 'pending'), (tx_hash(9002), 'pending'), (tx_hash(9003), 'pending')],
+        )
+        self.assertEqual(NFT.objects.filter(mint_hash=tx_hash(9003)).count(), 50)
+        self.assertEqual(NFT.objects.get(token_id=101).mint_hash, tx_hash(9002))
+
+    def test_confirmations_settle_nfts_in_bulk(self):
+        mint_nfts(self.contract, self.milestones(30), client=self.client, batch_size=10)
+        self.node.block_number = 100
+        self.receipts[tx_hash(9001)] = {'blockNumber': hex(80), 'gasUsed': hex(90000), 'status': '0x1'}
+        self.receipts[tx_hash(9002)] = {'blockNumber': hex(81), 'gasUsed': hex(90000), 'status': '0x0'}
+        self.receipts[tx_hash(9003)] = {'blockNumber': hex(99), 'gasUsed': hex(90000), 'status': '0x1'}
+
+        result = poll_receipts('sepolia', client=self.client, required_confirmations=12)
+        self.assertEqual(result.nfts_minted, 10)
+        statuses = dict(NFT.objects.values('status').annotate(count=Count('id')).values_list('status', 'count'))
+        self.assertEqual(statuses, {'minted': 10, 'failed': 10, 'pending': 10})
+        minted = NFT.objects.get(token_id=1)
+        self.assertEqual(minted.block_number, 80)
+        self.assertIsNotNone(minted.minted_at)
+
+        self.node.block_number = 120
+        poll_receipts('sepolia', client=self.client, required_confirmations=12)
+        self.assertEqual(NFT.objects.filter(status='minted').count(), 20)
+
+    def test_rejected_batch_can_be_resubmitted(self):
+        self.node.methods['eth_sendTransaction'] = self.reject_transaction
+        with self.assertLogs('blockchain.minting', 'WARNING'):
+            nfts = mint_nfts(self.contract, self.milestones(5), client=self.client)
+        self.assertFalse(BlockchainTransaction.objects.exists())
+        self.assertEqual(NFT.objects.filter(mint_hash__isnull=True).count(), 5)
+
+        self.node.methods['eth_sendTransaction'] = self.send_transaction
+        hashes = submit_mints(self.contract, NFT.objects.filter(status='pending', mint_hash__isnull=True),
+                              client=self.client)
+        self.assertEqual(hashes, [tx_hash(9001)])
+        self.assertEqual(NFT.objects.filter(mint_hash=tx_hash(9001)).count(), len(nfts))
+
+    def test_minter_address_is_required(self):
+        with override_settings(BLOCKCHAIN_MINTER_ADDRESS=''):
+            with self.assertRaises(ImproperlyConfigured):
+                mint_nfts(self.contract, self.milestones(1), client=self.client)
+
+
+class ContractArtifactTests(TestCase):
+    def setUp(self):
+        clear_abi_cache()
+        self.user = User.objects.create_superuser('admin', 'admin@example.com', 'test123')
+        self.child = Child.objects.create(user=self.user, name='Emma', date_of_birth='2018-05-15')
+
+    def deploy(self, count, bytecode='0x6080'):
+        artifact = ContractArtifact.objects.for_content(SAVINGS_ABI, bytecode)
+        existing = SmartContract.objects.count()
+        SmartContract.objects.bulk_create([
+            SmartContract(user=self.user, child=self.child, contract_type='savings', artifact=artifact,
+                          contract_address=f'0x{existing + n:040x}')
+            for n in range(count)
+        ])
+        return artifact
+
+    def test_identical_content_is_stored_once(self):
+        first = self.deploy(3)
+        self.assertEqual(self.deploy(2), first)
+        self.assertNotEqual(self.deploy(1, bytecode='0x6081'), first)
+        self.assertEqual(ContractArtifact.objects.count(), 2)
+        self.assertEqual(first.contracts.count(), 5)
+        reordered = [{key: entry[key] for key in reversed(list(entry))} for entry in SAVINGS_ABI]
+        self.assertEqual(ContractArtifact.hash_content(reordered, '0x6080'), first.content_hash)
+
+    def test_heavy_fields_are_deferred(self):
+        self.deploy(1)
+        self.assertEqual(ContractArtifact.objects.get().get_deferred_fields(), {'abi', 'bytecode'})
+        contract = SmartContract.objects.get()
+        self.assertEqual(contract.artifact.get_deferred_fields(), {'abi', 'bytecode'})
+        self.assertEqual(contract.artifact.bytecode, '0x6080')
+
+    def test_parsed_abi_is_cached_per_artifact(self):
+        self.deploy(2)
+        first, second = SmartContract.objects.select_related('artifact')
+        with self.assertNumQueries(1):
+            events = first.parsed_abi.events
+            self.assertIs(second.parsed_abi, first.parsed_abi)
+        self.assertEqual(sorted(event['name'] for event in events.values()), ['Deposit', 'Withdrawal'])
+        self.assertEqual(list(first.parsed_abi.functions), ['deposit()'])
+        with self.assertRaises(ContractArtifact.DoesNotExist):
+            parsed_abi('0' * 64)
+
+    def test_admin_listing_does_not_grow_with_rows(self):
+        self.client.force_login(self.user)
+        counts = []
+        for total in (2, 20):
+            self.deploy(total - SmartContract.objects.count())
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get('/admin/blockchain/smartcontract/')
+            self.assertEqual(response.status_code, 200)
+            self.assertFalse(any('bytecode' in query['sql'] for query in queries))
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_admin_cannot_add_artifacts(self):
+        self.client.force_login(self.user)
+        response = self.client.get('/admin/blockchain/contractartifact/add/')
+        self.assertEqual(response.status_code, 403)
+        response = self.client.get('/admin/blockchain/contractartifact/')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, '/admin/blockchain/contractartifact/add/')
+
+
+SEPOLIA_USDC = '0x1c7D4B196Cb0C7B01d743Fbc6116a902379C7238'
+
+
+@override_settings(BLOCKCHAIN_MULTICALL_CHUNK=3)
+class TVLTests(APITestCase):
+    def setUp(self):
+        clear_tvl_cache()
+        self.user = User.objects.create_user('parent', 'parent@example.com', 'test123')
+        self.client.force_authenticate(self.user)
+        self.emma = Child.objects.create(user=self.user, name='Emma', date_of_birth='2018-05-15',
+                                         current_balance=Decimal('150.00'))
+        self.leo = Child.objects.create(user=self.user, name='Leo', date_of_birth='2020-01-01',
+                                        current_balance=Decimal('20.00'))
+        self.contracts = {}
+        for n, (child, token) in enumerate([(self.emma, 'USDC'), (self.emma, 'USDC'), (self.emma, 'ETH'),
+                                            (self.leo, 'USDC'), (self.leo, 'USDC')]):
+            self.contracts[n] = SmartContract.objects.create(
+                user=self.user, child=child, contract_type='savings', contract_address=f'0x{n + 1:040x}',
+                token=token, status='deployed',
+            )
+        self.node = MulticallNode(
+            eth_balances={'0x' + '0' * 39 + '3': 5 * 10 ** 17},
+            token_balances={
+                (SEPOLIA_USDC, '0x' + '0' * 39 + '1'): 100_000_000,
+                (SEPOLIA_USDC, '0x' + '0' * 39 + '2'): 50_000_000,
+                (SEPOLIA_USDC, '0x' + '0' * 39 + '4'): 12_500_000,
+            },
+        ).start()
+        self.addCleanup(self.node.stop)
+        self.node.block_number = 500
+        settings_override = override_settings(BLOCKCHAIN_RPC_URLS={'sepolia': self.node.url})
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.addCleanup(reset_clients)
+
+    def test_balances_are_read_in_one_batch_at_one_block(self):
+        snapshot = tvl_snapshot('sepolia')
+        self.assertEqual(snapshot.block_number, 500)
+        self.assertEqual(self.node.calls.count('eth_call'), 2)  # 5 balances in chunks of 3
+        self.assertEqual(self.node.requests, 2)  # eth_blockNumber, then one JSON-RPC batch
+        self.assertEqual(set(self.node.call_blocks), {hex(500)})
+        self.assertEqual(snapshot.by_token(), {'USDC': Decimal('162.50'), 'ETH': Decimal('0.50')})
+        self.assertEqual(self.contracts[4].total_value_locked, Decimal('0.00'))
+
+    def test_snapshot_is_cached_per_block(self):
+        first = tvl_snapshot('sepolia')
+        self.assertIs(tvl_snapshot('sepolia'), first)
+        self.assertEqual(self.node.calls.count('eth_call'), 2)
+
+        self.node.block_number = 501
+        self.assertEqual(tvl_snapshot('sepolia').block_number, 501)
+        self.assertEqual(self.node.calls.count('eth_call'), 4)
+        SmartContract.objects.filter(pk=self.contracts[4].pk).update(status='paused')
+        self.assertEqual(len(tvl_snapshot('sepolia').contracts), 4)
+
+    def test_endpoints(self):
+        response = self.client.get('/api/tvl/sepolia/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['contracts'], 5)
+        self.assertEqual(response.data['by_token']['USDC'], Decimal('162.50'))
+        self.assertEqual(self.client.get('/api/tvl/ropsten/').status_code, 404)
+
+        response = self.client.get('/api/tvl/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['contracts']), 5)
+        self.assertEqual(response.data['contracts'][0]['balance'], Decimal('100.00'))
+        self.assertEqual(response.data['contracts'][0]['ledger_balance'], Decimal('150.00'))
+
+        other = User.objects.create_user('other', 'other@example.com', 'test123')
+        self.client.force_authenticate(other)
+        self.assertEqual(self.client.get('/api/tvl/').data, {'by_token': {}, 'contracts': []})
+
+        self.node.stop()
+        clear_tvl_cache()
+        reset_clients()
+        self.client.force_authenticate(self.user)
+        with override_settings(BLOCKCHAIN_RPC_RETRIES=0):
+            self.assertEqual(self.client.get('/api/tvl/sepolia/').status_code, 503)
+
+    def test_networks_without_an_rpc_url(self):
+        self.assertEqual(self.client.get('/api/tvl/mainnet/').status_code, 404)
+        SmartContract.objects.create(
+            user=self.user, child=self.emma, contract_type='savings', contract_address=f'0x{99:040x}',
+            network='mainnet', status='deployed',
+        )
+        response = self.client.get('/api/tvl/')
+        self.assertEqual(response.status_code, 200)
+        row = next(row for row in response.data['contracts'] if row['network'] == 'mainnet')
+        self.assertEqual((row['balance'], row['block_number']), (None, None))
+        self.assertEqual(response.data['by_token']['USDC'], Decimal('162.50'))
+
+    def test_reconciliation_report(self):
+        self.node.reverting.add('0x' + '0' * 39 + '5')
+        snapshot, discrepancies = reconcile('sepolia')
+        self.assertEqual(snapshot.failed, [self.contracts[4].pk])
+        # Leo's second contract could not be read. Emma's 150 USDC match her ledger balance, which no
+        # transaction puts in another token, so her 0.50 ETH on chain has no ledger counterpart
+        self.assertEqual([(entry.child, entry.token, entry.on_chain, entry.ledger) for entry in discrepancies],
+                         [('Leo', 'USDC', None, Decimal('20.00')), ('Emma', 'ETH', Decimal('0.50'), Decimal('0'))])
+        self.assertEqual(discrepancies[1].difference, Decimal('0.50'))
+        self.assertEqual(reconcile('sepolia', tolerance=Decimal('1'))[1][1:], [])
+
+        # Once the ledger records the ETH deposit, both tokens balance
+        Transaction.objects.create(user=self.user, child=self.emma, transaction_type='investment',
+                                   amount=Decimal('0.50'), token='ETH', status='completed')
+        self.assertEqual([entry.child for entry in reconcile('sepolia')[1]], ['Leo'])
@@ -0,0 +1,246 @@
+import logging
+import threading
+from dataclasses import dataclass, field
+from decimal import Decimal
+
+from django.conf import settings
+from eth_abi import decode
+
+from .abi import encode_call
+from .indexer import token_amount
+from .models import SmartContract
+from .rpc import RPCError, get_client
+
+
+logger = logging.getLogger(__name__)
+
+AGGREGATE3_SIGNATURE = 'aggregate3((address,bool,bytes)[])'
+
+_snapshots = {}  # network -> latest TVLSnapshot
+_snapshots_lock = threading.Lock()
+
+
+@dataclass
+class TVLSnapshot:
+    """Token balances of a network's deployed contracts, all read at `block_number`"""
+    network: str
+    block_number: int
+    contracts: dict  # contract pk -> (address, token)
+    balances: dict = field(default_factory=dict)  # contract pk -> two-decimal amount in the contract's token
+    failed: list = field(default_factory=list)  # contract pks whose balance could not be read
+    requests: int = 0
+
+    def by_token(self):
+        totals = {}
+        for pk, amount in self.balances.items():
+            token = self.contracts[pk][1]
+            totals[token] = totals.get(token, Decimal('0')) + amount
+        return totals
+
+
+def balance_call(network, address, token):
+    """
+    (target, call data) of a Multicall3 sub-call returning the token balance
+    of `address`: getEthBalance on Multicall3 itself for ETH, balanceOf on
+    the token contract otherwise. None when the token has no known address.
+    """
+    if token == 'ETH':
+        return settings.BLOCKCHAIN_MULTICALL_ADDRESS, encode_call('getEthBalance(address)', [address])
+    token_address = settings.BLOCKCHAIN_TOKEN_ADDRESSES.get(network, {}).get(token)
+    if token_address is None:
+        return None
+    return token_address, encode_call('balanceOf(address)', [address])
+
+
+def read_balances(network, contracts, client, block_number):
+    """
+    Read the balances of `contracts` (pk -> (address, token)) at
+    `block_number` through Multicall3 aggregate3: one eth_call per
+    BLOCKCHAIN_MULTICALL_CHUNK contracts, every chunk sent in the same
+    JSON-RPC batch and pinned to the same block.
+    """
+    snapshot = TVLSnapshot(network=network, block_number=block_number, contracts=contracts)
+    calls = []
+    for pk, (address, token) in contracts.items():
+        call = balance_call(network, address, token)
+        if call is None:
+            logger.warning('No %s token address configured for %s; skipping contract %s', token, network, address)
+            snapshot.failed.append(pk)
+        else:
+            calls.append((pk, token, call))
+    if not calls:
+        return snapshot
+
+    size = settings.BLOCKCHAIN_MULTICALL_CHUNK
+    chunks = [calls[start:start + size] for start in range(0, len(calls), size)]
+    replies = client.batch([
+        ('eth_call', [{
+            'to': settings.BLOCKCHAIN_MULTICALL_ADDRESS,
+            'data': encode_call(AGGREGATE3_SIGNATURE, [[(target, True, bytes.fromhex(data[2:]))
+                                                         for _, _, (target, data) in chunk]]),
+        }, hex(block_number)])
+        for chunk in chunks
+    ], raise_errors=False)
+    snapshot.requests += 1
+
+    for chunk, reply in zip(chunks, replies):
+        if isinstance(reply, RPCError):
+            logger.warning('Multicall of %d balances on %s failed: %s', len(chunk), network, reply)
+            snapshot.failed.extend(pk for pk, _, _ in chunk)
+            continue
+        results = decode(['(bool,bytes)[]'], bytes.fromhex(reply[2:]))[0]
+        for (pk, token, _), (success, data) in zip(chunk, results):
+            if success and len(data) == 32:
+                snapshot.balances[pk] = token_amount(int.from_bytes(data, 'big'), token)
+            else:
+                snapshot.failed.append(pk)
+    return snapshot
+
+
+def tvl_snapshot(network, client=None):
+    """
+    Balances of every deployed contract on `network` at the chain head,
+    cached in process until a new block arrives or the set of deployed
+    contracts changes. Costs one query and one eth_blockNumber when cached.
+    """
+    client = client or get_client(network)
+    contracts = {
+        pk: (address, token) for pk, address, token in SmartContract.objects.filter(
+            network=network, status='deployed',
+        ).values_list('pk', 'contract_address', 'token')
+    }
+    head = client.block_number()
+    cached = _snapshots.get(network)
+    if cached is not None and cached.block_number == head and cached.contracts == contracts:
+        return cached
+    snapshot = read_balances(network, contracts, client, head)
+    snapshot.requests += 1
+    with _snapshots_lock:
+        _snapshots[network] = snapshot
+    return snapshot
+
+
+def clear_tvl_cache():
+    with _snapshots_lock:
+        _snapshots.clear()
+
+
+def network_tvl(network, client=None):
+    snapshot = tvl_snapshot(network, client)
+    return {
+        'network': network,
+        'block_number': snapshot.block_number,
+        'contracts': len(snapshot.contracts),
+        'unread_contracts': len(snapshot.failed),
+        'by_token': snapshot.by_token(),
+    }
+
+
+def user_tvl(user):
+    """
+    TVL of `user`'s deployed contracts, per contract and per token, one
+    snapshot per network. Contracts on a network without a configured RPC
+    URL are listed without a balance or block.
+    """
+    contracts = list(
+        SmartContract.objects.filter(user=user, status='deployed').select_related('child')
+        .only('contract_address', 'network', 'token', 'child__name', 'child__current_balance')
+        .order_by('network', 'pk')
+    )
+    snapshots = {
+        network: tvl_snapshot(network)
+        for network in {contract.network for contract in contracts} if network in settings.BLOCKCHAIN_RPC_URLS
+    }
+    rows = []
+    totals = {}
+    for contract in contracts:
+        snapshot = snapshots.get(contract.network)
+        balance = None if snapshot is None else snapshot.balances.get(contract.pk)
+        if balance is not None:
+            totals[contract.token] = totals.get(contract.token, Decimal('0')) + balance
+        rows.append({
+            'id': contract.pk,
+            'contract_address': contract.contract_address,
+            'network': contract.network,
+            'block_number': None if snapshot is None else snapshot.block_number,
+            'token': contract.token,
+            'child': contract.child.name,
+            'balance': balance,
+            'ledger_balance': contract.child.current_balance,
+        })
+    return {'by_token': totals, 'contracts': rows}
+
+
+@dataclass
+class Discrepancy:
+    child_id: int
+    child: str
+    token: str
+    contracts: list
+    on_chain: Decimal
+    ledger: Decimal
+
+    @property
+    def difference(self):
+        return None if self.on_chain is None else self.on_chain - self.ledger
+
+
+def ledger_holdings(children):
+    """
+    {(child pk, token): quantity} the ledger holds for `children` (pk ->
+    current_balance), one query. As for dashboard valuations, the part of a
+    balance its completed transactions do not explain counts as LEDGER_TOKEN.
+    """
+    from accounts.stats import LEDGER_TOKEN
+    from investments.models import Transaction
+    from investments.reports import balance_effect
+
+    holdings = {}
+    explained = {}
+    for child_id, token, quantity in Transaction.objects.filter(
+        child__in=children, status='completed',
+    ).order_by().values('child', 'token').annotate(quantity=balance_effect()).values_list('child', 'token', 'quantity'):
+        holdings[child_id, token] = quantity
+        explained[child_id] = explained.get(child_id, Decimal('0')) + quantity
+    for child_id, balance in children.items():
+        key = (child_id, LEDGER_TOKEN)
+        holdings[key] = holdings.get(key, Decimal('0')) + balance - explained.get(child_id, Decimal('0'))
+    return holdings
+
+
+def reconcile(network, client=None, tolerance=Decimal('0')):
+    """
+    Compare what each child's deployed contracts on `network` hold on chain
+    with what the ledger holds for the child, token by token: amounts in
+    different tokens are never added together. Returns the snapshot used and
+    the (child, token) pairs that differ by more than `tolerance` in that
+    token, largest difference first, after any pair with a contract whose
+    balance could not be read (on_chain None).
+    """
+    snapshot = tvl_snapshot(network, client)
+    entries = {}
+    balances = {}
+    for contract in SmartContract.objects.filter(pk__in=snapshot.contracts).select_related('child').only(
+        'contract_address', 'token', 'child__name', 'child__current_balance',
+    ):
+        balances[contract.child_id] = contract.child.current_balance
+        entry = entries.setdefault((contract.child_id, contract.token), Discrepancy(
+            child_id=contract.child_id, child=contract.child.name, token=contract.token, contracts=[],
+            on_chain=Decimal('0'), ledger=Decimal('0'),
+        ))
+        entry.contracts.append(contract.contract_address)
+        balance = snapshot.balances.get(contract.pk)
+        entry.on_chain = None if balance is None or entry.on_chain is None else entry.on_chain + balance
+
+    if balances:
+        holdings = ledger_holdings(balances)
+        for key, entry in entries.items():
+            entry.ledger = holdings.get(key, Decimal('0'))
+
+    unread = [entry for entry in entries.values() if entry.on_chain is None]
+    differing = [
+        entry for entry in entries.values()
+        if entry.difference is not None and abs(entry.difference) > tolerance
+    ]
+    differing.sort(key=lambda entry: abs(entry.difference), reverse=True)
+    return snapshot, unread + differing
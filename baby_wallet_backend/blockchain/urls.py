@@ -1,5 +1,8 @@
 from django.urls import path
+from .views import GasPriceStatsView, NetworkTVLView, UserTVLView
 
 urlpatterns = [
-    # API endpointleri buraya eklenecek
-] 
+    path('gas-stats/<str:network>/', GasPriceStatsView.as_view(), name='gas-stats'),
+    path('tvl/', UserTVLView.as_view(), name='user-tvl'),
+    path('tvl/<str:network>/', NetworkTVLView.as_view(), name='network-tvl'),
+]
@@ -1,3 +1,57 @@
-from django.shortcuts import render
+from django.conf import settings
+from rest_framework.exceptions import APIException, NotFound
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
-# Create your views here.
+from .gas_stats import gas_price_stats
+from .models import SmartContract
+from .rpc import RPCError, RPCTransportError
+from .tvl import network_tvl, user_tvl
+
+
+NETWORKS = {network for network, _ in SmartContract.NETWORK_CHOICES}
+
+
+class NodeUnavailable(APIException):
+    status_code = 503
+    default_detail = 'The blockchain node could not be reached, try again later.'
+    default_code = 'node_unavailable'
+
+
+class GasPriceStatsView(APIView):
+    """
+    Suggested gas prices for a network: p10/p50/p90 over recent samples,
+    EMA and a short-term forecast, in gwei. Recomputed only when a new
+    GasTracker sample arrives.
+    """
+    def get(self, request, network, *args, **kwargs):
+        if network not in NETWORKS:
+            raise NotFound(f'Unknown network "{network}"')
+        stats = gas_price_stats(network)
+        if stats is None:
+            raise NotFound(f'No gas price samples for {network}')
+        return Response(stats)
+
+
+class NetworkTVLView(APIView):
+    """
+    Total value locked in a network's deployed contracts, per token, read
+    on chain in one Multicall3 batch and cached until the next block. Only
+    networks with an RPC URL in BLOCKCHAIN_RPC_URLS can be read.
+    """
+    def get(self, request, network, *args, **kwargs):
+        if network not in settings.BLOCKCHAIN_RPC_URLS:
+            raise NotFound(f'Unknown network "{network}"')
+        try:
+            return Response(network_tvl(network))
+        except (RPCError, RPCTransportError) as exc:
+            raise NodeUnavailable() from exc
+
+
+class UserTVLView(APIView):
+    """On-chain balances of the user's deployed contracts next to their children's ledger balances"""
+    def get(self, request, *args, **kwargs):
+        try:
+            return Response(user_tvl(request.user))
+        except (RPCError, RPCTransportError) as exc:
+            raise NodeUnavailable() from exc
@@ -1,9 +1,13 @@
 from django.contrib import admin
-from .models import Investment, Transaction, InvestmentGoal, TaxReport
+
+from baby_wallet_backend.replicas import ReplicaChangeListMixin
+from .models import (
+    CostBasisPosition, Investment, InvestmentGoal, RealizedGain, TaxReport, Transaction, TransactionImport,
+)
 
 
 @admin.register(Investment)
-class InvestmentAdmin(admin.ModelAdmin):
+class InvestmentAdmin(ReplicaChangeListMixin, admin.ModelAdmin):
     list_display = ('user', 'child', 'investment_type', 'amount', 'frequency', 'status', 'total_contributed', 'created_at')
     list_filter = ('investment_type', 'frequency', 'status', 'created_at')
     search_fields = ('user__email', 'child__name', 'smart_contract_address')
@@ -28,7 +32,7 @@ class InvestmentAdmin(admin.ModelAdmin):
 
 
 @admin.register(Transaction)
-class TransactionAdmin(admin.ModelAdmin):
+class TransactionAdmin(ReplicaChangeListMixin, admin.ModelAdmin):
     list_display = ('user', 'child', 'transaction_type', 'amount', 'token', 'status', 'created_at')
     list_filter = ('transaction_type', 'token', 'status', 'created_at')
     search_fields = ('user__email', 'child__name', 'transaction_hash')
@@ -36,7 +40,7 @@ class TransactionAdmin(admin.ModelAdmin):
     
     fieldsets = (
         ('Basic Information', {
-            'fields': ('user', 'child', 'investment', 'transaction_type', 'amount', 'token')
+            'fields': ('user', 'child', 'investment', 'transaction_type', 'amount', 'token', 'unit_price')
         }),
         ('Status', {
             'fields': ('status', 'description')
@@ -52,6 +56,15 @@ class TransactionAdmin(admin.ModelAdmin):
     readonly_fields = ('created_at', 'updated_at')
 
 
+@admin.register(TransactionImport)
+class TransactionImportAdmin(admin.ModelAdmin):
+    list_display = ('source', 'rows_processed', 'completed_at', 'updated_at')
+    search_fields = ('source',)
+    ordering = ('-created_at',)
+
+    readonly_fields = ('rows_processed', 'completed_at', 'created_at', 'updated_at')
+
+
 @admin.register(InvestmentGoal)
 class InvestmentGoalAdmin(admin.ModelAdmin):
     list_display = ('child', 'target_amount', 'target_date', 'monthly_contribution', 'progress_percentage', 'months_remaining', 'is_active')
@@ -83,8 +96,37 @@ class TaxReportAdmin(admin.ModelAdmin):
             'fields': ('user', 'report_type', 'year')
         }),
         ('File', {
-            'fields': ('file_path', 'is_downloaded')
+            'fields': ('file_path', 'is_downloaded', 'source_updated_at', 'source_transactions')
         }),
     )
     
-    readonly_fields = ('generated_at',)
+    readonly_fields = ('generated_at', 'source_updated_at', 'source_transactions')
+
+
+@admin.register(CostBasisPosition)
+class CostBasisPositionAdmin(admin.ModelAdmin):
+    list_display = ('child', 'token', 'method', 'quantity', 'cost', 'realized_gain', 'transactions', 'synced_at')
+    list_filter = ('method', 'token')
+    search_fields = ('child__name', 'child__user__email')
+    list_select_related = ('child',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False  # Derived from transactions by cost_basis.sync_positions
+
+
+@admin.register(RealizedGain)
+class RealizedGainAdmin(admin.ModelAdmin):
+    list_display = ('position', 'realized_at', 'quantity', 'proceeds', 'cost_basis', 'gain')
+    list_filter = ('position__method', 'position__token', 'realized_at')
+    search_fields = ('position__child__name', 'transaction__transaction_hash')
+    list_select_related = ('position__child',)
+    raw_id_fields = ('position', 'transaction')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
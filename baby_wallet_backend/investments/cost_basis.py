@@ -0,0 +1,514 @@
+from abc import ABC, abstractmethod
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import numpy as np
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import BigIntegerField, Case, F, Min, Q, Value, When
+from django.db.models.functions import Cast, Coalesce, Round
+from django.utils import timezone
+
+from .models import CostBasisLot, CostBasisPosition, RealizedGain, Transaction
+from .reports import CREDIT_TYPES, DEBIT_TYPES
+
+
+# Quantities and prices are handled as integer cents and amounts as integer
+# 1/10000ths, so quantity x price is exact and the incremental, replayed and
+# vectorized paths agree to the last digit.
+STABLECOINS = {'USDC', 'USDT'}
+EVENT_COLUMNS = ['id', 'created_at', 'transaction_type', 'amount', 'unit_price']
+LOT_FETCH = 500  # Stored FIFO lots loaded per query while disposals reach them
+INT64_HEADROOM = 2 ** 62
+
+
+def cents(value):
+    return int((value * 100).to_integral_value())
+
+
+def price_cents(token, unit_price):
+    """Price of one token in cents; unpriced stablecoins count as 1, other unpriced tokens as 0"""
+    if unit_price is None:
+        return 100 if token in STABLECOINS else 0
+    return cents(unit_price)
+
+
+def quantity_value(quantity):
+    return Decimal(quantity).scaleb(-2)
+
+
+def amount_value(amount):
+    return Decimal(amount).scaleb(-4)
+
+
+def amount_units(value):
+    return int((value * 10000).to_integral_value())
+
+
+def divide_half_even(numerator, denominator):
+    quotient, remainder = divmod(numerator, denominator)
+    if 2 * remainder > denominator or (2 * remainder == denominator and quotient % 2):
+        quotient += 1
+    return quotient
+
+
+@dataclass
+class Lot:
+    transaction_id: int
+    acquired_at: datetime
+    quantity: int
+    unit_cost: int
+    pk: int = None
+
+
+@dataclass
+class Disposal:
+    transaction_id: int
+    realized_at: datetime
+    quantity: int
+    proceeds: int
+    cost_basis: int
+
+
+class Book(ABC):
+    """
+    Running state of a position: quantity held (cents), its cost and the
+    gains realized so far (1/10000ths). Subclasses decide which cost a
+    disposal takes. A disposal larger than the holding is covered up to the
+    holding; the rest has no cost basis.
+    """
+
+    def __init__(self, quantity=0, cost=0, realized=0):
+        self.quantity = quantity
+        self.cost = cost
+        self.realized = realized
+        self.disposals = []
+
+    def apply(self, transaction_id, at, kind, quantity, price):
+        if kind in CREDIT_TYPES:
+            self.acquire(Lot(transaction_id, at, quantity, price))
+            self.quantity += quantity
+            self.cost += quantity * price
+        elif kind in DEBIT_TYPES:
+            covered = min(quantity, self.quantity)
+            basis = self.take(covered) if covered else 0
+            self.quantity -= covered
+            self.cost -= basis
+            self.realized += quantity * price - basis
+            self.disposals.append(Disposal(transaction_id, at, quantity, quantity * price, basis))
+
+    def acquire(self, lot):
+        pass
+
+    @abstractmethod
+    def take(self, quantity):
+        """Remove `quantity` from the holding and return its cost"""
+
+
+class AverageCostBook(Book):
+    def take(self, quantity):
+        if quantity == self.quantity:
+            return self.cost
+        return divide_half_even(self.cost * quantity, self.quantity)
+
+
+class FIFOBook(Book):
+    """
+    Open lots oldest first. Lots stored by earlier syncs are only loaded
+    when disposals reach them, LOT_FETCH at a time, so applying a
+    transaction never reads more lots than it consumes.
+    """
+
+    def __init__(self, quantity=0, cost=0, realized=0, stored=None):
+        super().__init__(quantity, cost, realized)
+        self.stored = stored  # Queryset of the position's stored lots, None when there are none
+        self.loaded = deque()  # Stored lots read so far and not yet used up
+        self.last_loaded = 0
+        self.new = deque()  # Lots acquired since the stored ones
+        self.consumed = []  # pks of stored lots used up
+        self.partial = None  # Stored lot partly used up
+
+    def acquire(self, lot):
+        self.new.append(lot)
+
+    def head(self):
+        if not self.loaded and self.stored is not None:
+            batch = list(self.stored.filter(pk__gt=self.last_loaded).order_by('pk')[:LOT_FETCH])
+            if len(batch) < LOT_FETCH:
+                self.stored = None
+            if batch:
+                self.last_loaded = batch[-1].pk
+            self.loaded.extend(
+                Lot(lot.transaction_id, lot.acquired_at, cents(lot.quantity), cents(lot.unit_cost), lot.pk)
+                for lot in batch
+            )
+        return self.loaded or self.new
+
+    def take(self, quantity):
+        basis = 0
+        while quantity:
+            lots = self.head()
+            lot = lots[0]
+            used = min(quantity, lot.quantity)
+            basis += used * lot.unit_cost
+            lot.quantity -= used
+            quantity -= used
+            if not lot.quantity:
+                lots.popleft()
+                if lot.pk is not None:
+                    self.consumed.append(lot.pk)
+        self.partial = self.loaded[0] if self.loaded and self.loaded[0].quantity else None
+        return basis
+
+    def open_lots(self):
+        """Lots acquired since the stored ones and still held, to be saved"""
+        return [lot for lot in self.new if lot.quantity]
+
+
+BOOKS = {'fifo': FIFOBook, 'average': AverageCostBook}
+
+
+def completed_events(position):
+    return (
+        Transaction.objects.filter(child_id=position.child_id, token=position.token, status='completed')
+        .order_by('created_at', 'id').values_list(*EVENT_COLUMNS)
+    )
+
+
+def apply_events(book, position, events):
+    """Apply completed transaction rows, in (created_at, id) order, moving the position's high-water mark"""
+    for transaction_id, created_at, kind, amount, unit_price in events:
+        book.apply(transaction_id, created_at, kind, cents(amount), price_cents(position.token, unit_price))
+        position.last_created_at, position.last_transaction_id = created_at, transaction_id
+        position.transactions += 1
+
+
+def save_book(position, book, synced_at):
+    """Write `book` back to the position, its lots and realized gains"""
+    position.quantity = quantity_value(book.quantity)
+    position.cost = amount_value(book.cost)
+    position.realized_gain = amount_value(book.realized)
+    position.synced_at = synced_at
+    position.save()
+    if isinstance(book, FIFOBook):
+        if book.consumed:
+            CostBasisLot.objects.filter(pk__in=book.consumed).delete()
+        if book.partial is not None:
+            CostBasisLot.objects.filter(pk=book.partial.pk).update(quantity=quantity_value(book.partial.quantity))
+        CostBasisLot.objects.bulk_create([
+            CostBasisLot(position=position, transaction_id=lot.transaction_id, acquired_at=lot.acquired_at,
+                         quantity=quantity_value(lot.quantity), unit_cost=quantity_value(lot.unit_cost))
+            for lot in book.open_lots()
+        ], batch_size=settings.COST_BASIS_CHUNK_SIZE)
+    RealizedGain.objects.bulk_create([
+        RealizedGain(position=position, transaction_id=disposal.transaction_id, realized_at=disposal.realized_at,
+                     quantity=quantity_value(disposal.quantity), proceeds=amount_value(disposal.proceeds),
+                     cost_basis=amount_value(disposal.cost_basis),
+                     gain=amount_value(disposal.proceeds - disposal.cost_basis))
+        for disposal in book.disposals
+    ], batch_size=settings.COST_BASIS_CHUNK_SIZE)
+
+
+def rebuild_position(position, synced_at=None):
+    """Replay the position's whole history from scratch"""
+    synced_at = synced_at or timezone.now()
+    with transaction.atomic():
+        position.lots.all().delete()
+        position.realized_gains.all().delete()
+        position.last_created_at, position.last_transaction_id, position.transactions = None, 0, 0
+        book = BOOKS[position.method]()
+        apply_events(book, position, completed_events(position).iterator(chunk_size=settings.COST_BASIS_CHUNK_SIZE))
+        save_book(position, book, synced_at)
+    return position
+
+
+def sync_position(position):
+    """
+    Bring `position` up to date with its transactions. Only transactions
+    updated since the previous sync started, less COST_BASIS_SYNC_MARGIN,
+    are read; when all of them come after the high-water mark they are
+    applied on top of the stored state, at a cost proportional to the new
+    transactions and the lots they consume. A changed transaction at or
+    before the mark (an edit, a late status change, a backdated import), or
+    a position marked stale by a deletion, replays the whole history
+    instead. Returns True when it did.
+
+    The margin covers writes that committed after the previous sync read:
+    their updated_at is earlier than its start. Rows it re-reads at or
+    before the mark were either applied then or committed too late, which
+    one count of the completed transactions up to the mark tells apart.
+    """
+    started = timezone.now()
+    with transaction.atomic():
+        position = CostBasisPosition.objects.select_for_update().get(pk=position.pk)
+        if position.synced_at is None:
+            rebuild_position(position, started)
+            return True
+        changed = list(
+            Transaction.objects.filter(
+                child_id=position.child_id, token=position.token,
+                updated_at__gte=position.synced_at - sync_margin(),
+            ).order_by('created_at', 'id').values_list(*EVENT_COLUMNS, 'status', 'updated_at')
+        )
+        mark = (position.last_created_at, position.last_transaction_id)
+        if position.last_created_at is None:
+            behind = []
+        else:
+            behind = [row for row in changed if (row[1], row[0]) <= mark]
+        late = behind and applied_count(position) != position.transactions
+        if late or any(row[-1] >= position.synced_at for row in behind):
+            rebuild_position(position, started)
+            return True
+        if position.method == 'fifo':
+            book = FIFOBook(cents(position.quantity), amount_units(position.cost),
+                            amount_units(position.realized_gain), stored=position.lots.all())
+        else:
+            book = AverageCostBook(cents(position.quantity), amount_units(position.cost),
+                                   amount_units(position.realized_gain))
+        behind = {row[0] for row in behind}
+        apply_events(book, position, [row[:-2] for row in changed if row[-2] == 'completed' and row[0] not in behind])
+        save_book(position, book, started)
+    return False
+
+
+def sync_margin():
+    return timedelta(seconds=settings.COST_BASIS_SYNC_MARGIN)
+
+
+def applied_count(position):
+    """Completed transactions at or before the position's high-water mark"""
+    at = position.last_created_at
+    return completed_events(position).filter(
+        Q(created_at__lt=at) | Q(created_at=at, id__lte=position.last_transaction_id),
+    ).count()
+
+
+def sync_positions(method='fifo', child_ids=None):
+    """
+    Sync the `method` positions of every child, or of `child_ids`, creating
+    positions for new (child, token) pairs. Only positions with transactions
+    updated since the oldest sync, less COST_BASIS_SYNC_MARGIN, or marked
+    stale, are visited. Returns (positions synced, of which rebuilt).
+    """
+    positions = CostBasisPosition.objects.filter(method=method)
+    transactions = Transaction.objects.all()
+    if child_ids is not None:
+        positions = positions.filter(child_id__in=child_ids)
+        transactions = transactions.filter(child_id__in=child_ids)
+    since = positions.aggregate(since=Min('synced_at'))['since']
+    if since is not None:
+        transactions = transactions.filter(updated_at__gte=since - sync_margin())
+
+    pairs = set(transactions.order_by().values_list('child_id', 'token').distinct())
+    existing = set(positions.order_by().values_list('child_id', 'token'))
+    completed = set(transactions.filter(status='completed').order_by().values_list('child_id', 'token').distinct())
+    CostBasisPosition.objects.bulk_create([
+        CostBasisPosition(child_id=child_id, token=token, method=method)
+        for child_id, token in completed - existing
+    ])
+
+    synced = rebuilt = 0
+    stale_or_changed = Q(synced_at__isnull=True) | Q(child_id__in={child for child, _ in pairs})
+    for position in positions.filter(stale_or_changed).order_by('pk'):
+        if position.synced_at is None or (position.child_id, position.token) in pairs:
+            rebuilt += sync_position(position)
+            synced += 1
+    return synced, rebuilt
+
+
+def group_cumsum(values, starts, lengths):
+    """Cumulative sum of `values` restarting at each group start"""
+    total = np.cumsum(values)
+    return total - np.repeat((total - values)[starts], lengths)
+
+
+def fifo_costs(group, acquire, quantity, price):
+    """
+    FIFO over many positions at once, for event arrays sorted by position
+    then time: `group` numbers the positions, `acquire` marks acquisitions,
+    `quantity` and `price` are in cents. Returns (cost basis taken by each
+    event, quantity of each event still held at the end), both zero where
+    they do not apply.
+
+    Acquisitions and disposals are laid end to end as cumulative quantities;
+    a disposal takes the slice of the acquisition axis between the
+    cumulative quantities disposed of before and after it, so its basis is
+    the difference of the cumulative cost curve at the two ends. Disposals
+    beyond the holding are capped through a per-position running minimum of
+    holding minus disposals.
+    """
+    n = len(quantity)
+    starts = np.flatnonzero(np.r_[True, group[1:] != group[:-1]])
+    lengths = np.diff(np.r_[starts, n])
+    position = np.repeat(np.arange(len(starts)), lengths)
+    acquired = group_cumsum(np.where(acquire, quantity, 0), starts, lengths)
+    disposed = group_cumsum(np.where(acquire, 0, quantity), starts, lengths)
+
+    span = int(acquired.max(initial=0) + disposed.max(initial=0)) + 1
+    offset = position * span  # Keeps every position's running minimum out of the others'
+    shortfall = np.minimum.accumulate(np.minimum(acquired - disposed, 0) - offset) + offset
+    taken = disposed + shortfall
+
+    lots = acquire & (quantity > 0)
+    lot_end = acquired[lots]
+    lot_price = price[lots]
+    lot_cost_end = group_cumsum(np.where(acquire, quantity * price, 0), starts, lengths)[lots]
+    lot_key = lot_end + offset[lots]
+    index = np.minimum(np.searchsorted(lot_key, taken + offset), max(len(lot_key) - 1, 0))
+    if len(lot_key):
+        curve = np.where(taken > 0, lot_cost_end[index] - (lot_end[index] - taken) * lot_price[index], 0)
+    else:
+        curve = np.zeros(n, dtype=np.int64)
+    before = np.r_[0, curve[:-1]]
+    before[starts] = 0
+    basis = curve - before
+
+    final_taken = np.repeat(taken[starts + lengths - 1], lengths)
+    held = np.where(acquire, np.clip(acquired - final_taken, 0, quantity), 0)
+    return basis, held
+
+
+def load_events(child_ids=None):
+    """
+    Every completed transaction, ordered by position then time, as parallel
+    lists, with quantities and prices already turned into cents by the
+    database
+    """
+    rows = Transaction.objects.filter(status='completed').order_by('child_id', 'token', 'created_at', 'id')
+    if child_ids is not None:
+        rows = rows.filter(child_id__in=child_ids)
+    in_cents = lambda name: Cast(Round(F(name) * 100), BigIntegerField())
+    rows = rows.values_list(
+        'child_id', 'token', 'id', 'created_at', 'transaction_type', in_cents('amount'),
+        Coalesce(in_cents('unit_price'), Case(When(token__in=STABLECOINS, then=Value(100)), default=Value(0))),
+    )
+    columns = [[] for _ in range(7)]
+    for row in rows.iterator(chunk_size=settings.COST_BASIS_CHUNK_SIZE):
+        for column, value in zip(columns, row):
+            column.append(value)
+    return columns
+
+
+def insert_rows(model, field_names, rows):
+    """
+    INSERT `rows` of values for `field_names` with executemany. bulk_create()
+    builds an instance per row and prepares every value through its field,
+    which for hundreds of thousands of lots and gains costs more than
+    computing them. Datetimes must already be adapted for the database.
+    """
+    fields = [model._meta.get_field(name) for name in field_names]
+    quote = connection.ops.quote_name
+    sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+        quote(model._meta.db_table), ', '.join(quote(field.column) for field in fields),
+        ', '.join(['%s'] * len(fields)),
+    )
+    size = settings.COST_BASIS_CHUNK_SIZE
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), size):
+            cursor.executemany(sql, rows[start:start + size])
+
+
+LOT_FIELDS = ['position', 'transaction', 'acquired_at', 'quantity', 'unit_cost']
+GAIN_FIELDS = ['position', 'transaction', 'realized_at', 'quantity', 'proceeds', 'cost_basis', 'gain']
+
+
+@transaction.atomic
+def rebuild_positions(method='fifo', child_ids=None):
+    """
+    Rebuild the `method` positions of every child, or of `child_ids`, from
+    all their completed transactions: one streamed read, then FIFO for all
+    positions at once with numpy (fifo_costs), and bulk inserts. Average
+    cost, whose unit cost depends on every earlier step, and histories too
+    large for int64 amounts go through the same books as sync_position.
+    Returns the number of positions written.
+    """
+    existing = CostBasisPosition.objects.filter(method=method)
+    if child_ids is not None:
+        existing = existing.filter(child_id__in=child_ids)
+    existing.delete()
+    synced_at = timezone.now()
+
+    child, token, ids, created_at, kind, quantity, price = load_events(child_ids)
+    n = len(ids)
+    if not n:
+        return 0
+    keys = list(zip(child, token))
+    starts = [0] + [i for i in range(1, n) if keys[i] != keys[i - 1]]
+    ends = starts[1:] + [n]
+    positions = CostBasisPosition.objects.bulk_create([
+        CostBasisPosition(child_id=child[start], token=token[start], method=method, synced_at=synced_at,
+                          last_created_at=created_at[end - 1], last_transaction_id=ids[end - 1],
+                          transactions=end - start)
+        for start, end in zip(starts, ends)
+    ], batch_size=settings.COST_BASIS_CHUNK_SIZE)
+    created_at = [connection.ops.adapt_datetimefield_value(value) for value in created_at]
+
+    quantities = np.array(quantity, dtype=np.int64)
+    prices = np.array(price, dtype=np.int64)
+    # Cumulative costs and the per-position offsets in fifo_costs must stay within int64
+    bound = float(quantities.sum()) * max(float(prices.max()), 2 * len(starts))
+    if method == 'fifo' and bound < INT64_HEADROOM:
+        lots, gains = rebuild_fifo_arrays(positions, starts, ids, created_at, kind, quantities, prices)
+    else:
+        lots, gains = rebuild_with_books(positions, starts, ends, ids, created_at, kind, quantity, price)
+
+    CostBasisPosition.objects.bulk_update(
+        positions, ['quantity', 'cost', 'realized_gain'], batch_size=settings.COST_BASIS_CHUNK_SIZE,
+    )
+    insert_rows(CostBasisLot, LOT_FIELDS, lots)
+    insert_rows(RealizedGain, GAIN_FIELDS, gains)
+    return len(positions)
+
+
+def rebuild_fifo_arrays(positions, starts, ids, created_at, kind, quantities, prices):
+    lengths = np.diff(np.r_[starts, len(ids)])
+    group = np.repeat(np.arange(len(starts)), lengths)
+    acquire = np.isin(np.array(kind), CREDIT_TYPES)
+    dispose = np.isin(np.array(kind), DEBIT_TYPES)
+    basis, held = fifo_costs(group, acquire, quantities, prices)
+    proceeds = np.where(dispose, quantities * prices, 0)
+
+    quantity = np.add.reduceat(held, starts)
+    cost = np.add.reduceat(held * prices, starts)
+    realized = np.add.reduceat(np.where(dispose, proceeds - basis, 0), starts)
+    for index, position in enumerate(positions):
+        position.quantity = quantity_value(int(quantity[index]))
+        position.cost = amount_value(int(cost[index]))
+        position.realized_gain = amount_value(int(realized[index]))
+
+    position_ids = [position.pk for position in positions]
+    lots = [
+        (position_ids[group[i]], ids[i], created_at[i], quantity_value(int(held[i])), quantity_value(int(prices[i])))
+        for i in np.flatnonzero(held > 0)
+    ]
+    gains = [
+        (position_ids[group[i]], ids[i], created_at[i], quantity_value(int(quantities[i])),
+         amount_value(int(proceeds[i])), amount_value(int(basis[i])), amount_value(int(proceeds[i] - basis[i])))
+        for i in np.flatnonzero(dispose)
+    ]
+    return lots, gains
+
+
+def rebuild_with_books(positions, starts, ends, ids, created_at, kind, quantity, price):
+    lots, gains = [], []
+    for position, start, end in zip(positions, starts, ends):
+        book = BOOKS[position.method]()
+        for i in range(start, end):
+            book.apply(ids[i], created_at[i], kind[i], quantity[i], price[i])
+        position.quantity = quantity_value(book.quantity)
+        position.cost = amount_value(book.cost)
+        position.realized_gain = amount_value(book.realized)
+        if isinstance(book, FIFOBook):
+            lots += [
+                (position.pk, lot.transaction_id, lot.acquired_at, quantity_value(lot.quantity),
+                 quantity_value(lot.unit_cost))
+                for lot in book.open_lots()
+            ]
+        gains += [
+            (position.pk, d.transaction_id, d.realized_at, quantity_value(d.quantity), amount_value(d.proceeds),
+             amount_value(d.cost_basis), amount_value(d.proceeds - d.cost_basis))
+            for d in book.disposals
+        ]
+    return lots, gains
@@ -0,0 +1,62 @@
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework import filters, serializers
+
+
+def parse_choice(choices):
+    allowed = {value for value, _ in choices}
+
+    def parse(value):
+        if value not in allowed:
+            raise ValueError(f"must be one of {', '.join(sorted(allowed))}")
+        return value
+    return parse
+
+
+def parse_id(value):
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError('must be an integer id')
+
+
+def parse_moment(value, end_of_day=False):
+    """Parse an ISO datetime, or a date meaning the start (or end) of that day"""
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError('must be an ISO 8601 date or datetime')
+        moment = datetime.combine(day + timedelta(days=1) if end_of_day else day, time.min)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def parse_until(value):
+    return parse_moment(value, end_of_day=True)
+
+
+class QueryParamFilterBackend(filters.BaseFilterBackend):
+    """
+    Applies `view.query_filters`, a mapping of query parameter name to
+    (ORM lookup, parser), as database filters. Unknown parameters are ignored;
+    invalid values are rejected with a 400 instead of silently returning
+    everything.
+    """
+    def filter_queryset(self, request, queryset, view):
+        errors = {}
+        lookups = {}
+        for param, (lookup, parse) in getattr(view, 'query_filters', {}).items():
+            value = request.query_params.get(param)
+            if value in (None, ''):
+                continue
+            try:
+                lookups[lookup] = parse(value)
+            except ValueError as exc:
+                errors[param] = str(exc)
+        if errors:
+            raise serializers.ValidationError(errors)
+        return queryset.filter(**lookups)
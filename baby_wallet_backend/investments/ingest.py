@@ -0,0 +1,225 @@
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, Value, When
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from accounts.models import Child
+from accounts.stats import invalidate_dashboard_stats
+from .models import Investment, Transaction
+
+
+TRANSACTION_TYPES = {value for value, _ in Transaction.TRANSACTION_TYPES}
+STATUSES = {value for value, _ in Transaction.STATUS_CHOICES}
+TOKENS = {value for value, _ in Transaction.TOKEN_CHOICES}
+
+# Children updated per UPDATE statement when applying balance deltas
+BALANCE_UPDATE_BATCH = 500
+
+# amount and unit_price are DecimalField(max_digits=15, decimal_places=2)
+MAX_MONEY = Decimal(10) ** 13
+
+
+class IngestError(ValueError):
+    """Raised when a row cannot be imported; `row` is its 0-based position in the chunk"""
+    def __init__(self, row, message):
+        super().__init__(f"Row {row}: {message}")
+        self.row = row
+        self.message = message
+
+
+# Transaction.transaction_hash is CharField(max_length=66) and block_number a BigIntegerField
+MAX_HASH_LENGTH = Transaction._meta.get_field('transaction_hash').max_length
+MAX_BIGINT = 2 ** 63
+
+
+def _optional_int(value):
+    """A whole number from a JSON or CSV value; ValueError for fractions such as 1.9 and for non-numbers"""
+    if value in (None, ''):
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, float, str, Decimal)):
+        raise ValueError(f'{value!r} is not a number')
+    try:
+        number = Decimal(str(value).strip())
+    except InvalidOperation:
+        raise ValueError(f'{value!r} is not a number')
+    if not number.is_finite() or number != number.to_integral_value():
+        raise ValueError(f'{value!r} is not a whole number')
+    return int(number)
+
+
+def _choice(row, name, choices, default=None):
+    """The row's value for `name`, which must be one of `choices`"""
+    value = row.get(name) or default
+    if not isinstance(value, str) or value not in choices:
+        raise ValueError(f'invalid {name} {value!r}')
+    return value
+
+
+def build_transactions(rows, user=None, pending_only=False):
+    """
+    Validate raw row dicts and turn them into unsaved Transaction objects.
+
+    Children (and investments) are resolved with one query each for the whole
+    chunk. When `user` is given, only that user's children may be referenced.
+    With `pending_only`, rows must be pending, so they move no balance.
+    """
+    rows = list(rows)
+    references = []
+    for index, row in enumerate(rows):
+        try:
+            references.append((_optional_int(row['child']), _optional_int(row.get('investment'))))
+        except (KeyError, ValueError):
+            raise IngestError(index, 'child and investment must be integer ids')
+        if references[-1][0] is None:
+            raise IngestError(index, 'child and investment must be integer ids')
+    child_ids = {child_id for child_id, _ in references}
+    investment_ids = {investment_id for _, investment_id in references} - {None}
+
+    children = Child.objects.filter(pk__in=child_ids)
+    if user is not None:
+        children = children.filter(user=user)
+    child_users = dict(children.values_list('pk', 'user_id'))
+    investment_children = dict(
+        Investment.objects.filter(pk__in=investment_ids).values_list('pk', 'child_id')
+    )
+
+    transactions = []
+    for index, (row, (child_id, investment_id)) in enumerate(zip(rows, references)):
+        if child_id not in child_users:
+            raise IngestError(index, f"unknown child {child_id}")
+        if investment_id is not None and investment_children.get(investment_id) != child_id:
+            raise IngestError(index, f"investment {investment_id} does not belong to child {child_id}")
+
+        try:
+            transaction_type = _choice(row, 'transaction_type', TRANSACTION_TYPES)
+            status = _choice(row, 'status', STATUSES, default='pending')
+            token = _choice(row, 'token', TOKENS, default='USDC')
+        except ValueError as exc:
+            raise IngestError(index, str(exc))
+        if pending_only and status != 'pending':
+            raise IngestError(index, 'only pending transactions can be imported here')
+        try:
+            amount = Decimal(str(row['amount']))
+        except (KeyError, InvalidOperation):
+            raise IngestError(index, 'amount must be a decimal number')
+        if not amount.is_finite() or amount < 0:
+            raise IngestError(index, 'amount must be a non-negative number')
+        amount = round(amount, 2)
+        if amount >= MAX_MONEY:
+            raise IngestError(index, f'amount must be less than {MAX_MONEY}')
+
+        unit_price = row.get('unit_price')
+        if unit_price not in (None, ''):
+            try:
+                unit_price = Decimal(str(unit_price))
+            except InvalidOperation:
+                raise IngestError(index, 'unit_price must be a decimal number')
+            if not unit_price.is_finite() or unit_price < 0:
+                raise IngestError(index, 'unit_price must be a non-negative number')
+            unit_price = round(unit_price, 2)
+            if unit_price >= MAX_MONEY:
+                raise IngestError(index, f'unit_price must be less than {MAX_MONEY}')
+        else:
+            unit_price = None
+
+        created_at = row.get('created_at')
+        if created_at:
+            try:
+                created_at = parse_datetime(str(created_at))
+            except ValueError:  # Well formed but impossible, such as February 30
+                created_at = None
+            if created_at is None:
+                raise IngestError(index, 'created_at must be an ISO 8601 datetime')
+            if timezone.is_naive(created_at):
+                created_at = timezone.make_aware(created_at)
+        else:
+            created_at = timezone.now()
+
+        try:
+            block_number = _optional_int(row.get('block_number'))
+        except ValueError:
+            raise IngestError(index, 'block_number must be an integer')
+        if block_number is not None and not 0 <= block_number < MAX_BIGINT:
+            raise IngestError(index, 'block_number is out of range')
+
+        transaction_hash = row.get('transaction_hash') or None
+        if transaction_hash is not None and (
+            not isinstance(transaction_hash, str) or len(transaction_hash) > MAX_HASH_LENGTH
+        ):
+            raise IngestError(index, f'transaction_hash must be a string of at most {MAX_HASH_LENGTH} characters')
+        description = row.get('description') or ''
+        if not isinstance(description, str):
+            raise IngestError(index, 'description must be a string')
+
+        transactions.append(Transaction(
+            user_id=child_users[child_id],
+            child_id=child_id,
+            investment_id=investment_id,
+            transaction_type=transaction_type,
+            amount=amount,
+            token=token,
+            unit_price=unit_price,
+            status=status,
+            transaction_hash=transaction_hash,
+            block_number=block_number,
+            description=description,
+            created_at=created_at,
+        ))
+    return transactions
+
+
+def apply_balance_deltas(deltas):
+    """Add each child's aggregated delta to its balance, many children per UPDATE"""
+    deltas = [(child_id, delta) for child_id, delta in deltas.items() if delta]
+    money = DecimalField(max_digits=15, decimal_places=2)
+    now = timezone.now()
+    for start in range(0, len(deltas), BALANCE_UPDATE_BATCH):
+        batch = deltas[start:start + BALANCE_UPDATE_BATCH]
+        Child.objects.filter(pk__in=[child_id for child_id, _ in batch]).update(
+            current_balance=F('current_balance') + Case(
+                *[When(pk=child_id, then=Value(delta, output_field=money)) for child_id, delta in batch],
+                output_field=money,
+            ),
+            updated_at=now,
+        )
+
+
+def ingest_transactions(rows, user=None, batch_size=5000, on_chunk=None, pending_only=False):
+    """
+    Insert already-parsed transaction rows with bulk_create, `batch_size` at a
+    time. Each chunk and its balance deltas are committed in one database
+    transaction, so a failure never leaves a half-applied chunk behind.
+
+    `on_chunk(rows_in_chunk)` runs inside each chunk's transaction, which lets
+    callers persist progress atomically with the data. Returns the number of
+    rows inserted. `user` and `pending_only` are passed to build_transactions().
+    """
+    total = 0
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= batch_size:
+            total += _ingest_chunk(chunk, user, on_chunk, pending_only)
+            chunk = []
+    if chunk:
+        total += _ingest_chunk(chunk, user, on_chunk, pending_only)
+    return total
+
+
+@transaction.atomic
+def _ingest_chunk(rows, user, on_chunk, pending_only):
+    transactions = build_transactions(rows, user=user, pending_only=pending_only)
+    Transaction.objects.bulk_create(transactions)
+
+    deltas = {}
+    for tx in transactions:
+        deltas[tx.child_id] = deltas.get(tx.child_id, Decimal('0')) + tx.balance_effect(tx.status)
+    apply_balance_deltas(deltas)
+
+    for user_id in {tx.user_id for tx in transactions}:
+        transaction.on_commit(lambda user_id=user_id: invalidate_dashboard_stats(user_id))
+    if on_chunk is not None:
+        on_chunk(len(transactions))
+    return len(transactions)
@@ -0,0 +1,92 @@
+import random
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from accounts.models import Child, User
+from investments.cost_basis import rebuild_position, rebuild_positions, sync_positions
+from investments.models import CostBasisPosition, Transaction
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks cost-basis replays, the vectorized bulk rebuild and incremental syncs (rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--children', type=int, default=1000)
+        parser.add_argument('--transactions', type=int, default=1000, help='Per child')
+        parser.add_argument('--new', type=int, default=100, help='Transactions added before the incremental sync')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            children = self.populate(options['children'], options['transactions'])
+            self.stdout.write(f'{Transaction.objects.count()} transactions, {len(children)} children')
+
+            start = time.perf_counter()
+            rebuild_positions('fifo')
+            self.report('vectorized rebuild', start)
+            vectorized = self.totals()
+
+            start = time.perf_counter()
+            for position in CostBasisPosition.objects.filter(method='fifo'):
+                rebuild_position(position)
+            self.report('replay per position', start)
+            self.stdout.write(f'  results match: {self.totals() == vectorized}')
+
+            rng = random.Random(1)
+            latest = timezone.now()
+            for n in range(options['new']):
+                self.add(rng.choice(children), rng, latest + timedelta(seconds=n))
+            start = time.perf_counter()
+            synced, rebuilt = sync_positions('fifo')
+            self.report(f'sync of {options["new"]} new ({synced} positions, {rebuilt} replayed)', start)
+
+            position = CostBasisPosition.objects.filter(method='fifo').first()
+            self.add(position.child, rng, latest + timedelta(days=1))
+            start = time.perf_counter()
+            sync_positions('fifo', [position.child_id])
+            self.report('sync of 1 new', start)
+            start = time.perf_counter()
+            rebuild_position(position)
+            self.report(f'replay of that position ({position.transactions} transactions)', start)
+            transaction.set_rollback(True)
+
+    def populate(self, count, per_child):
+        user = User.objects.create(username='bench-cost-basis', email='bench-cost-basis@example.com')
+        children = Child.objects.bulk_create([
+            Child(user=user, name=f'Bench {n}', date_of_birth=date(2018, 1, 1)) for n in range(count)
+        ])
+        rng = random.Random(0)
+        start = timezone.make_aware(datetime(2020, 1, 1))
+        for child in children:
+            price = 2000.0
+            rows = []
+            for n in range(per_child):
+                price = max(1.0, price * rng.uniform(0.97, 1.03))
+                kind = 'withdrawal' if n % 10 == 9 else 'interest' if n % 10 == 4 else 'investment'
+                rows.append(Transaction(
+                    user=user, child=child, transaction_type=kind, token='ETH', status='completed',
+                    amount=Decimal(rng.randint(1, 300)).scaleb(-2) * (3 if kind == 'withdrawal' else 1),
+                    unit_price=Decimal(f'{price:.2f}'), created_at=start + timedelta(hours=n),
+                ))
+            Transaction.objects.bulk_create(rows)
+        return children
+
+    def add(self, child, rng, created_at):
+        Transaction.objects.create(
+            user_id=child.user_id, child=child, transaction_type=rng.choice(['investment', 'withdrawal']),
+            token='ETH', status='completed', amount=Decimal('0.50'), unit_price=Decimal('2500.00'),
+            created_at=created_at,
+        )
+
+    def totals(self):
+        return CostBasisPosition.objects.filter(method='fifo').aggregate(
+            quantity=Sum('quantity'), cost=Sum('cost'), realized=Sum('realized_gain'),
+        )
+
+    def report(self, label, start):
+        self.stdout.write(f'  {label:<60} {time.perf_counter() - start:9.3f}s')
@@ -0,0 +1,130 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date
+from decimal import Decimal
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, close_old_connections, connection, connections, transaction
+from django.db.models import Sum
+
+from accounts.models import Child, User
+from baby_wallet_backend.databases import sqlite_database
+from investments.models import Transaction
+
+
+def legacy_sqlite_database(path):
+    """The original bare SQLite settings: rollback journal, deferred transactions, a connection per request"""
+    return {'ENGINE': 'django.db.backends.sqlite3', 'NAME': path}
+
+
+def reconnect_default(database):
+    connections.close_all()
+    connections.settings['default'] = database
+    try:
+        del connections['default']  # The next use connects with the new settings
+    except AttributeError:
+        pass
+
+
+@contextmanager
+def default_database(database):
+    """Point the default alias at `database` for the threads started inside the block"""
+    previous = connections.settings['default']
+    reconnect_default(connections.configure_settings({'default': database})['default'])
+    try:
+        yield
+    finally:
+        reconnect_default(previous)
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks concurrent writers and readers against the legacy and tuned SQLite profiles'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=8)
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--requests', type=int, default=300, help='Per writer')
+
+    def handle(self, *args, **options):
+        directory = tempfile.mkdtemp()
+        try:
+            for label, profile in [('legacy', legacy_sqlite_database), ('tuned', sqlite_database)]:
+                with default_database(profile(os.path.join(directory, f'{label}.sqlite3'))):
+                    call_command('migrate', verbosity=0)
+                    self.run(label, options)
+        finally:
+            shutil.rmtree(directory)
+
+    def run(self, label, options):
+        user = User.objects.create(username='bench-db', email='bench-db@example.com')
+        children = Child.objects.bulk_create([
+            Child(user=user, name=f'Writer {n}', date_of_birth=date(2018, 1, 1)) for n in range(options['writers'])
+        ])
+        connections.close_all()
+        locked = [0]
+        read_latencies = []
+        done = threading.Event()
+
+        def request(work):
+            """One request: retried while SQLite reports the lock, then the connection is released as Django would"""
+            try:
+                while True:
+                    try:
+                        return work()
+                    except OperationalError as exc:
+                        if 'locked' not in str(exc):
+                            raise
+                        locked[0] += 1
+            finally:
+                close_old_connections()
+
+        def deposit(child):
+            # Read then write in one transaction, as the API views validate before saving
+            with transaction.atomic():
+                Child.objects.get(pk=child.pk)
+                Transaction.objects.create(user=user, child=child, transaction_type='investment',
+                                           amount=Decimal('1.00'), status='completed')
+
+        def write(child):
+            try:
+                for _ in range(options['requests']):
+                    request(lambda: deposit(child))
+            finally:
+                connection.close()
+
+        def read():
+            try:
+                while not done.is_set():
+                    start = time.perf_counter()
+                    request(lambda: Child.objects.filter(user=user).aggregate(Sum('current_balance')))
+                    read_latencies.append(time.perf_counter() - start)
+            finally:
+                connection.close()
+
+        writers = [threading.Thread(target=write, args=(child,)) for child in children]
+        readers = [threading.Thread(target=read) for _ in range(options['readers'])]
+        start = time.perf_counter()
+        for thread in writers + readers:
+            thread.start()
+        for thread in writers:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        done.set()
+        for thread in readers:
+            thread.join()
+
+        writes = options['writers'] * options['requests']
+        balance = Child.objects.filter(user=user).aggregate(total=Sum('current_balance'))['total']
+        read_latencies.sort()
+        p99 = read_latencies[int(len(read_latencies) * 0.99)] * 1000 if read_latencies else 0
+        self.stdout.write(
+            f'  {label:<7} {writes / elapsed:8.0f} writes/s  {locked[0]:6} "database is locked" retries  '
+            f'{len(read_latencies) / elapsed:8.0f} reads/s (p99 {p99:.1f} ms)  '
+            f'balances {balance} of {writes}'
+        )
+        connections.close_all()
@@ -0,0 +1,99 @@
+import csv
+import io
+import shutil
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from django.utils import timezone
+
+from accounts.models import Child, User
+from investments.models import Transaction
+from investments.reports import generate_report, generate_year_end_reports, year_transactions
+
+
+def materialized_history(out, user_id, year):
+    """The whole year loaded as model instances before writing, kept as the baseline"""
+    text = io.TextIOWrapper(out, encoding='utf-8', newline='')
+    writer = csv.writer(text)
+    transactions = list(year_transactions(user_id, year).select_related('child').order_by('created_at', 'id'))
+    for tx in transactions:
+        writer.writerow([tx.created_at.isoformat(), tx.child.name, tx.transaction_type, tx.status, tx.amount,
+                         tx.token, tx.transaction_hash or '', tx.description])
+    text.flush()
+    text.detach()
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks tax report generation: memory while streaming, and the year-end batch across processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--large-user', type=int, default=200000, help='Transactions of the user measured for memory')
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--transactions', type=int, default=500, help='Transactions per batch user')
+        parser.add_argument('--workers', type=int, nargs='+', default=[1, 4])
+        parser.add_argument('--year', type=int, default=2025)
+
+    def handle(self, *args, **options):
+        year = options['year']
+        media = tempfile.mkdtemp()
+        users = []
+        try:
+            with override_settings(MEDIA_ROOT=media):
+                large = self.family('bench-tax-large', options['large_user'], year)
+                users.append(large)
+                self.measure_memory(large, year)
+                for n in range(options['users']):
+                    users.append(self.family(f'bench-tax-{n}', options['transactions'], year))
+                # The large user stays out of the batch: on SQLite its long read would hold off the other writers
+                self.measure_batch(users[1:], options)
+        finally:
+            User.objects.filter(pk__in=[user.pk for user in users]).delete()
+            shutil.rmtree(media)
+
+    def family(self, username, count, year):
+        user = User.objects.create(username=username, email=f'{username}@example.com')
+        child = Child.objects.create(user=user, name='Bench', date_of_birth=date(2018, 1, 1))
+        start = timezone.make_aware(datetime(year, 1, 1))
+        step = timedelta(days=365) / max(count, 1)
+        Transaction.objects.bulk_create([
+            Transaction(user=user, child=child, transaction_type='investment' if n % 10 else 'interest',
+                        amount=Decimal('12.34'), status='completed', created_at=start + step * n,
+                        description='Monthly contribution')
+            for n in range(count)
+        ], batch_size=5000)
+        return user
+
+    def measure_memory(self, user, year):
+        self.stdout.write(f'Transaction history of {user.transactions.count()} rows')
+        for label, build in [
+            ('materialized', lambda: materialized_history(tempfile.TemporaryFile(), user.pk, year)),
+            ('streamed', lambda: generate_report(user.pk, 'transaction', year, force=True)),
+            ('streamed PDF', lambda: generate_report(user.pk, 'annual', year, force=True)),
+        ]:
+            tracemalloc.start()
+            start = time.perf_counter()
+            build()
+            elapsed = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            self.stdout.write(f'  {label:<14} {elapsed:7.2f}s  peak {peak / 2 ** 20:8.1f} MiB')
+
+    def measure_batch(self, users, options):
+        year = options['year']
+        reports = len(users) * 3
+        self.stdout.write(f'Year-end batch: {len(users)} users, {reports} reports')
+        for workers in options['workers']:
+            start = time.perf_counter()
+            generated, _ = generate_year_end_reports(year, user_ids=[u.pk for u in users], workers=workers, force=True)
+            elapsed = time.perf_counter() - start
+            self.stdout.write(f'  {workers} workers      {elapsed:7.2f}s  {generated / elapsed:6.1f} reports/s')
+        start = time.perf_counter()
+        generated, unchanged = generate_year_end_reports(year, user_ids=[u.pk for u in users])
+        self.stdout.write(
+            f'  unchanged rerun {time.perf_counter() - start:7.2f}s  {generated} regenerated, {unchanged} kept'
+        )
@@ -0,0 +1,73 @@
+import threading
+import time
+from datetime import date
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection, models
+
+from accounts.models import User, Child
+from investments.models import Transaction
+
+
+def legacy_save(tx):
+    """The original save path: re-read the old status, then read-modify-write the child"""
+    old_status = Transaction.objects.get(pk=tx.pk).status
+    models.Model.save(tx)
+    if old_status != tx.status and tx.status == 'completed':
+        tx.child.current_balance += tx.amount
+        tx.child.save()
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks completing pending transactions with the legacy and atomic save paths'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--transactions', type=int, default=2000)
+        parser.add_argument('--threads', type=int, default=4)
+
+    def handle(self, *args, **options):
+        user = User.objects.create(username='bench-writes', email='bench-writes@example.com')
+        try:
+            for label, save in [('legacy', legacy_save), ('atomic', Transaction.save)]:
+                self.run(label, save, user, options['transactions'], options['threads'])
+        finally:
+            user.delete()
+
+    def run(self, label, save, user, count, threads):
+        child = Child.objects.create(user=user, name=label, date_of_birth=date(2018, 1, 1))
+        pending = Transaction.objects.bulk_create([
+            Transaction(user=user, child=child, transaction_type='investment', amount=Decimal('1.00'))
+            for _ in range(count)
+        ])
+        chunks = [pending[i::threads] for i in range(threads)]
+
+        def complete(chunk):
+            try:
+                for tx in chunk:
+                    tx = Transaction.objects.select_related('child').get(pk=tx.pk)
+                    tx.status = 'completed'
+                    while True:
+                        try:
+                            save(tx)
+                            break
+                        except OperationalError as exc:
+                            if 'locked' not in str(exc):
+                                raise
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=complete, args=(chunk,)) for chunk in chunks]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - start
+
+        child.refresh_from_db()
+        lost = count - int(child.current_balance)
+        self.stdout.write(
+            f'  {label:<7} {count / elapsed:8.0f} writes/s  '
+            f'balance {child.current_balance} (expected {count}, lost updates: {lost})'
+        )
@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from accounts.models import User
+from investments.models import TaxReport
+from investments.reports import generate_year_end_reports
+
+
+class Command(BaseCommand):
+    help = 'Generates tax reports for a year, skipping those whose transactions have not changed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--year', type=int, help='Defaults to last year')
+        parser.add_argument('--user', action='append', help='Email of a user to report on; defaults to everyone active that year')
+        parser.add_argument('--type', action='append', choices=[kind for kind, _ in TaxReport.REPORT_TYPES])
+        parser.add_argument('--workers', type=int, default=1, help='Processes building reports in parallel')
+        parser.add_argument('--force', action='store_true', help='Rebuild reports even if they are up to date')
+
+    def handle(self, *args, **options):
+        year = options['year'] or timezone.localdate().year - 1
+        user_ids = None
+        if options['user']:
+            user_ids = list(User.objects.filter(email__in=options['user']).values_list('pk', flat=True))
+        start = time.perf_counter()
+        generated, unchanged = generate_year_end_reports(
+            year, report_types=options['type'], user_ids=user_ids, workers=options['workers'], force=options['force'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'{year}: generated {generated} reports, {unchanged} already up to date ({time.perf_counter() - start:.2f}s)'
+        ))
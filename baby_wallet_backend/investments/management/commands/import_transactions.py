@@ -0,0 +1,75 @@
+import csv
+import json
+import os
+import time
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import F
+from django.utils import timezone
+
+from investments.ingest import IngestError, ingest_transactions
+from investments.models import TransactionImport
+
+
+def read_rows(path, file_format):
+    """Yield one dict per transaction from a CSV (with header) or NDJSON file"""
+    with open(path, newline='', encoding='utf-8') as source:
+        if file_format == 'csv':
+            yield from csv.DictReader(source)
+        else:
+            for line in source:
+                if line.strip():
+                    yield json.loads(line)
+
+
+class Command(BaseCommand):
+    help = 'Bulk imports transactions from a CSV or NDJSON file, resuming where a previous run stopped'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'ndjson'], help='Defaults to the file extension')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--restart', action='store_true', help='Ignore recorded progress and start over')
+
+    def handle(self, *args, **options):
+        path = os.path.abspath(options['path'])
+        if not os.path.exists(path):
+            raise CommandError(f'{path} does not exist')
+        file_format = options['format'] or ('csv' if path.endswith('.csv') else 'ndjson')
+
+        progress, _ = TransactionImport.objects.get_or_create(source=path)
+        if options['restart']:
+            progress.rows_processed = 0
+            progress.completed_at = None
+            progress.save()
+        elif progress.is_completed:
+            self.stdout.write(f'{path} was already imported ({progress.rows_processed} rows)')
+            return
+        skip = progress.rows_processed
+        if skip:
+            self.stdout.write(f'Resuming after {skip} rows')
+
+        started = time.perf_counter()
+        imported = 0
+
+        def record_chunk(count):
+            nonlocal imported
+            TransactionImport.objects.filter(pk=progress.pk).update(
+                rows_processed=F('rows_processed') + count, updated_at=timezone.now(),
+            )
+            imported += count
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f'  {skip + imported} rows imported ({imported / elapsed:.0f} rows/s)'
+            )
+
+        rows = islice(read_rows(path, file_format), skip, None)
+        try:
+            ingest_transactions(rows, batch_size=options['batch_size'], on_chunk=record_chunk)
+        except IngestError as exc:
+            line = skip + imported + exc.row + 1
+            raise CommandError(f'Record {line}: {exc.message}. Rerun to resume from record {skip + imported + 1}.')
+
+        TransactionImport.objects.filter(pk=progress.pk).update(completed_at=timezone.now())
+        self.stdout.write(self.style.SUCCESS(f'Imported {imported} transactions from {path}'))
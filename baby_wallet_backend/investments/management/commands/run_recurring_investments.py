@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils.dateparse import parse_date
+
+from investments.recurring import run_recurring_investments
+
+
+class Command(BaseCommand):
+    help = 'Executes due recurring investments in batches, optionally as a long-running loop'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', type=parse_date, help='Run as of this date (YYYY-MM-DD), defaults to today')
+        parser.add_argument('--chunk-size', type=int, default=500)
+        parser.add_argument('--workers', type=int, default=1)
+        parser.add_argument('--loop', action='store_true', help='Keep running, waking up every --interval seconds')
+        parser.add_argument('--interval', type=int, default=3600)
+
+    def handle(self, *args, **options):
+        while True:
+            self.run_once(options)
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+    def run_once(self, options):
+        start = time.perf_counter()
+        processed, created = run_recurring_investments(
+            today=options['date'],
+            chunk_size=options['chunk_size'],
+            workers=options['workers'],
+        )
+        elapsed = time.perf_counter() - start
+        rate = processed / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Processed {processed} investments, created {created} contributions '
+            f'in {elapsed:.2f}s ({rate:.0f} investments/s)'
+        ))
@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts.models import Child
+from investments.cost_basis import rebuild_positions, sync_positions
+from investments.models import CostBasisPosition
+
+
+class Command(BaseCommand):
+    help = 'Brings cost-basis positions and realized gains up to date with completed transactions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--method', choices=[method for method, _ in CostBasisPosition.METHOD_CHOICES],
+                            default='fifo')
+        parser.add_argument('--user', action='append', help='Email of a user whose children to sync; defaults to all')
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Recompute every position from scratch in bulk, e.g. after a backfill')
+
+    def handle(self, *args, **options):
+        child_ids = None
+        if options['user']:
+            child_ids = list(Child.objects.filter(user__email__in=options['user']).values_list('pk', flat=True))
+        start = time.perf_counter()
+        if options['rebuild']:
+            positions = rebuild_positions(options['method'], child_ids)
+            summary = f'rebuilt {positions} positions'
+        else:
+            synced, rebuilt = sync_positions(options['method'], child_ids)
+            summary = f'synced {synced} positions, {rebuilt} of them replayed in full'
+        self.stdout.write(self.style.SUCCESS(
+            f'{options["method"]}: {summary} ({time.perf_counter() - start:.2f}s)'
+        ))
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.1 on 2026-10-17 18:32
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0003_child_child_user_created_idx"),
+        ("investments", "0002_transactionimport"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="investment",
+            index=models.Index(
+                fields=["user", "created_at", "id"], name="investment_user_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="investment",
+            index=models.Index(
+                fields=["child", "created_at", "id"],
+                name="investment_child_created_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="transaction",
+            index=models.Index(
+                fields=["user", "created_at", "id"], name="transaction_user_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="transaction",
+            index=models.Index(
+                fields=["child", "created_at", "id"],
+                name="transaction_child_created_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-17 18:35
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0003_child_child_user_created_idx"),
+        ("investments", "0004_investment_investment_user_status_idx_and_more"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="transaction",
+            index=models.Index(
+                fields=["investment", "created_at", "id"],
+                name="transaction_investment_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.1 on 2026-10-17 18:36
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0003_child_child_user_created_idx"),
+        ("investments", "0005_transaction_transaction_investment_idx"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="transaction",
+            name="scheduled_for",
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="investment",
+            index=models.Index(
+                fields=["status", "next_payment_date"], name="investment_due_idx"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="transaction",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("scheduled_for__isnull", False)),
+                fields=("investment", "scheduled_for"),
+                name="unique_scheduled_contribution",
+            ),
+        ),
+    ]
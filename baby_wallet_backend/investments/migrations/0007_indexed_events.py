@@ -0,0 +1,29 @@
+# Generated by Django 5.2.1 on 2026-10-17 18:57
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0003_child_child_user_created_idx"),
+        ("investments", "0006_recurring_schedule"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="transaction",
+            name="log_index",
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name="transaction",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("log_index__isnull", False)),
+                fields=("transaction_hash", "log_index"),
+                name="unique_indexed_event",
+            ),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-17 19:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("investments", "0007_indexed_events"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="taxreport",
+            name="source_transactions",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="taxreport",
+            name="source_updated_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,183 @@
+# Generated by Django 5.2.1 on 2026-10-17 19:37
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0003_child_child_user_created_idx"),
+        ("investments", "0008_tax_report_watermark"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CostBasisLot",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("acquired_at", models.DateTimeField()),
+                ("quantity", models.DecimalField(decimal_places=2, max_digits=15)),
+                ("unit_cost", models.DecimalField(decimal_places=2, max_digits=15)),
+            ],
+            options={
+                "ordering": ["id"],
+            },
+        ),
+        migrations.CreateModel(
+            name="CostBasisPosition",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "token",
+                    models.CharField(
+                        choices=[
+                            ("USDC", "USDC"),
+                            ("USDT", "USDT"),
+                            ("ETH", "Ethereum"),
+                            ("BTC", "Bitcoin"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                (
+                    "method",
+                    models.CharField(
+                        choices=[("fifo", "FIFO"), ("average", "Average Cost")],
+                        default="fifo",
+                        max_length=10,
+                    ),
+                ),
+                (
+                    "quantity",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=15),
+                ),
+                (
+                    "cost",
+                    models.DecimalField(decimal_places=4, default=0, max_digits=19),
+                ),
+                (
+                    "realized_gain",
+                    models.DecimalField(decimal_places=4, default=0, max_digits=19),
+                ),
+                ("last_created_at", models.DateTimeField(blank=True, null=True)),
+                ("last_transaction_id", models.BigIntegerField(default=0)),
+                ("transactions", models.PositiveIntegerField(default=0)),
+                ("synced_at", models.DateTimeField(blank=True, null=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "ordering": ["child", "token", "method"],
+            },
+        ),
+        migrations.CreateModel(
+            name="RealizedGain",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("realized_at", models.DateTimeField()),
+                ("quantity", models.DecimalField(decimal_places=2, max_digits=15)),
+                ("proceeds", models.DecimalField(decimal_places=4, max_digits=19)),
+                ("cost_basis", models.DecimalField(decimal_places=4, max_digits=19)),
+                ("gain", models.DecimalField(decimal_places=4, max_digits=19)),
+            ],
+            options={
+                "ordering": ["realized_at", "id"],
+            },
+        ),
+        migrations.AddField(
+            model_name="transaction",
+            name="unit_price",
+            field=models.DecimalField(
+                blank=True, decimal_places=2, max_digits=15, null=True
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="transaction",
+            index=models.Index(
+                fields=["child", "updated_at"], name="transaction_child_updated_idx"
+            ),
+        ),
+        migrations.AddField(
+            model_name="costbasislot",
+            name="transaction",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="cost_basis_lots",
+                to="investments.transaction",
+            ),
+        ),
+        migrations.AddField(
+            model_name="costbasisposition",
+            name="child",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="cost_basis_positions",
+                to="accounts.child",
+            ),
+        ),
+        migrations.AddField(
+            model_name="costbasislot",
+            name="position",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="lots",
+                to="investments.costbasisposition",
+            ),
+        ),
+        migrations.AddField(
+            model_name="realizedgain",
+            name="position",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="realized_gains",
+                to="investments.costbasisposition",
+            ),
+        ),
+        migrations.AddField(
+            model_name="realizedgain",
+            name="transaction",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="realized_gains",
+                to="investments.transaction",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="costbasisposition",
+            constraint=models.UniqueConstraint(
+                fields=("child", "token", "method"), name="unique_cost_basis_position"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="realizedgain",
+            index=models.Index(
+                fields=["position", "realized_at"], name="realized_gain_position_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,82 @@
+from calendar import monthrange
+from datetime import timedelta
+
+from django.db import migrations
+from django.db.models import Max, Q
+from django.utils import timezone
+
+
+# Frozen copies of add_months and Investment.payment_date/calculate_next_payment_date
+FREQUENCY_MONTHS = {"monthly": 1, "quarterly": 3, "yearly": 12}
+
+
+def add_months(day, months):
+    month_index = day.month - 1 + months
+    year, month = day.year + month_index // 12, month_index % 12 + 1
+    return day.replace(year=year, month=month, day=min(day.day, monthrange(year, month)[1]))
+
+
+def payment_date(investment, period):
+    if investment.frequency == "weekly":
+        return investment.start_date + timedelta(weeks=period)
+    return add_months(investment.start_date, FREQUENCY_MONTHS[investment.frequency] * period)
+
+
+def next_payment_after(investment, after):
+    """First scheduled payment strictly after `after`, or None past end_date"""
+    if after < investment.start_date:
+        period = 0
+    elif investment.frequency == "weekly":
+        period = (after - investment.start_date).days // 7 + 1
+    else:
+        months = (after.year - investment.start_date.year) * 12 + after.month - investment.start_date.month
+        period = max(0, months // FREQUENCY_MONTHS[investment.frequency])
+        while payment_date(investment, period) <= after:
+            period += 1
+    next_date = payment_date(investment, period)
+    if investment.end_date and next_date > investment.end_date:
+        return None
+    return next_date
+
+
+def backfill_next_payment_date(apps, schema_editor):
+    """
+    Schedule the recurring investments created before next_payment_date was
+    maintained: the period after their last contribution, or start_date when
+    nothing has been paid yet. Those whose schedule has ended are completed.
+    """
+    Investment = apps.get_model("investments", "Investment")
+    db = schema_editor.connection.alias
+    contributions = Q(transactions__transaction_type="investment", transactions__status="completed")
+    investments = (
+        Investment.objects.using(db)
+        .filter(investment_type="recurring", status__in=["active", "paused"], next_payment_date__isnull=True,
+                frequency__in=["weekly", *FREQUENCY_MONTHS])
+        .annotate(
+            last_scheduled=Max("transactions__scheduled_for", filter=contributions),
+            last_created=Max("transactions__created_at", filter=contributions),
+        )
+    )
+    for investment in investments.iterator():
+        last_paid = investment.last_scheduled
+        if last_paid is None and investment.last_created is not None:
+            last_paid = timezone.localdate(investment.last_created)
+        if last_paid is None:
+            investment.next_payment_date = investment.start_date
+        else:
+            investment.next_payment_date = next_payment_after(investment, last_paid)
+        update = {"next_payment_date": investment.next_payment_date}
+        if investment.next_payment_date is None:
+            update["status"] = "completed"
+        Investment.objects.using(db).filter(pk=investment.pk).update(**update)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("investments", "0009_cost_basis"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_next_payment_date, migrations.RunPython.noop),
+    ]
@@ -1,9 +1,23 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
 from django.conf import settings
+from django.utils import timezone
 from accounts.models import Child
+from calendar import monthrange
+from datetime import timedelta
 from decimal import Decimal
 
 
+FREQUENCY_MONTHS = {'monthly': 1, 'quarterly': 3, 'yearly': 12}
+
+
+def add_months(day, months):
+    """Add calendar months to a date, clamping to the last day of shorter months"""
+    month_index = day.month - 1 + months
+    year, month = day.year + month_index // 12, month_index % 12 + 1
+    return day.replace(year=year, month=month, day=min(day.day, monthrange(year, month)[1]))
+
+
 class Investment(models.Model):
     """Investment model for tracking investments"""
     INVESTMENT_TYPES = [
@@ -42,6 +56,12 @@ class Investment(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'created_at', 'id'], name='investment_user_created_idx'),
+            models.Index(fields=['child', 'created_at', 'id'], name='investment_child_created_idx'),
+            models.Index(fields=['user', 'status', 'created_at', 'id'], name='investment_user_status_idx'),
+            models.Index(fields=['status', 'next_payment_date'], name='investment_due_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.email} - {self.child.name} - {self.amount}"
@@ -55,24 +75,42 @@ class Investment(models.Model):
         """Calculate total number of investments made"""
         return self.transactions.filter(transaction_type='investment').count()
 
-    def calculate_next_payment_date(self):
-        """Calculate next payment date for recurring investments"""
-        if not self.is_recurring:
-            return None
-        
-        from datetime import timedelta
-        from django.utils import timezone
-        
+    def payment_date(self, period):
+        """Date of the `period`-th scheduled payment, counting start_date as period 0"""
         if self.frequency == 'weekly':
-            return timezone.now().date() + timedelta(days=7)
-        elif self.frequency == 'monthly':
-            return timezone.now().date() + timedelta(days=30)
-        elif self.frequency == 'quarterly':
-            return timezone.now().date() + timedelta(days=90)
-        elif self.frequency == 'yearly':
-            return timezone.now().date() + timedelta(days=365)
-        
-        return None
+            return self.start_date + timedelta(weeks=period)
+        return add_months(self.start_date, FREQUENCY_MONTHS[self.frequency] * period)
+
+    def calculate_next_payment_date(self, after=None):
+        """
+        Calculate the first scheduled payment date strictly after `after`
+        (today by default) for recurring investments. Months are added on the
+        calendar, keeping start_date's day where the month allows it.
+        """
+        if not self.is_recurring or self.frequency not in ('weekly', *FREQUENCY_MONTHS):
+            return None
+
+        after = after or timezone.localdate()
+        if after < self.start_date:
+            period = 0
+        elif self.frequency == 'weekly':
+            period = (after - self.start_date).days // 7 + 1
+        else:
+            months = (after.year - self.start_date.year) * 12 + after.month - self.start_date.month
+            period = max(0, months // FREQUENCY_MONTHS[self.frequency])
+            while self.payment_date(period) <= after:
+                period += 1
+
+        next_date = self.payment_date(period)
+        if self.end_date and next_date > self.end_date:
+            return None
+        return next_date
+
+    def save(self, *args, **kwargs):
+        # New recurring investments become due on their start date
+        if self._state.adding and self.is_recurring and self.next_payment_date is None:
+            self.next_payment_date = self.start_date
+        super().save(*args, **kwargs)
 
 
 class Transaction(models.Model):
@@ -108,15 +146,39 @@ class Transaction(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     transaction_hash = models.CharField(max_length=66, blank=True, null=True)
     block_number = models.BigIntegerField(null=True, blank=True)
+    log_index = models.PositiveIntegerField(null=True, blank=True)  # Position of the on-chain event it was indexed from
     gas_used = models.BigIntegerField(null=True, blank=True)
     gas_price = models.BigIntegerField(null=True, blank=True)
     description = models.TextField(blank=True)
+    scheduled_for = models.DateField(null=True, blank=True)  # Period paid by a recurring contribution
+    # Price of one token in the reporting currency when it happened; stablecoins count as 1 when unset
+    unit_price = models.DecimalField(max_digits=15, decimal_places=2, null=True, blank=True)
     metadata = models.JSONField(default=dict)  # Additional transaction data
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(default=timezone.now, editable=False)  # Settable for historical imports
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'created_at', 'id'], name='transaction_user_created_idx'),
+            models.Index(fields=['child', 'created_at', 'id'], name='transaction_child_created_idx'),
+            models.Index(fields=['user', 'status', 'created_at', 'id'], name='transaction_user_status_idx'),
+            models.Index(fields=['user', 'transaction_type', 'created_at', 'id'], name='transaction_user_type_idx'),
+            models.Index(fields=['investment', 'created_at', 'id'], name='transaction_investment_idx'),
+            models.Index(fields=['child', 'updated_at'], name='transaction_child_updated_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['investment', 'scheduled_for'],
+                condition=models.Q(scheduled_for__isnull=False),
+                name='unique_scheduled_contribution',
+            ),
+            models.UniqueConstraint(
+                fields=['transaction_hash', 'log_index'],
+                condition=models.Q(log_index__isnull=False),
+                name='unique_indexed_event',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.user.email} - {self.transaction_type} - {self.amount} {self.token}"
@@ -131,30 +193,133 @@ class Transaction(models.Model):
         """Check if transaction reduces balance"""
         return self.transaction_type in ['withdrawal', 'fee']
 
+    # Fields that decide what a transaction contributes to which child's balance
+    BALANCE_FIELDS = ('child_id', 'transaction_type', 'amount', 'status')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored balance fields so save() can compute the change without re-reading the row
+        if all(name in field_names for name in cls.BALANCE_FIELDS):
+            instance._loaded_balance = instance.balance_state()
+        return instance
+
+    def balance_state(self):
+        return tuple(getattr(self, name) for name in self.BALANCE_FIELDS)
+
+    @staticmethod
+    def effect_of(transaction_type, amount, status):
+        """Signed amount a transaction of `transaction_type` and `amount` contributes to a balance in `status`"""
+        if status != 'completed':
+            return Decimal('0')
+        if transaction_type in ['investment', 'interest', 'refund']:
+            return amount
+        if transaction_type in ['withdrawal', 'fee']:
+            return -amount
+        return Decimal('0')
+
+    def balance_effect(self, status):
+        """Signed amount this transaction contributes to the child's balance in `status`"""
+        return self.effect_of(self.transaction_type, self.amount, status)
+
+    def balance_deltas(self, previous, current):
+        """{child pk: change} of going from the `previous` balance state (None when new) to `current`"""
+        deltas = {}
+        if previous is not None:
+            child_id, transaction_type, amount, status = previous
+            deltas[child_id] = -self.effect_of(transaction_type, amount, status)
+        child_id, transaction_type, amount, status = current
+        deltas[child_id] = deltas.get(child_id, Decimal('0')) + self.effect_of(transaction_type, amount, status)
+        return {child_id: delta for child_id, delta in deltas.items() if delta}
+
     def save(self, *args, **kwargs):
-        """Override save to update child balance"""
-        is_new = self.pk is None
-        old_status = None
-        
-        if not is_new:
-            old_transaction = Transaction.objects.get(pk=self.pk)
-            old_status = old_transaction.status
-        
-        super().save(*args, **kwargs)
-        
-        # Update child balance when transaction status changes
-        if is_new or old_status != self.status:
-            self.update_child_balance()
+        """
+        Override save to keep the child balances in step with the transaction.
+
+        The change is the effect of the stored child, type, amount and status
+        reversed, plus the effect of the new ones: completing a transaction
+        credits or debits its amount, leaving completed reverses it, and
+        editing a completed transaction's amount or type applies the
+        difference. Every UPDATE that writes these fields, whether or not they
+        changed, is conditioned on the previously loaded values, so when two
+        writers race on the same transaction only the first one's save goes
+        through; the other gets a DatabaseError and its changes are rolled
+        back instead of writing stale values back.
+        """
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            update_fields = {self._meta.get_field(name).attname for name in update_fields}
+        # An UPDATE that leaves the balance fields out cannot write stale ones back
+        writes_balance = update_fields is None or not update_fields.isdisjoint(self.BALANCE_FIELDS)
+        if self._state.adding:
+            previous = None
+        elif not writes_balance:
+            previous = self.balance_state()
+        else:
+            previous = getattr(self, '_loaded_balance', None)
+            if previous is None:
+                previous = Transaction.objects.filter(pk=self.pk).values_list(*self.BALANCE_FIELDS).first()
+
+        current = self.balance_state()
+        if update_fields is not None and previous is not None:
+            # Fields left out of update_fields keep their stored values
+            current = tuple(
+                value if name in update_fields else stored
+                for name, value, stored in zip(self.BALANCE_FIELDS, current, previous)
+            )
+        deltas = self.balance_deltas(previous, current)
 
-    def update_child_balance(self):
-        """Update child's current balance based on transaction"""
-        if self.status == 'completed':
-            if self.is_credit:
-                self.child.current_balance += self.amount
-            elif self.is_debit:
-                self.child.current_balance -= self.amount
-            
-            self.child.save()
+        if writes_balance and previous is not None:
+            # Any save writing the balance fields back, even unchanged, must find them as loaded
+            self._expected_balance = previous
+            kwargs['force_update'] = True
+        try:
+            if not deltas and not kwargs.get('force_update'):
+                super().save(*args, **kwargs)
+            else:
+                # A savepoint, so a rejected stale save leaves the caller's transaction usable
+                with transaction.atomic(using=kwargs.get('using')):
+                    super().save(*args, **kwargs)
+                    for child_id, delta in deltas.items():
+                        self.update_child_balance(delta, child_id)
+        finally:
+            self._expected_balance = None
+        self._loaded_balance = current
+
+    def _do_update(self, base_qs, using, pk_val, values, update_fields, forced_update):
+        expected = getattr(self, '_expected_balance', None)
+        if expected is not None:
+            base_qs = base_qs.filter(**dict(zip(self.BALANCE_FIELDS, expected)))
+        return super()._do_update(base_qs, using, pk_val, values, update_fields, forced_update)
+
+    def update_child_balance(self, delta, child_id=None):
+        """Apply `delta` to the balance of the transaction's child, or of `child_id`, touching only that column"""
+        child_id = child_id or self.child_id
+        Child.objects.filter(pk=child_id).update(
+            current_balance=F('current_balance') + delta,
+            updated_at=timezone.now(),
+        )
+        if child_id == self.child_id and Transaction.child.is_cached(self):
+            self.child.current_balance += delta
+
+
+class TransactionImport(models.Model):
+    """Progress of a bulk transaction import, committed together with each chunk"""
+    source = models.CharField(max_length=500, unique=True)
+    rows_processed = models.BigIntegerField(default=0)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.source} - {self.rows_processed} rows"
+
+    @property
+    def is_completed(self):
+        return self.completed_at is not None
 
 
 class InvestmentGoal(models.Model):
@@ -202,6 +367,9 @@ class TaxReport(models.Model):
     report_type = models.CharField(max_length=20, choices=REPORT_TYPES)
     year = models.IntegerField()
     file_path = models.FileField(upload_to='tax_reports/', blank=True, null=True)
+    # Newest updated_at and count of the year's transactions the file was built from; see reports.generate_report
+    source_updated_at = models.DateTimeField(null=True, blank=True)
+    source_transactions = models.PositiveIntegerField(default=0)
     generated_at = models.DateTimeField(auto_now_add=True)
     is_downloaded = models.BooleanField(default=False)
 
@@ -211,3 +379,80 @@ class TaxReport(models.Model):
 
     def __str__(self):
         return f"{self.user.email} - {self.report_type} - {self.year}"
+
+
+class CostBasisPosition(models.Model):
+    """
+    A child's holding of one token under one cost-basis method, with its
+    open cost and realized gains. Kept up to date incrementally by
+    cost_basis.sync_position from a high-water mark over the child's
+    completed transactions in (created_at, id) order.
+    """
+    METHOD_CHOICES = [
+        ('fifo', 'FIFO'),
+        ('average', 'Average Cost'),
+    ]
+
+    child = models.ForeignKey(Child, on_delete=models.CASCADE, related_name='cost_basis_positions')
+    token = models.CharField(max_length=10, choices=Transaction.TOKEN_CHOICES)
+    method = models.CharField(max_length=10, choices=METHOD_CHOICES, default='fifo')
+    quantity = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    # Amounts in the reporting currency, to 1/10000 so quantity x price is exact
+    cost = models.DecimalField(max_digits=19, decimal_places=4, default=0)  # Cost basis of the open quantity
+    realized_gain = models.DecimalField(max_digits=19, decimal_places=4, default=0)
+    # Last transaction applied; later ones are applied on top of the stored state
+    last_created_at = models.DateTimeField(null=True, blank=True)
+    last_transaction_id = models.BigIntegerField(default=0)
+    transactions = models.PositiveIntegerField(default=0)  # Completed transactions applied
+    # Transactions updated since are re-examined by the next sync; None forces a rebuild
+    synced_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['child', 'token', 'method']
+        constraints = [
+            models.UniqueConstraint(fields=['child', 'token', 'method'], name='unique_cost_basis_position'),
+        ]
+
+    def __str__(self):
+        return f"{self.child.name} - {self.token} ({self.method}) - {self.quantity}"
+
+    @property
+    def average_cost(self):
+        """Cost of one token of the open quantity"""
+        return self.cost / self.quantity if self.quantity else Decimal('0')
+
+
+class CostBasisLot(models.Model):
+    """Part of an acquisition still held by a FIFO position"""
+    position = models.ForeignKey(CostBasisPosition, on_delete=models.CASCADE, related_name='lots')
+    transaction = models.ForeignKey(Transaction, on_delete=models.CASCADE, related_name='cost_basis_lots')
+    acquired_at = models.DateTimeField()
+    quantity = models.DecimalField(max_digits=15, decimal_places=2)  # Not yet disposed of
+    unit_cost = models.DecimalField(max_digits=15, decimal_places=2)
+
+    class Meta:
+        ordering = ['id']  # Lots are only ever appended, so id order is FIFO order
+
+    def __str__(self):
+        return f"{self.quantity} @ {self.unit_cost}"
+
+
+class RealizedGain(models.Model):
+    """Gain realized by one withdrawal or fee against a position"""
+    position = models.ForeignKey(CostBasisPosition, on_delete=models.CASCADE, related_name='realized_gains')
+    transaction = models.ForeignKey(Transaction, on_delete=models.CASCADE, related_name='realized_gains')
+    realized_at = models.DateTimeField()
+    quantity = models.DecimalField(max_digits=15, decimal_places=2)
+    proceeds = models.DecimalField(max_digits=19, decimal_places=4)
+    cost_basis = models.DecimalField(max_digits=19, decimal_places=4)
+    gain = models.DecimalField(max_digits=19, decimal_places=4)
+
+    class Meta:
+        ordering = ['realized_at', 'id']
+        indexes = [
+            models.Index(fields=['position', 'realized_at'], name='realized_gain_position_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.position} - {self.gain} on {self.realized_at:%Y-%m-%d}"
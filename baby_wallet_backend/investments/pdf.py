@@ -0,0 +1,76 @@
+class TextPDF:
+    """
+    Minimal PDF 1.4 writer for text statements: lines of Helvetica laid out
+    top to bottom on A4 pages and written to the binary file `out` as each
+    page fills up, so only the current page is ever held in memory.
+    """
+    WIDTH, HEIGHT = 595, 842  # A4 in points
+    FONTS = {'regular': 'Helvetica', 'bold': 'Helvetica-Bold'}
+
+    def __init__(self, out, font_size=9, margin=40):
+        self.out = out
+        self.font_size = font_size
+        self.margin = margin
+        self.leading = font_size * 1.4
+        self.lines_per_page = int((self.HEIGHT - 2 * margin) // self.leading)
+        self.offsets = {}
+        self.next_id = 3 + len(self.FONTS)  # 1 is the catalog, 2 the page tree, then the fonts
+        self.pages = []
+        self.page = []
+        self.position = 0
+        self._write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+
+    def _write(self, data):
+        self.out.write(data)
+        self.position += len(data)
+
+    def _object(self, number, body):
+        self.offsets[number] = self.position
+        self._write(f'{number} 0 obj\n'.encode() + body + b'\nendobj\n')
+
+    @staticmethod
+    def escape(text):
+        return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+    def line(self, text='', bold=False):
+        if len(self.page) == self.lines_per_page:
+            self.flush_page()
+        self.page.append((text, bold))
+
+    def flush_page(self):
+        commands = [f'BT {self.leading:.1f} TL {self.margin} {self.HEIGHT - self.margin - self.font_size} Td']
+        font = None
+        for text, bold in self.page:
+            if font != bold:
+                commands.append(f'/F{2 if bold else 1} {self.font_size} Tf')
+                font = bold
+            commands.append(f'({self.escape(text)}) Tj T*')
+        commands.append('ET')
+        stream = '\n'.join(commands).encode('cp1252', errors='replace')
+        content, page = self.next_id, self.next_id + 1
+        self.next_id += 2
+        self._object(content, f'<< /Length {len(stream)} >>\nstream\n'.encode() + stream + b'\nendstream')
+        self._object(page, (
+            f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {self.WIDTH} {self.HEIGHT}] '
+            f'/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> /Contents {content} 0 R >>'
+        ).encode())
+        self.pages.append(page)
+        self.page = []
+
+    def close(self):
+        if self.page or not self.pages:
+            self.flush_page()
+        for number, name in enumerate(self.FONTS.values(), start=3):
+            self._object(number, (
+                f'<< /Type /Font /Subtype /Type1 /BaseFont /{name} /Encoding /WinAnsiEncoding >>'
+            ).encode())
+        kids = ' '.join(f'{page} 0 R' for page in self.pages)
+        self._object(2, f'<< /Type /Pages /Kids [{kids}] /Count {len(self.pages)} >>'.encode())
+        self._object(1, b'<< /Type /Catalog /Pages 2 0 R >>')
+
+        xref = self.position
+        entries = ''.join(f'{self.offsets[number]:010d} 00000 n \n' for number in range(1, self.next_id))
+        self._write(
+            f'xref\n0 {self.next_id}\n0000000000 65535 f \n{entries}'
+            f'trailer\n<< /Size {self.next_id} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n'.encode()
+        )
@@ -0,0 +1,157 @@
+import json
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from decimal import Decimal
+
+import requests
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+
+logger = logging.getLogger(__name__)
+
+_source = None
+_source_lock = threading.Lock()
+_prices = {}  # currency -> PriceEntry
+_refresh_lock = threading.Lock()
+
+
+class PriceUnavailable(Exception):
+    """The price source failed and there is no earlier price to fall back on"""
+
+
+class FilePriceSource:
+    """
+    Prices read from a JSON file shaped {"USD": {"ETH": "3400.12", ...}, ...},
+    written by an external feed or kept as a fixed stub for development and
+    tests. The file is re-read on every fetch, so updating it is enough.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def fetch(self, currency):
+        try:
+            with open(self.path) as feed:
+                prices = json.load(feed).get(currency, {})
+        except (OSError, ValueError) as error:
+            raise PriceUnavailable(f'Cannot read price feed {self.path}: {error}') from error
+        return {token: Decimal(str(price)) for token, price in prices.items()}
+
+
+class CoinGeckoPriceSource:
+    """Spot prices from CoinGecko's /simple/price endpoint"""
+    URL = 'https://api.coingecko.com/api/v3/simple/price'
+    IDS = {'USDC': 'usd-coin', 'USDT': 'tether', 'ETH': 'ethereum', 'BTC': 'bitcoin'}
+
+    def __init__(self, url=URL, timeout=5):
+        self.url = url
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def fetch(self, currency):
+        try:
+            response = self.session.get(self.url, timeout=self.timeout, params={
+                'ids': ','.join(self.IDS.values()), 'vs_currencies': currency.lower(),
+            })
+            response.raise_for_status()
+            quotes = response.json()
+        except (requests.RequestException, ValueError) as error:
+            raise PriceUnavailable(f'CoinGecko prices in {currency} unavailable: {error}') from error
+        return {
+            token: Decimal(str(quotes[coin][currency.lower()]))
+            for token, coin in self.IDS.items() if currency.lower() in quotes.get(coin, {})
+        }
+
+
+@dataclass
+class PriceEntry:
+    prices: dict  # token -> price of one token in the currency
+    fetched_at: float  # time.time() of the fetch
+    expires: float  # time.monotonic() after which the next caller refreshes
+
+
+def get_source():
+    global _source
+    if _source is None:
+        with _source_lock:
+            if _source is None:
+                config = settings.PRICE_SOURCE
+                _source = import_string(config['BACKEND'])(**config.get('OPTIONS', {}))
+    return _source
+
+
+def get_prices(currency):
+    """
+    Token prices in `currency`, from a process-local copy refreshed every
+    PRICE_CACHE_TTL seconds. One caller refreshes while the others keep
+    getting the expired copy, and a failing source leaves the last prices
+    in place until it recovers; PriceUnavailable is only raised when this
+    process has never had prices for `currency`, including when the source
+    does not quote it at all.
+    """
+    entry = _prices.get(currency)
+    if entry is not None and entry.expires > time.monotonic():
+        return entry.prices
+    if not _refresh_lock.acquire(blocking=entry is None):
+        return entry.prices
+    try:
+        current = _prices.get(currency)
+        if current is not None and current.expires > time.monotonic():
+            return current.prices
+        try:
+            prices = get_source().fetch(currency)
+            if not prices:
+                # A total of zero would pass for a valuation
+                raise PriceUnavailable(f'The price source quotes no tokens in {currency}')
+        except PriceUnavailable:
+            if current is None:
+                raise
+            logger.warning('Keeping %s prices from %.0fs ago', currency, time.time() - current.fetched_at,
+                           exc_info=True)
+            current.expires = time.monotonic() + settings.PRICE_CACHE_TTL
+            return current.prices
+        _prices[currency] = PriceEntry(prices, time.time(), time.monotonic() + settings.PRICE_CACHE_TTL)
+        return prices
+    finally:
+        _refresh_lock.release()
+
+
+def clear_price_cache():
+    global _source
+    with _refresh_lock:
+        _prices.clear()
+    with _source_lock:
+        _source = None
+
+
+@receiver(setting_changed)
+def clear_price_cache_on_setting_change(setting, **kwargs):
+    if setting.startswith('PRICE_'):
+        clear_price_cache()
+
+
+def value_holdings(holdings, currency):
+    """
+    Convert {token: quantity} to `currency` in one pass over cached prices.
+    Returns (total, {token: {'quantity', 'price', 'value'}}). A held token
+    without a price raises PriceUnavailable rather than leaving a smaller
+    total that reads as complete.
+    """
+    prices = get_prices(currency)
+    unpriced = sorted(token for token, quantity in holdings.items() if quantity and token not in prices)
+    if unpriced:
+        raise PriceUnavailable(f'No {currency} price for {", ".join(unpriced)}')
+    total = Decimal('0')
+    valued = {}
+    for token, quantity in holdings.items():
+        price = prices.get(token)
+        value = None if price is None else (quantity * price).quantize(Decimal('0.01'))
+        if value is not None:
+            total += value
+        valued[token] = {'quantity': quantity, 'price': price, 'value': value}
+    return total, valued
@@ -0,0 +1,121 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+
+from accounts.stats import invalidate_dashboard_stats
+from .ingest import apply_balance_deltas
+from .models import Investment, Transaction
+
+
+logger = logging.getLogger(__name__)
+
+
+def due_investments(today):
+    """Active recurring investments whose next payment is due, served by investment_due_idx"""
+    return Investment.objects.filter(
+        status='active', next_payment_date__lte=today, investment_type='recurring',
+    )
+
+
+def due_id_chunks(today, chunk_size):
+    """Yield ids of due investments in primary-key order, `chunk_size` at a time"""
+    last_pk = 0
+    while True:
+        ids = list(
+            due_investments(today).filter(pk__gt=last_pk)
+            .order_by('pk').values_list('pk', flat=True)[:chunk_size]
+        )
+        if not ids:
+            return
+        last_pk = ids[-1]
+        yield ids
+
+
+def process_chunk(ids, today):
+    """
+    Create the contributions due for the given investments in one short
+    transaction: one Transaction per investment per missed period, one
+    balance delta per child, and a bulk update advancing next_payment_date.
+
+    Contributions carry the period they pay in `scheduled_for`, which is
+    unique per investment, so a chunk that races another worker fails as a
+    whole instead of paying a period twice. Returns (investments, transactions).
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        investments = list(
+            due_investments(today).filter(pk__in=ids).select_for_update(skip_locked=True)
+        )
+        contributions = []
+        deltas = {}
+        for investment in investments:
+            due = investment.next_payment_date
+            while due is not None and due <= today:
+                contributions.append(Transaction(
+                    user_id=investment.user_id,
+                    child_id=investment.child_id,
+                    investment=investment,
+                    transaction_type='investment',
+                    amount=investment.amount,
+                    status='completed',
+                    scheduled_for=due,
+                    description='Recurring investment',
+                    created_at=now,
+                ))
+                investment.total_contributed += investment.amount
+                deltas[investment.child_id] = deltas.get(investment.child_id, Decimal('0')) + investment.amount
+                due = investment.calculate_next_payment_date(after=due)
+            investment.next_payment_date = due
+            if due is None:
+                investment.status = 'completed'
+            investment.updated_at = now
+
+        Transaction.objects.bulk_create(contributions)
+        Investment.objects.bulk_update(
+            investments, ['next_payment_date', 'total_contributed', 'status', 'updated_at'],
+        )
+        apply_balance_deltas(deltas)
+        for user_id in {investment.user_id for investment in investments}:
+            transaction.on_commit(lambda user_id=user_id: invalidate_dashboard_stats(user_id))
+    return len(investments), len(contributions)
+
+
+def _run_chunk(ids, today):
+    try:
+        try:
+            return process_chunk(ids, today)
+        except IntegrityError:
+            # Another worker paid some of these periods first; whatever is
+            # still due after its commit is picked up on a second pass
+            logger.warning('Recurring chunk starting at investment %s raced another worker; retrying', ids[0])
+            return process_chunk(ids, today)
+    finally:
+        connection.close()
+
+
+def run_recurring_investments(today=None, chunk_size=500, workers=1):
+    """
+    Execute every due recurring investment, `chunk_size` investments per
+    database transaction, spread over `workers` threads. Databases without
+    SKIP LOCKED (SQLite) allow a single writer, so they always run serially.
+    Returns (investments processed, transactions created).
+    """
+    today = today or timezone.localdate()
+    processed = created = 0
+    if workers <= 1 or not connection.features.has_select_for_update_skip_locked:
+        for ids in due_id_chunks(today, chunk_size):
+            investments, transactions = process_chunk(ids, today)
+            processed += investments
+            created += transactions
+        return processed, created
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_run_chunk, ids, today) for ids in due_id_chunks(today, chunk_size)]
+        for future in futures:
+            investments, transactions = future.result()
+            processed += investments
+            created += transactions
+    return processed, created
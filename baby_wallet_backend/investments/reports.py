@@ -0,0 +1,219 @@
+import csv
+import io
+import multiprocessing
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.files import File
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import Case, Count, DecimalField, F, Max, Q, Sum, Value, When
+from django.utils import timezone
+
+from accounts.models import Child, User
+from baby_wallet_backend.replicas import replica_reads
+from .models import TaxReport, Transaction
+from .pdf import TextPDF
+
+
+REPORT_FORMATS = {'annual': 'pdf', 'transaction': 'csv', 'gains': 'csv'}
+CREDIT_TYPES = ['investment', 'interest', 'refund']
+DEBIT_TYPES = ['withdrawal', 'fee']
+CENT = Decimal('0.01')
+HISTORY_COLUMNS = ['created_at', 'child__name', 'transaction_type', 'status', 'amount', 'token',
+                   'transaction_hash', 'description']
+
+
+def year_bounds(year):
+    return timezone.make_aware(datetime(year, 1, 1)), timezone.make_aware(datetime(year + 1, 1, 1))
+
+
+def year_transactions(user_id, year):
+    start, end = year_bounds(year)
+    return Transaction.objects.filter(user_id=user_id, created_at__gte=start, created_at__lt=end)
+
+
+def source_transactions(user_id, report_type, year):
+    """The transactions a report is built from: the year's, and for the annual statement every earlier one too"""
+    if report_type == 'annual':  # The opening balance sums every transaction before the year
+        _, end = year_bounds(year)
+        return Transaction.objects.filter(user_id=user_id, created_at__lt=end)
+    return year_transactions(user_id, year)
+
+
+def source_watermark(user_id, report_type, year):
+    """(newest updated_at, count) of the report's source transactions; any edit, addition or deletion changes it"""
+    summary = source_transactions(user_id, report_type, year).aggregate(latest=Max('updated_at'), count=Count('id'))
+    return summary['latest'], summary['count']
+
+
+def balance_effect():
+    """Signed amount of completed transactions, as Transaction.balance_effect() computes it row by row"""
+    return Sum(
+        Case(
+            When(status='completed', transaction_type__in=CREDIT_TYPES, then=F('amount')),
+            When(status='completed', transaction_type__in=DEBIT_TYPES, then=-F('amount')),
+            default=Value(Decimal('0')),
+        ),
+        output_field=DecimalField(max_digits=15, decimal_places=2),
+    )
+
+
+def write_transaction_history(out, user_id, year):
+    """Every transaction of the year as CSV, streamed from a server-side cursor"""
+    text = io.TextIOWrapper(out, encoding='utf-8', newline='')
+    writer = csv.writer(text)
+    writer.writerow(['date', 'child', 'type', 'status', 'amount', 'token', 'transaction_hash', 'description'])
+    rows = year_transactions(user_id, year).order_by('created_at', 'id').values_list(*HISTORY_COLUMNS)
+    for created_at, *values in rows.iterator(chunk_size=settings.TAX_REPORT_CHUNK_SIZE):
+        writer.writerow([created_at.isoformat(), *('' if value is None else value for value in values)])
+    text.flush()
+    text.detach()
+
+
+def write_gains(out, user_id, year):
+    """Completed flows of the year per child, investment and token, with interest net of fees"""
+    text = io.TextIOWrapper(out, encoding='utf-8', newline='')
+    writer = csv.writer(text)
+    writer.writerow(['child', 'investment', 'token', 'invested', 'withdrawn', 'interest', 'fees', 'refunds',
+                     'net_gain'])
+    flows = {name: Sum('amount', filter=Q(transaction_type=kind)) for name, kind in [
+        ('invested', 'investment'), ('withdrawn', 'withdrawal'), ('interest', 'interest'), ('fees', 'fee'),
+        ('refunds', 'refund'),
+    ]}
+    groups = (
+        year_transactions(user_id, year).filter(status='completed')
+        .values('child__name', 'investment__investment_type', 'investment_id', 'token')
+        .annotate(**flows).order_by('child__name', 'investment_id', 'token')
+    )
+    for group in groups:
+        # SQLite returns sums without their scale
+        amounts = {name: Decimal(group[name] or 0).quantize(CENT) for name in flows}
+        investment = f"{group['investment__investment_type']} #{group['investment_id']}" if group['investment_id'] else ''
+        writer.writerow([group['child__name'], investment, group['token'], *amounts.values(),
+                         amounts['interest'] - amounts['fees']])
+    text.flush()
+    text.detach()
+
+
+def write_annual_statement(out, user_id, year):
+    """PDF statement per child: opening balance, the year's completed transactions, closing balance"""
+    start, _ = year_bounds(year)
+    user = User.objects.only('email', 'first_name', 'last_name').get(pk=user_id)
+    opening = dict(
+        Transaction.objects.filter(user_id=user_id, created_at__lt=start).order_by()
+        .values('child').annotate(balance=balance_effect()).values_list('child', 'balance')
+    )
+    pdf = TextPDF(out)
+    pdf.line(f'Annual statement {year}', bold=True)
+    pdf.line(f'{user.get_full_name() or user.email} <{user.email}>')
+    for child in Child.objects.filter(user_id=user_id).order_by('name', 'id').only('name'):
+        balance = Decimal(opening.get(child.pk) or 0).quantize(CENT)
+        pdf.line()
+        pdf.line(child.name, bold=True)
+        pdf.line(f'Opening balance {balance:>14}')
+        credits = debits = Decimal('0.00')
+        rows = (
+            year_transactions(user_id, year).filter(child=child, status='completed')
+            .order_by('created_at', 'id').values_list('created_at', 'transaction_type', 'amount', 'token')
+        )
+        for created_at, kind, amount, token in rows.iterator(chunk_size=settings.TAX_REPORT_CHUNK_SIZE):
+            signed = amount if kind in CREDIT_TYPES else -amount if kind in DEBIT_TYPES else Decimal('0')
+            if signed > 0:
+                credits += signed
+            else:
+                debits -= signed
+            balance += signed
+            pdf.line(f'{created_at:%Y-%m-%d}  {kind:<11} {signed:>+14} {token:<5} {balance:>14}')
+        pdf.line(f'Credits {credits:>14}   Debits {debits:>14}')
+        pdf.line(f'Closing balance {balance:>14}', bold=True)
+    pdf.close()
+
+
+WRITERS = {
+    'annual': write_annual_statement,
+    'transaction': write_transaction_history,
+    'gains': write_gains,
+}
+
+
+def generate_report(user_id, report_type, year, force=False):
+    """
+    Build the user's `report_type` report for `year` unless the stored one
+    was built from the same transactions (same newest updated_at and count,
+    see source_transactions()).
+    The file is streamed to a temporary file, then saved through the
+    storage; the previous file is deleted once the row points to the new
+    one. Transactions are read from a replica unless the user wrote
+    recently, the watermark from the same one as the report's rows.
+    Returns (report, whether it was generated).
+    """
+    with replica_reads(user_id):
+        return _generate_report(user_id, report_type, year, force)
+
+
+def _generate_report(user_id, report_type, year, force):
+    latest, count = source_watermark(user_id, report_type, year)
+    # The report row is read where it is written, or a lagging replica would have it created twice
+    report = (
+        TaxReport.objects.using(DEFAULT_DB_ALIAS)
+        .filter(user_id=user_id, report_type=report_type, year=year).first()
+    )
+    if (
+        not force and report is not None and report.file_path
+        and (report.source_updated_at, report.source_transactions) == (latest, count)
+        and report.file_path.storage.exists(report.file_path.name)
+    ):
+        return report, False
+
+    previous = report.file_path.name if report is not None and report.file_path else None
+    report = report or TaxReport(user_id=user_id, report_type=report_type, year=year)
+    with tempfile.TemporaryFile() as tmp:
+        WRITERS[report_type](tmp, user_id, year)
+        tmp.seek(0)
+        report.file_path.save(f'{user_id}_{year}_{report_type}.{REPORT_FORMATS[report_type]}', File(tmp), save=False)
+    report.source_updated_at = latest
+    report.source_transactions = count
+    report.generated_at = timezone.now()
+    report.is_downloaded = False
+    report.save()
+    if previous and previous != report.file_path.name:
+        report.file_path.storage.delete(previous)
+    return report, True
+
+
+def _generate(task):
+    user_id, report_type, year, force = task
+    try:
+        return generate_report(user_id, report_type, year, force)[1]
+    finally:
+        connections.close_all()
+
+
+def generate_year_end_reports(year, report_types=None, user_ids=None, workers=1, force=False):
+    """
+    Generate `report_types` (all by default) for `year` for every user with
+    transactions that year, or only `user_ids`. With workers > 1 the reports
+    are built in a pool of forked processes, each with its own database
+    connection. Returns (reports generated, reports already up to date).
+    """
+    if user_ids is None:
+        start, end = year_bounds(year)
+        user_ids = (
+            Transaction.objects.filter(created_at__gte=start, created_at__lt=end)
+            .order_by().values_list('user_id', flat=True).distinct()
+        )
+    tasks = [(user_id, report_type, year, force)
+             for user_id in sorted(user_ids) for report_type in report_types or WRITERS]
+
+    if workers <= 1:
+        results = [generate_report(*task)[1] for task in tasks]
+    else:
+        # Children must not share the parent's open database connections
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork')) as pool:
+            results = list(pool.map(_generate, tasks, chunksize=max(1, len(tasks) // (workers * 4))))
+    generated = sum(results)
+    return generated, len(results) - generated
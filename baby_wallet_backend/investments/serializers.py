@@ -10,12 +10,52 @@ class TransactionSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ('user', 'child')
 
-class InvestmentSerializer(serializers.ModelSerializer):
-    """Serializer for the Investment model."""
-    transactions = TransactionSerializer(many=True, read_only=True)
+def requested_fields(request):
+    """Field names a GET request picked with ?fields=a,b,c, or None for every field"""
+    if request is None or request.method != 'GET':
+        return None
+    requested = request.query_params.get('fields')
+    if not requested:
+        return None
+    return {name.strip() for name in requested.split(',')}
+
+
+class SparseFieldsMixin:
+    """
+    Lets GET requests pick the fields they need with ?fields=a,b,c.
+    Unknown names are ignored; without the parameter every field is returned.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        keep = requested_fields(self.context.get('request'))
+        if keep is not None:
+            for name in set(self.fields) - keep:
+                self.fields.pop(name)
+
+
+class InvestmentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    """
+    Serializer for the Investment model.
+
+    Lists carry a summary of the investment's transactions (count and latest
+    transaction) annotated by the view; the transactions themselves are only
+    included when the view prefetches them for ?expand=transactions, which
+    a ?fields= list has to name as well.
+    """
     child_name = serializers.CharField(source='child.name', read_only=True)
-    
+    transaction_count = serializers.IntegerField(read_only=True)
+    last_transaction_at = serializers.DateTimeField(read_only=True)
+    last_transaction_amount = serializers.DecimalField(max_digits=15, decimal_places=2, read_only=True)
+    last_transaction_status = serializers.CharField(read_only=True)
+
     class Meta:
         model = Investment
         fields = '__all__'
-        read_only_fields = ('user', 'child', 'total_contributed') 
+        read_only_fields = ('user', 'child', 'total_contributed', 'next_payment_date')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.context.get('expand_transactions'):
+            self.fields['transactions'] = TransactionSerializer(
+                source='recent_transactions', many=True, read_only=True,
+            )
@@ -0,0 +1,10 @@
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from .models import CostBasisPosition
+
+
+@receiver(post_delete, sender='investments.Transaction')
+def mark_cost_basis_stale(sender, instance, **kwargs):
+    """A deleted transaction cannot be taken back incrementally; rebuild its positions on the next sync"""
+    CostBasisPosition.objects.filter(child_id=instance.child_id, token=instance.token).update(synced_at=None)
@@ -0,0 +1,39 @@
+import json
+import os
+import tempfile
+
+from django.test import override_settings
+
+from .prices import clear_price_cache
+
+
+class PriceFeed:
+    """
+    Temporary JSON price feed for FilePriceSource, for tests and benchmarks.
+    While enabled it is the configured PRICE_SOURCE; `update()` rewrites it,
+    which the cached prices pick up once PRICE_CACHE_TTL has passed.
+
+        feed = PriceFeed({'USD': {'ETH': '3000.00'}})
+        feed.enable()
+        self.addCleanup(feed.disable)
+    """
+    def __init__(self, prices, ttl=60):
+        handle, self.path = tempfile.mkstemp(suffix='.json')
+        os.close(handle)
+        self.update(prices)
+        self.settings = override_settings(
+            PRICE_SOURCE={'BACKEND': 'investments.prices.FilePriceSource', 'OPTIONS': {'path': self.path}},
+            PRICE_CACHE_TTL=ttl,
+        )
+
+    def update(self, prices):
+        with open(self.path, 'w') as feed:
+            json.dump(prices, feed)
+
+    def enable(self):
+        self.settings.enable()
+
+    def disable(self):
+        self.settings.disable()
+        clear_price_cache()
+        os.unlink(self.path)
@@ -1,9 +1,17 @@
+from django.conf import settings
+from django.db.models import Count, IntegerField, OuterRef, Prefetch, Subquery
+from django.db.models.functions import Coalesce
 from django.shortcuts import render
-from rest_framework import viewsets, permissions
+from rest_framework import viewsets, permissions, status
 from rest_framework import serializers
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from .filters import QueryParamFilterBackend, parse_choice, parse_id, parse_moment, parse_until
+from .ingest import IngestError, ingest_transactions
 from .models import Investment, Transaction
-from .serializers import InvestmentSerializer, TransactionSerializer
+from .serializers import InvestmentSerializer, TransactionSerializer, requested_fields
 from accounts.models import Child
+from baby_wallet_backend.replicas import ReplicaReadMixin
 
 # Create your views here.
 
@@ -13,13 +21,57 @@ class InvestmentViewSet(viewsets.ModelViewSet):
     """
     serializer_class = InvestmentSerializer
     permission_classes = [permissions.IsAuthenticated]
+    filter_backends = [QueryParamFilterBackend]
+    query_filters = {
+        'child': ('child_id', parse_id),
+        'type': ('investment_type', parse_choice(Investment.INVESTMENT_TYPES)),
+        'investment_type': ('investment_type', parse_choice(Investment.INVESTMENT_TYPES)),
+        'status': ('status', parse_choice(Investment.STATUS_CHOICES)),
+        'created_after': ('created_at__gte', parse_moment),
+        'created_before': ('created_at__lt', parse_until),
+    }
 
     def get_queryset(self):
         """
         This view should return a list of all the investments
-        for the currently authenticated user.
+        for the currently authenticated user, annotated with a summary
+        of their transactions.
         """
-        return self.request.user.investments.all()
+        transactions = Transaction.objects.filter(investment=OuterRef('pk'))
+        latest = transactions.order_by('-created_at', '-id')
+        queryset = self.request.user.investments.select_related('child').annotate(
+            transaction_count=Coalesce(
+                Subquery(
+                    transactions.order_by().values('investment').annotate(count=Count('pk')).values('count'),
+                    output_field=IntegerField(),
+                ),
+                0,
+            ),
+            last_transaction_at=Subquery(latest.values('created_at')[:1]),
+            last_transaction_amount=Subquery(latest.values('amount')[:1]),
+            last_transaction_status=Subquery(latest.values('status')[:1]),
+        )
+        if self.expand_transactions:
+            limit = settings.INVESTMENT_EXPANDED_TRANSACTIONS
+            recent = Transaction.objects.select_related('child').order_by('-created_at', '-id')[:limit]
+            queryset = queryset.prefetch_related(
+                Prefetch('transactions', queryset=recent, to_attr='recent_transactions')
+            )
+        return queryset
+
+    @property
+    def expand_transactions(self):
+        """?expand=transactions on a GET, unless a ?fields= list leaves the transactions out"""
+        expand = self.request.query_params.get('expand', '')
+        if self.request.method != 'GET' or 'transactions' not in expand.split(','):
+            return False
+        fields = requested_fields(self.request)
+        return fields is None or 'transactions' in fields
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['expand_transactions'] = self.expand_transactions
+        return context
 
     def perform_create(self, serializer):
         # Get child ID from request data
@@ -36,17 +88,51 @@ class InvestmentViewSet(viewsets.ModelViewSet):
         # Automatically associate the investment with the logged-in user and selected child
         serializer.save(user=self.request.user, child=child)
 
-class TransactionViewSet(viewsets.ReadOnlyModelViewSet):
+class TransactionViewSet(ReplicaReadMixin, viewsets.ReadOnlyModelViewSet):
     """
-    API endpoint that allows transactions to be viewed.
-    Transactions are read-only as they are created by other processes (e.g., investments).
+    API endpoint that allows transactions to be viewed, from a read replica.
+    Transactions are read-only as they are created by other processes (e.g., investments),
+    apart from the batched import under /transactions/bulk/.
     """
     serializer_class = TransactionSerializer
     permission_classes = [permissions.IsAuthenticated]
+    filter_backends = [QueryParamFilterBackend]
+    query_filters = {
+        'child': ('child_id', parse_id),
+        'type': ('transaction_type', parse_choice(Transaction.TRANSACTION_TYPES)),
+        'transaction_type': ('transaction_type', parse_choice(Transaction.TRANSACTION_TYPES)),
+        'status': ('status', parse_choice(Transaction.STATUS_CHOICES)),
+        'token': ('token', parse_choice(Transaction.TOKEN_CHOICES)),
+        'created_after': ('created_at__gte', parse_moment),
+        'created_before': ('created_at__lt', parse_until),
+    }
 
     def get_queryset(self):
         """
         This view should return a list of all the transactions
         for the currently authenticated user.
         """
-        return self.request.user.transactions.all()
+        # child_name is serialized for every row
+        return self.request.user.transactions.select_related('child')
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """
+        Import a batch of transactions for the user's children in one request.
+        Expects a JSON list of transaction objects. Only pending transactions
+        are accepted, so users cannot credit balances themselves; completed
+        history goes through the import_transactions command.
+        """
+        rows = request.data
+        if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+            raise serializers.ValidationError({'detail': 'Expected a list of transactions'})
+        if len(rows) > settings.TRANSACTION_BULK_MAX_ROWS:
+            raise serializers.ValidationError(
+                {'detail': f'At most {settings.TRANSACTION_BULK_MAX_ROWS} transactions per request'}
+            )
+
+        try:
+            created = ingest_transactions(rows, user=request.user, batch_size=len(rows) or 1, pending_only=True)
+        except IngestError as exc:
+            raise serializers.ValidationError({'row': exc.row, 'detail': exc.message})
+        return Response({'created': created}, status=status.HTTP_201_CREATED)
@@ -369,7 +369,8 @@ async function loadChildrenForInvestment() {
             throw new Error('Failed to fetch children');
         }
         
-        const children = await response.json();
+        const data = await response.json();
+        const children = data.results || data;
         const childSelect = document.getElementById('child-select');
         
         if (childSelect && children.length > 0) {
@@ -724,7 +725,7 @@ async function fetchChildren() {
             throw new Error('Network response was not ok');
         }
         const data = await response.json();
-        renderChildren(data);
+        renderChildren(data.results || data);
         await loadDashboardStats();
         await loadTransactionHistory();
     } catch (error) {
@@ -1006,8 +1007,8 @@ async function showProfilesPage() {
         if (!response.ok) {
             throw new Error('Network response was not ok');
         }
-        const children = await response.json();
-        renderProfileList(children);
+        const data = await response.json();
+        renderProfileList(data.results || data);
     } catch (error) {
         console.error('Failed to fetch children for profiles page:', error);
         showNotification('Could not load child profiles.', 'error');
@@ -1251,7 +1252,7 @@ function displayInvestmentHistory(investments) {
                     </div>
                     <div>
                         <span class="text-text-secondary">Transactions:</span>
-                        <span class="font-medium text-text-primary ml-1">${investment.transactions ? investment.transactions.length : 0}</span>
+                        <span class="font-medium text-text-primary ml-1">${investment.transaction_count || 0}</span>
                     </div>
                 </div>
             </div>